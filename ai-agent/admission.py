@@ -0,0 +1,148 @@
+"""
+Prysm AI Agent - Admission control for chat runs.
+Caps how many graph runs execute at once. Waiting runs are queued per session and
+admitted round-robin across sessions, so one busy session cannot starve the rest.
+When the queue is full, or a run waits too long, it is rejected so the caller can
+shed load with a clear error instead of piling up upstream 429s.
+"""
+import os
+import time
+import asyncio
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List
+
+MAX_CONCURRENT_RUNS = int(os.getenv("ADMISSION_MAX_CONCURRENT", "8"))
+MAX_QUEUED_RUNS = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+MAX_QUEUED_PER_SESSION = int(os.getenv("ADMISSION_MAX_QUEUE_PER_SESSION", "2"))
+MAX_WAIT_SECONDS = float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "20"))
+
+_WAIT_SAMPLES = 1024
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        max_concurrent: int = MAX_CONCURRENT_RUNS,
+        max_queued: int = MAX_QUEUED_RUNS,
+        max_queued_per_session: int = MAX_QUEUED_PER_SESSION,
+        max_wait: float = MAX_WAIT_SECONDS,
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.max_queued_per_session = max_queued_per_session
+        self.max_wait = max_wait
+        self.in_flight = 0
+        # session key -> FIFO of waiter futures; order of keys is the round-robin order.
+        self._waiters: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self._queued = 0
+        self.admitted_total = 0
+        self.rejected_total: Dict[str, int] = {}
+        self.wait_seconds_sum = 0.0
+        self._wait_samples: Deque[float] = deque(maxlen=_WAIT_SAMPLES)
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queued
+
+    async def acquire(self, key: str) -> None:
+        """Wait for a run slot; raises AdmissionRejected when saturated."""
+        if self.in_flight < self.max_concurrent and not self._queued:
+            self.in_flight += 1
+            self.admitted_total += 1
+            self._record_wait(0.0)
+            return
+
+        if self._queued >= self.max_queued:
+            self._reject("queue_full")
+        queue = self._waiters.get(key)
+        if queue is not None and len(queue) >= self.max_queued_per_session:
+            self._reject("session_queue_full")
+
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(key, deque()).append(fut)
+        self._queued += 1
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), self.max_wait)
+        except asyncio.TimeoutError:
+            if self._remove_waiter(key, fut):
+                self._reject("wait_timeout")
+            # Granted just as we timed out: keep the slot.
+        except asyncio.CancelledError:
+            if not self._remove_waiter(key, fut):
+                # A slot was handed to us; give it back.
+                self.release()
+            raise
+        self._record_wait(time.monotonic() - started)
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._grant_next()
+
+    def stats(self) -> Dict[str, Any]:
+        samples: List[float] = sorted(self._wait_samples)
+
+        def pct(p: float) -> float:
+            if not samples:
+                return 0.0
+            return samples[min(len(samples) - 1, int(p * len(samples)))]
+
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrent": self.max_concurrent,
+            "queue_depth": self._queued,
+            "max_queue": self.max_queued,
+            "queued_sessions": len(self._waiters),
+            "admitted_total": self.admitted_total,
+            "rejected_total": dict(self.rejected_total),
+            "wait_seconds_sum": round(self.wait_seconds_sum, 6),
+            "wait_seconds_p50": round(pct(0.50), 6),
+            "wait_seconds_p95": round(pct(0.95), 6),
+            "wait_seconds_max": round(samples[-1], 6) if samples else 0.0,
+        }
+
+    # --- internals ---
+
+    def _record_wait(self, waited: float) -> None:
+        self.wait_seconds_sum += waited
+        self._wait_samples.append(waited)
+
+    def _reject(self, reason: str) -> None:
+        self.rejected_total[reason] = self.rejected_total.get(reason, 0) + 1
+        raise AdmissionRejected(reason, retry_after=max(1.0, self.max_wait / 4))
+
+    def _grant_next(self) -> None:
+        while self.in_flight < self.max_concurrent and self._waiters:
+            key, queue = next(iter(self._waiters.items()))
+            fut = queue.popleft()
+            self._queued -= 1
+            # Rotate: this session goes to the back of the line.
+            if queue:
+                self._waiters.move_to_end(key)
+            else:
+                del self._waiters[key]
+            if fut.done():
+                continue
+            self.in_flight += 1
+            self.admitted_total += 1
+            fut.set_result(None)
+
+    def _remove_waiter(self, key: str, fut: asyncio.Future) -> bool:
+        queue = self._waiters.get(key)
+        if queue is None or fut not in queue:
+            return False
+        queue.remove(fut)
+        self._queued -= 1
+        if not queue:
+            del self._waiters[key]
+        return True
+
+
+admission = AdmissionController()
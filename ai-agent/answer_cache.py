@@ -0,0 +1,150 @@
+"""
+Prysm AI Agent - Semantic answer cache.
+Reuses a finished answer when another user asks (almost) the same research question
+about the same stock. Entries are keyed by (symbol, intent, profile, mode); within a
+key, the normalized question must match exactly or be close in embedding space
+(using rag_service's BGE model). An entry is dropped when the stock snapshot's
+dataVersion changes or its TTL expires.
+
+Only self-contained questions are shareable: main skips the cache for turns with
+prior history and for sessions with their own documents, since those answers
+depend on context other sessions do not have.
+"""
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from executors import EMBEDDING_EXECUTOR, run_in
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "1").lower() in {"1", "true", "yes"}
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "900"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "512"))
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.92"))
+# Variants kept per key (different phrasings that were not similar enough to merge).
+_MAX_VARIANTS_PER_KEY = 8
+
+CacheKey = Tuple[str, str, str, str]
+
+
+def normalize_question(text: str) -> str:
+    text = (text or "").lower()
+    text = re.sub(r"[^a-z0-9&.\s]", " ", text)
+    return " ".join(text.split())
+
+
+def make_key(symbol: str, intent: Optional[str], profile: Optional[str], mode: Optional[str]) -> CacheKey:
+    return (symbol.upper(), intent or "general", profile or "-", mode or "-")
+
+
+def _embed(text: str) -> np.ndarray:
+    # Imported here so answer_cache stays light; RAG.get() loads rag_service (and the model
+    # on first encode) if startup has not preloaded it already.
+    from readiness import RAG
+    vec = np.asarray(RAG.get().embed_fn([text])[0], dtype=np.float32)
+    norm = float(np.linalg.norm(vec)) or 1.0
+    return vec / norm
+
+
+class AnswerCache:
+    def __init__(
+        self,
+        ttl: float = ANSWER_CACHE_TTL_SECONDS,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+        similarity: float = ANSWER_CACHE_SIMILARITY,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.similarity = similarity
+        # key -> list of entries {question, embedding, answer, data_version, created_at}
+        self._entries: "OrderedDict[CacheKey, List[Dict[str, Any]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    async def lookup(self, key: CacheKey, question: str, data_version: Optional[str]) -> Optional[str]:
+        if not ANSWER_CACHE_ENABLED:
+            return None
+        entries = self._fresh_entries(key, data_version)
+        if not entries:
+            self.misses += 1
+            return None
+
+        normalized = normalize_question(question)
+        for entry in entries:
+            if entry["question"] == normalized:
+                return self._hit(key, entry)
+
+        try:
+            query_vec = await run_in(EMBEDDING_EXECUTOR, _embed, normalized)
+        except Exception as e:
+            print(f"[ANSWER_CACHE] Embedding failed: {e}")
+            self.misses += 1
+            return None
+        best, best_score = None, -1.0
+        for entry in entries:
+            score = float(np.dot(query_vec, entry["embedding"]))
+            if score > best_score:
+                best, best_score = entry, score
+        if best is not None and best_score >= self.similarity:
+            print(f"[ANSWER_CACHE] Semantic hit for {key} (similarity {best_score:.3f})")
+            return self._hit(key, best)
+        self.misses += 1
+        return None
+
+    async def store(self, key: CacheKey, question: str, data_version: Optional[str], answer: str) -> None:
+        if not ANSWER_CACHE_ENABLED or not answer:
+            return
+        normalized = normalize_question(question)
+        try:
+            vec = await run_in(EMBEDDING_EXECUTOR, _embed, normalized)
+        except Exception as e:
+            print(f"[ANSWER_CACHE] Embedding failed: {e}")
+            return
+        entries = self._fresh_entries(key, data_version)
+        entries = [e for e in entries if e["question"] != normalized]
+        entries.insert(0, {
+            "question": normalized,
+            "embedding": vec,
+            "answer": answer,
+            "data_version": data_version,
+            "created_at": time.monotonic(),
+        })
+        self._entries[key] = entries[:_MAX_VARIANTS_PER_KEY]
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "keys": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
+
+    def _fresh_entries(self, key: CacheKey, data_version: Optional[str]) -> List[Dict[str, Any]]:
+        entries = self._entries.get(key) or []
+        now = time.monotonic()
+        fresh = [
+            e for e in entries
+            if e["data_version"] == data_version and now - e["created_at"] < self.ttl
+        ]
+        if len(fresh) != len(entries):
+            self.invalidations += len(entries) - len(fresh)
+            if fresh:
+                self._entries[key] = fresh
+            else:
+                self._entries.pop(key, None)
+        return fresh
+
+    def _hit(self, key: CacheKey, entry: Dict[str, Any]) -> str:
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry["answer"]
+
+
+answer_cache = AnswerCache()
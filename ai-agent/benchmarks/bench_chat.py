@@ -0,0 +1,463 @@
+"""
+Prysm AI Agent - End-to-end load test for /chat, /sessions and /upload_doc.
+
+Runs the real FastAPI app in-process with offline fakes:
+- Gemini     -> LLM_PROVIDER=fake (llm_provider.FakeChatModel)
+- yfinance   -> benchmarks.fakes.FakeTicker (or a recorded cassette, see --cassette)
+- RSS feeds  -> benchmarks.fakes.fake_feedparser_parse (or a recorded cassette)
+- MongoDB    -> benchmarks.fakes.FakeMotorDatabase
+
+Requests are sent straight to the ASGI app (no sockets), and every body chunk is
+timestamped as the app emits it, so TTFB reflects the agent rather than a client
+buffer.
+
+Usage (from ai-agent/):
+    python -m benchmarks.bench_chat --concurrency 16 --requests 64
+    python -m benchmarks.bench_chat --save-baseline            # writes benchmarks/baselines/default.json
+    python -m benchmarks.bench_chat --compare                  # exits 1 on a regression
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import platform
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# Must be set before main/graph are imported.
+os.environ.setdefault("LLM_PROVIDER", "fake")
+os.environ.setdefault("ANSWER_CACHE_ENABLED", "0")
+os.environ.pop("MONGO_URI", None)
+
+AGENT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(AGENT_DIR))
+
+from benchmarks.fakes import FakeMotorDatabase, install_market_fakes  # noqa: E402
+
+BASELINE_DIR = Path(__file__).resolve().parent / "baselines"
+
+# Metrics compared against a baseline; True means higher is better.
+COMPARED_METRICS = {
+    "chat.ttfb_ms.p50": False,
+    "chat.ttfb_ms.p95": False,
+    "chat.total_ms.p95": False,
+    "chat.throughput_rps": True,
+    "sessions.total_ms.p95": False,
+    "memory.per_stream_kb": False,
+}
+
+CHAT_MESSAGES = [
+    ("Give me a deep dive analysis of RELIANCE", "RELIANCE"),
+    ("What is the risk profile of TCS?", "TCS"),
+    ("Compare INFY vs TCS", "INFY"),
+    ("Show me a chart of HDFCBANK", "HDFCBANK"),
+    ("What is the future outlook for ITC?", "ITC"),
+    ("What's the market sentiment on SBIN?", "SBIN"),
+    ("What is INFY's price?", "INFY"),       # fast path
+    ("P/E of HDFCBANK", "HDFCBANK"),          # fast path
+]
+
+
+# --- ASGI driver ---
+
+async def asgi_request(
+    app,
+    method: str,
+    path: str,
+    body: bytes = b"",
+    headers: Optional[List[Tuple[bytes, bytes]]] = None,
+    query: str = "",
+) -> Dict[str, Any]:
+    """Call the ASGI app once and timestamp every body chunk it sends."""
+    started = time.perf_counter()
+    done = asyncio.Event()
+    result: Dict[str, Any] = {"status": None, "headers": {}, "chunks": []}
+    body_sent = False
+
+    async def receive():
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        # Stay connected until the response is finished.
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            result["status"] = message["status"]
+            result["headers"] = {k.decode().lower(): v.decode() for k, v in message.get("headers", [])}
+        elif message["type"] == "http.response.body":
+            chunk = message.get("body", b"")
+            if chunk:
+                result["chunks"].append((time.perf_counter() - started, chunk))
+            if not message.get("more_body"):
+                done.set()
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "headers": headers or [],
+        "client": ("127.0.0.1", 0),
+        "server": ("bench", 80),
+    }
+    try:
+        await app(scope, receive, send)
+    finally:
+        done.set()
+    result["total_ms"] = (time.perf_counter() - started) * 1000
+    return result
+
+
+def _first_content_ms(chunks: List[Tuple[float, bytes]]) -> Optional[float]:
+    """Time of the first SSE data frame (heartbeat comments do not count)."""
+    for at, chunk in chunks:
+        if b"data:" in chunk:
+            return at * 1000
+    return None
+
+
+def _multipart(filename: str, content: bytes, boundary: str, fields: Optional[Dict[str, str]] = None) -> bytes:
+    parts = "".join(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+        for name, value in (fields or {}).items()
+    )
+    return (
+        parts +
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        "Content-Type: application/pdf\r\n\r\n"
+    ).encode() + content + f"\r\n--{boundary}--\r\n".encode()
+
+
+def minimal_pdf(pages: int = 3, lines_per_page: int = 30) -> bytes:
+    """Small text-only PDF so /upload_doc exercises extraction, chunking and embedding."""
+    objects: List[bytes] = [b"<< /Type /Catalog /Pages 2 0 R >>", b""]
+    kids = []
+    for p in range(pages):
+        text = " ".join(
+            f"BT /F1 10 Tf 40 {760 - 22 * i} Td (Page {p + 1} line {i + 1}: revenue grew 12 percent on strong order flow.) Tj ET"
+            for i in range(lines_per_page)
+        ).encode()
+        content_no = len(objects) + 1
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(text), text))
+        page_no = len(objects) + 1
+        kids.append(page_no)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 << /Type /Font /Subtype /Type1 /BaseFont /Helvetica >> >> >> >>" % content_no
+        )
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % k for k in kids), len(kids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (i, obj)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for off in offsets:
+        out += b"%010d 00000 n \n" % off
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+# --- Stats ---
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100.0
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def summarize(values: List[float]) -> Dict[str, Optional[float]]:
+    return {
+        "count": len(values),
+        "p50": _round(percentile(values, 50)),
+        "p95": _round(percentile(values, 95)),
+        "p99": _round(percentile(values, 99)),
+        "max": _round(max(values) if values else None),
+    }
+
+
+def _round(v: Optional[float]) -> Optional[float]:
+    return round(v, 2) if v is not None else None
+
+
+def flatten(report: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for k, v in report.items():
+        key = f"{prefix}{k}"
+        if isinstance(v, dict):
+            out.update(flatten(v, key + "."))
+        else:
+            out[key] = v
+    return out
+
+
+# --- Scenario ---
+
+async def seed_sessions(db: FakeMotorDatabase, count: int) -> None:
+    now = datetime.now(timezone.utc)
+    for i in range(count):
+        msgs = []
+        for t in range(10):
+            msgs.append({"role": "user", "parts": [{"text": f"Question {t} about RELIANCE"}]})
+            msgs.append({"role": "model", "parts": [{"text": "Answer " * 80}]})
+        await db.agent_sessions.insert_one({
+            "_id": f"seed-{i}",
+            "title": f"Seeded session {i}",
+            "preview": "Question about RELIANCE",
+            "messages": msgs,
+            "created_at": now - timedelta(minutes=i),
+            "updated_at": now - timedelta(minutes=i),
+        })
+
+
+async def run_chat(app, message: str, symbol: str, session_id: str) -> Dict[str, Any]:
+    body = json.dumps({"message": message, "stock_symbol": symbol, "session_id": session_id}).encode()
+    res = await asgi_request(app, "POST", "/chat", body, [(b"content-type", b"application/json")])
+    payload = b"".join(c for _, c in res["chunks"])
+    return {
+        "status": res["status"],
+        "ttfb_ms": _first_content_ms(res["chunks"]),
+        "total_ms": res["total_ms"],
+        "bytes": len(payload),
+        "error": b'"error"' in payload,
+    }
+
+
+async def run_sessions(app) -> Dict[str, Any]:
+    res = await asgi_request(app, "GET", "/sessions", query="limit=50")
+    return {"status": res["status"], "total_ms": res["total_ms"]}
+
+
+async def run_upload(app, pdf: bytes) -> Dict[str, Any]:
+    boundary = uuid.uuid4().hex
+    body = _multipart("bench_report.pdf", pdf, boundary, {"session_id": f"bench-upload-{boundary[:8]}"})
+    headers = [(b"content-type", f"multipart/form-data; boundary={boundary}".encode())]
+    started = time.perf_counter()
+    res = await asgi_request(app, "POST", "/upload_doc", body, headers)
+    if res["status"] != 202:
+        return {"status": res["status"], "accept_ms": res["total_ms"], "total_ms": res["total_ms"]}
+    # Ingestion is a background job; total time runs until the job reaches a terminal state.
+    job = json.loads(b"".join(c for _, c in res["chunks"]))
+    while True:
+        await asyncio.sleep(0.05)
+        poll = await asgi_request(app, "GET", f"/upload_doc/{job['job_id']}")
+        state = json.loads(b"".join(c for _, c in poll["chunks"]))
+        if state.get("status") in ("succeeded", "failed", "cancelled"):
+            break
+    return {
+        "status": 200 if state["status"] == "succeeded" else 500,
+        "accept_ms": res["total_ms"],
+        "total_ms": (time.perf_counter() - started) * 1000,
+    }
+
+
+async def run_scenario(app, args: argparse.Namespace) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    gate = asyncio.Semaphore(args.concurrency)
+    chat_results: List[Dict[str, Any]] = []
+    session_results: List[Dict[str, Any]] = []
+    upload_results: List[Dict[str, Any]] = []
+    pdf = minimal_pdf()
+
+    session_locks: Dict[str, asyncio.Lock] = {}
+
+    async def chat_job(i: int):
+        message, symbol = rng.choice(CHAT_MESSAGES)
+        # A handful of sessions get several turns, like a real sidebar. A user waits for
+        # one answer before sending the next turn, so turns of a session never overlap
+        # (overlapping ones would trip the per-session admission queue, not load the app).
+        session_id = f"bench-{i % max(1, args.requests // 4)}"
+        async with session_locks.setdefault(session_id, asyncio.Lock()), gate:
+            chat_results.append(await run_chat(app, message, symbol, session_id))
+
+    async def sessions_job():
+        async with gate:
+            session_results.append(await run_sessions(app))
+
+    async def upload_job():
+        async with gate:
+            upload_results.append(await run_upload(app, pdf))
+
+    jobs = [chat_job(i) for i in range(args.requests)]
+    jobs += [sessions_job() for _ in range(args.session_requests)]
+    if not args.skip_upload:
+        jobs += [upload_job() for _ in range(args.uploads)]
+    rng.shuffle(jobs)
+
+    started = time.perf_counter()
+    await asyncio.gather(*jobs)
+    wall = time.perf_counter() - started
+
+    ok_chats = [r for r in chat_results if r["status"] == 200 and not r["error"]]
+    report: Dict[str, Any] = {
+        "chat": {
+            "requests": len(chat_results),
+            "errors": len(chat_results) - len(ok_chats),
+            "ttfb_ms": summarize([r["ttfb_ms"] for r in ok_chats if r["ttfb_ms"] is not None]),
+            "total_ms": summarize([r["total_ms"] for r in ok_chats]),
+            "throughput_rps": round(len(ok_chats) / wall, 3) if wall else None,
+            "bytes_per_stream": int(sum(r["bytes"] for r in ok_chats) / len(ok_chats)) if ok_chats else 0,
+        },
+        "sessions": {
+            "requests": len(session_results),
+            "errors": sum(1 for r in session_results if r["status"] != 200),
+            "total_ms": summarize([r["total_ms"] for r in session_results]),
+        },
+        "wall_seconds": round(wall, 3),
+    }
+    if not args.skip_upload:
+        report["upload_doc"] = {
+            "requests": len(upload_results),
+            "errors": sum(1 for r in upload_results if r["status"] != 200),
+            "accept_ms": summarize([r["accept_ms"] for r in upload_results]),
+            "total_ms": summarize([r["total_ms"] for r in upload_results]),
+        }
+    return report
+
+
+async def measure_memory(app, streams: int) -> Dict[str, Any]:
+    """Peak traced allocations while `streams` chats run at once, divided per stream."""
+    tracemalloc.start()
+    try:
+        base, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        await asyncio.gather(*[
+            run_chat(app, CHAT_MESSAGES[i % 6][0], CHAT_MESSAGES[i % 6][1], f"mem-{i}")
+            for i in range(streams)
+        ])
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"streams": streams, "per_stream_kb": round((peak - base) / streams / 1024, 1)}
+
+
+async def main_async(args: argparse.Namespace) -> Dict[str, Any]:
+    if args.cassette:
+        # Replay recorded upstream responses instead of the synthetic fakes.
+        from cassette import install as install_cassette
+        install_cassette("replay", args.cassette, latency=args.cassette_latency)
+    else:
+        install_market_fakes(args.market_latency_ms)
+
+    import main as agent
+    from executors import install_default_executor
+    from persistence import turn_writer
+
+    db = FakeMotorDatabase(latency_ms=args.mongo_latency_ms)
+    await seed_sessions(db, args.seed_sessions)
+    agent.db = db
+    install_default_executor()
+    turn_writer.bind(db.agent_sessions)
+    await turn_writer.start()
+    try:
+        # Warm-up run so imports and lazy model loads are not billed to the first request.
+        await run_chat(agent.app, "What is INFY's price?", "INFY", "warmup")
+        report = await run_scenario(agent.app, args)
+        if not args.skip_memory:
+            report["memory"] = await measure_memory(agent.app, args.concurrency)
+    finally:
+        await turn_writer.stop()
+
+    report["config"] = {
+        "concurrency": args.concurrency,
+        "requests": args.requests,
+        "session_requests": args.session_requests,
+        "uploads": 0 if args.skip_upload else args.uploads,
+        "market_latency_ms": args.market_latency_ms,
+        "cassette": args.cassette,
+        "mongo_latency_ms": args.mongo_latency_ms,
+        "fake_llm_ttft_ms": os.getenv("FAKE_LLM_TTFT_MS", "300"),
+        "fake_llm_tokens_per_second": os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "150"),
+    }
+    report["environment"] = {"python": platform.python_version(), "machine": platform.machine()}
+    report["recorded_at"] = datetime.now(timezone.utc).isoformat()
+    return report
+
+
+# --- Baselines ---
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    current, base = flatten(report), flatten(baseline)
+    regressions = []
+    for metric, higher_is_better in COMPARED_METRICS.items():
+        now, then = current.get(metric), base.get(metric)
+        if not isinstance(now, (int, float)) or not isinstance(then, (int, float)) or then == 0:
+            continue
+        change = (now - then) / then
+        worse = -change if higher_is_better else change
+        flag = "REGRESSION" if worse > tolerance else "ok"
+        print(f"  {metric:28s} {then:>10.2f} -> {now:>10.2f} ({change:+.1%}) {flag}")
+        if worse > tolerance:
+            regressions.append(metric)
+    return regressions
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="Offline load test for the Prysm agent API")
+    p.add_argument("--concurrency", type=int, default=16)
+    p.add_argument("--requests", type=int, default=64, help="/chat requests")
+    p.add_argument("--session-requests", type=int, default=32, help="GET /sessions requests")
+    p.add_argument("--uploads", type=int, default=2, help="POST /upload_doc requests")
+    p.add_argument("--skip-upload", action="store_true", help="skip /upload_doc (no embedding model needed)")
+    p.add_argument("--skip-memory", action="store_true")
+    p.add_argument("--seed-sessions", type=int, default=200)
+    p.add_argument("--market-latency-ms", type=float, default=50.0)
+    p.add_argument("--mongo-latency-ms", type=float, default=1.0)
+    p.add_argument("--cassette", help="replay yfinance/requests/feedparser from this cassette dir instead of the fakes")
+    p.add_argument("--cassette-latency", default="recorded", help='replay delay in ms, or "recorded"')
+    p.add_argument("--seed", type=int, default=7)
+    p.add_argument("--baseline", default="default", help="baseline name under benchmarks/baselines/")
+    p.add_argument("--save-baseline", action="store_true")
+    p.add_argument("--compare", action="store_true", help="compare with the baseline, exit 1 on regression")
+    p.add_argument("--tolerance", type=float, default=0.15, help="allowed relative regression")
+    p.add_argument("--output", help="also write the report to this path")
+    return p.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    report = asyncio.run(main_async(args))
+    print(json.dumps(report, indent=2))
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+
+    baseline_path = BASELINE_DIR / f"{args.baseline}.json"
+    if args.save_baseline:
+        BASELINE_DIR.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"[BENCH] Baseline saved to {baseline_path}")
+    if args.compare:
+        if not baseline_path.exists():
+            print(f"[BENCH] No baseline at {baseline_path}; run with --save-baseline first")
+            return 2
+        print(f"[BENCH] Comparing with {baseline_path} (tolerance {args.tolerance:.0%})")
+        regressions = compare(report, json.loads(baseline_path.read_text()), args.tolerance)
+        if regressions:
+            print(f"[BENCH] {len(regressions)} regression(s): {', '.join(regressions)}")
+            return 1
+        print("[BENCH] No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
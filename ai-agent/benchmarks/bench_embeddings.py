@@ -0,0 +1,159 @@
+"""
+Prysm AI Agent - Embedding backend benchmark.
+
+Embeds the same local corpus with each backend from embedding_backend.py and reports:
+- load_s          model load time
+- docs_per_sec    chunks embedded per second (after one warm-up batch)
+- recall_at_k     overlap of each backend's top-k neighbours with the reference
+                  backend's (the first one listed), over sampled queries
+- self_hit_at_k   share of queries whose source chunk is in the top k
+
+Queries are a slice from the middle of a sampled chunk, with the BGE query
+instruction used by rag_service.query_rag. Retrieval is exact cosine search over
+the embedded corpus, so only the embeddings differ between backends.
+
+Usage (from ai-agent/):
+    python -m benchmarks.bench_embeddings --corpus ~/reports
+    python -m benchmarks.bench_embeddings --corpus ~/reports --backends torch,onnx-int8 --threads 4
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+AGENT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(AGENT_DIR))
+
+from embedding_backend import BACKENDS, EMBEDDING_BATCH_SIZE, EMBEDDING_BATCH_TOKENS, load_backend  # noqa: E402
+
+# Same instruction rag_service.query_rag prepends.
+QUERY_INSTRUCTION = "Represent this sentence for searching relevant passages: "
+QUERY_CHARS = 200
+
+
+def load_corpus(corpus_dir: str, limit: int) -> List[str]:
+    """Chunks from the .pdf/.txt/.md files under `corpus_dir`, chunked like ingestion."""
+    from pdf_extract import count_pages, extract_pages
+
+    chunks: List[str] = []
+    for path in sorted(Path(corpus_dir).expanduser().rglob("*")):
+        suffix = path.suffix.lower()
+        if suffix == ".pdf":
+            text = "".join(t + "\n" for t in extract_pages(str(path), 0, count_pages(str(path))) if t)
+        elif suffix in {".txt", ".md"}:
+            text = path.read_text(errors="ignore")
+        else:
+            continue
+        chunks.extend(c for c in _chunk(text) if c.strip())
+        if len(chunks) >= limit:
+            break
+    return chunks[:limit]
+
+
+def _chunk(text: str) -> List[str]:
+    # rag_service.chunk_text, without importing rag_service (which loads Chroma and a model).
+    size, overlap = 1000, 200
+    return [text[i:i + size] for i in range(0, len(text), size - overlap)]
+
+
+def make_queries(chunks: List[str], count: int, rng: random.Random) -> List[int]:
+    return rng.sample(range(len(chunks)), min(count, len(chunks)))
+
+
+def query_text(chunk: str) -> str:
+    start = max(0, len(chunk) // 2 - QUERY_CHARS // 2)
+    return QUERY_INSTRUCTION + chunk[start:start + QUERY_CHARS]
+
+
+def top_k(doc_vecs: np.ndarray, query_vecs: np.ndarray, k: int) -> np.ndarray:
+    docs = doc_vecs / np.maximum(np.linalg.norm(doc_vecs, axis=1, keepdims=True), 1e-12)
+    queries = query_vecs / np.maximum(np.linalg.norm(query_vecs, axis=1, keepdims=True), 1e-12)
+    scores = queries @ docs.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def run_backend(name: str, chunks: List[str], queries: List[str], args: argparse.Namespace) -> Dict[str, Any]:
+    started = time.perf_counter()
+    backend = load_backend(name, threads=args.threads, batch_size=args.batch_size, batch_tokens=args.batch_tokens)
+    load_s = time.perf_counter() - started
+
+    backend.encode(chunks[:args.batch_size])  # warm-up
+    started = time.perf_counter()
+    doc_vecs = backend.encode(chunks)
+    elapsed = time.perf_counter() - started
+    query_vecs = backend.encode(queries)
+    return {
+        "backend": name,
+        "load_s": round(load_s, 2),
+        "embed_s": round(elapsed, 2),
+        "docs_per_sec": round(len(chunks) / elapsed, 1) if elapsed else None,
+        "_neighbours": top_k(doc_vecs, query_vecs, args.k),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="Compare embedding backends on a local corpus")
+    p.add_argument("--corpus", required=True, help="directory of .pdf/.txt/.md files")
+    p.add_argument("--backends", default=",".join(BACKENDS), help="comma-separated; the first is the recall reference")
+    p.add_argument("--limit", type=int, default=2000, help="max chunks to embed")
+    p.add_argument("--queries", type=int, default=200)
+    p.add_argument("--k", type=int, default=10)
+    p.add_argument("--threads", type=int, default=int(os.getenv("EMBEDDING_THREADS", "0")))
+    p.add_argument("--batch-size", type=int, default=EMBEDDING_BATCH_SIZE)
+    p.add_argument("--batch-tokens", type=int, default=EMBEDDING_BATCH_TOKENS)
+    p.add_argument("--seed", type=int, default=7)
+    p.add_argument("--output", help="also write the report to this path")
+    args = p.parse_args(argv)
+
+    chunks = load_corpus(args.corpus, args.limit)
+    if len(chunks) <= args.k:
+        print(f"[BENCH] Corpus too small: {len(chunks)} chunks")
+        return 2
+    query_ids = make_queries(chunks, args.queries, random.Random(args.seed))
+    queries = [query_text(chunks[i]) for i in query_ids]
+    print(f"[BENCH] {len(chunks)} chunks, {len(queries)} queries, k={args.k}")
+
+    results = []
+    for name in [b.strip() for b in args.backends.split(",") if b.strip()]:
+        print(f"[BENCH] Running {name}...")
+        results.append(run_backend(name, chunks, queries, args))
+
+    reference = results[0]["_neighbours"]
+    for result in results:
+        neighbours = result.pop("_neighbours")
+        overlap = [len(set(a) & set(b)) / args.k for a, b in zip(neighbours, reference)]
+        result["recall_at_k"] = round(float(np.mean(overlap)), 4)
+        result["self_hit_at_k"] = round(float(np.mean([q in row for q, row in zip(query_ids, neighbours)])), 4)
+        if result is not results[0] and results[0]["docs_per_sec"]:
+            result["speedup"] = round(result["docs_per_sec"] / results[0]["docs_per_sec"], 2)
+
+    report = {
+        "reference": results[0]["backend"],
+        "results": results,
+        "config": {
+            "chunks": len(chunks),
+            "queries": len(queries),
+            "k": args.k,
+            "threads": args.threads,
+            "batch_size": args.batch_size,
+            "batch_tokens": args.batch_tokens,
+        },
+        "environment": {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count()},
+        "recorded_at": datetime.now(timezone.utc).isoformat(),
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
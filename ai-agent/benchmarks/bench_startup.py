@@ -0,0 +1,122 @@
+"""
+Prysm AI Agent - Cold-start benchmark.
+
+Imports main in fresh interpreters and reports:
+- import_ms        time to import main (what uvicorn waits for before accepting connections)
+- <component>_ms   time for each lazy component's first load afterwards (see readiness.py)
+- slowest_imports  modules with the largest cumulative import time in main's import
+                   (from `python -X importtime`, first run only)
+
+Medians are taken over --runs. With --max-import-ms the exit code is 1 when the
+median import time exceeds it, so a regression fails CI.
+
+Usage (from ai-agent/):
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --runs 5 --components graph,rag --max-import-ms 1500
+"""
+import os
+import sys
+import json
+import argparse
+import platform
+import statistics
+import subprocess
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+AGENT_DIR = Path(__file__).resolve().parent.parent
+
+# Runs in the child interpreter; prints one JSON line.
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import main
+timings = {"import_ms": (time.perf_counter() - started) * 1000}
+from readiness import COMPONENTS
+for name in sys.argv[1:]:
+    started = time.perf_counter()
+    try:
+        COMPONENTS[name].get()
+        timings[name + "_ms"] = (time.perf_counter() - started) * 1000
+    except Exception as e:
+        timings[name + "_error"] = str(e)
+print("BENCH_RESULT " + json.dumps(timings))
+"""
+
+
+def run_once(components: List[str], importtime: bool) -> Dict[str, Any]:
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ["-X", "importtime"]
+    cmd += ["-c", CHILD, *components]
+    proc = subprocess.run(cmd, cwd=AGENT_DIR, capture_output=True, text=True)
+    for line in proc.stdout.splitlines():
+        if line.startswith("BENCH_RESULT "):
+            result = json.loads(line[len("BENCH_RESULT "):])
+            if importtime:
+                result["_importtime"] = proc.stderr
+            return result
+    raise RuntimeError(f"Child exited with {proc.returncode}: {proc.stderr[-2000:]}")
+
+
+def slowest_imports(stderr: str, top: int) -> List[Dict[str, Any]]:
+    """Top-level packages by cumulative import time from `-X importtime` output."""
+    totals: Dict[str, int] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        try:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            cumulative_us = int(cumulative)
+        except ValueError:
+            continue  # header line
+        # Nested imports are indented further; top-level entries already include them.
+        if len(name) - len(name.lstrip()) > 1:
+            continue
+        package = name.strip().split(".")[0]
+        totals[package] = totals.get(package, 0) + cumulative_us
+    ranked = sorted(totals.items(), key=lambda kv: kv[1], reverse=True)[:top]
+    return [{"module": m, "cumulative_ms": round(us / 1000, 1)} for m, us in ranked]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    p = argparse.ArgumentParser(description="Measure ai-agent cold start")
+    p.add_argument("--runs", type=int, default=3)
+    p.add_argument("--components", default="", help="comma-separated lazy components to load after import (market_data,graph,rag)")
+    p.add_argument("--top", type=int, default=15, help="slowest imports to list")
+    p.add_argument("--max-import-ms", type=float, help="fail when the median import time exceeds this")
+    p.add_argument("--output", help="also write the report to this path")
+    args = p.parse_args(argv)
+
+    components = [c.strip() for c in args.components.split(",") if c.strip()]
+    runs = []
+    for i in range(args.runs):
+        print(f"[BENCH] Run {i + 1}/{args.runs}...")
+        runs.append(run_once(components, importtime=(i == 0)))
+    importtime = runs[0].pop("_importtime", "")
+
+    medians = {}
+    for key in runs[0]:
+        if key.endswith("_ms"):
+            values = [r[key] for r in runs if key in r]
+            medians[key] = round(statistics.median(values), 1)
+    report = {
+        "median": medians,
+        "runs": [{k: round(v, 1) if isinstance(v, float) else v for k, v in r.items()} for r in runs],
+        "slowest_imports": slowest_imports(importtime, args.top),
+        "config": {"runs": args.runs, "components": components, "startup_preload": os.getenv("STARTUP_PRELOAD", "all")},
+        "environment": {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count()},
+        "recorded_at": datetime.now(timezone.utc).isoformat(),
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    if args.max_import_ms is not None and medians.get("import_ms", 0) > args.max_import_ms:
+        print(f"[BENCH] Median import time {medians['import_ms']}ms exceeds {args.max_import_ms}ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
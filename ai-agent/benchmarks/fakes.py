@@ -0,0 +1,274 @@
+"""
+In-process fakes for benchmarking the agent offline:
+- FakeMotorDatabase: an in-memory stand-in for the motor collections the agent uses
+- FakeTicker / fake_download: deterministic yfinance replacements with configurable latency
+- fake_feedparser_parse: deterministic RSS feeds
+
+`install_market_fakes()` patches yfinance and feedparser in place so the real
+stock_data.py / tools.py code paths run against them. Gemini is replaced by
+LLM_PROVIDER=fake (see llm_provider.py).
+"""
+import copy
+import time
+import random
+import hashlib
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+
+# --- Mongo (motor) ---
+
+def _get_path(doc: Dict[str, Any], path: str) -> Any:
+    cur: Any = doc
+    for part in path.split("."):
+        if not isinstance(cur, dict):
+            return None
+        cur = cur.get(part)
+    return cur
+
+
+def _matches(doc: Dict[str, Any], query: Dict[str, Any]) -> bool:
+    for key, cond in (query or {}).items():
+        if key == "$or":
+            if not any(_matches(doc, sub) for sub in cond):
+                return False
+            continue
+        value = _get_path(doc, key)
+        if isinstance(cond, dict) and any(k.startswith("$") for k in cond):
+            for op, arg in cond.items():
+                if op == "$lt" and not (value is not None and value < arg):
+                    return False
+                if op == "$gt" and not (value is not None and value > arg):
+                    return False
+                if op == "$in" and value not in arg:
+                    return False
+        elif value != cond:
+            return False
+    return True
+
+
+def _project(doc: Dict[str, Any], projection: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if not projection:
+        return copy.deepcopy(doc)
+    out: Dict[str, Any] = {"_id": doc.get("_id")}
+    inclusive = any(v == 1 for v in projection.values())
+    if not inclusive:
+        out = copy.deepcopy(doc)
+    for field, spec in projection.items():
+        if isinstance(spec, dict) and "$slice" in spec:
+            start, n = spec["$slice"]
+            out[field] = copy.deepcopy((doc.get(field) or [])[start:start + n])
+        elif spec == 1 and field in doc:
+            out[field] = copy.deepcopy(doc[field])
+        elif spec == 0:
+            out.pop(field, None)
+    return out
+
+
+class FakeCursor:
+    def __init__(self, docs: List[Dict[str, Any]]):
+        self._docs = docs
+
+    def sort(self, key_or_list, direction: Optional[int] = None) -> "FakeCursor":
+        keys = key_or_list if isinstance(key_or_list, list) else [(key_or_list, direction or 1)]
+        for key, d in reversed(keys):
+            self._docs.sort(key=lambda doc: (_get_path(doc, key) is None, _get_path(doc, key)), reverse=d < 0)
+        return self
+
+    def limit(self, n: int) -> "FakeCursor":
+        self._docs = self._docs[:n]
+        return self
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        return self._docs[:length] if length else self._docs
+
+
+class FakeCollection:
+    def __init__(self, latency_ms: float = 1.0):
+        self.docs: Dict[Any, Dict[str, Any]] = {}
+        self.latency = latency_ms / 1000.0
+        self.ops = 0
+
+    async def _io(self) -> None:
+        import asyncio
+        self.ops += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def create_index(self, *args: Any, **kwargs: Any) -> str:
+        return kwargs.get("name", "idx")
+
+    async def find_one(self, query: Dict[str, Any], projection: Optional[Dict[str, Any]] = None):
+        await self._io()
+        for doc in self.docs.values():
+            if _matches(doc, query):
+                return _project(doc, projection)
+        return None
+
+    def find(self, query: Optional[Dict[str, Any]] = None, projection: Optional[Dict[str, Any]] = None) -> FakeCursor:
+        self.ops += 1
+        return FakeCursor([_project(d, projection) for d in self.docs.values() if _matches(d, query or {})])
+
+    async def insert_one(self, doc: Dict[str, Any]) -> None:
+        await self._io()
+        self.docs[doc["_id"]] = copy.deepcopy(doc)
+
+    async def replace_one(self, query: Dict[str, Any], doc: Dict[str, Any], upsert: bool = False) -> None:
+        await self._io()
+        self.docs[query["_id"]] = copy.deepcopy(doc)
+
+    async def update_one(self, query: Dict[str, Any], update: Dict[str, Any], upsert: bool = False) -> None:
+        await self._io()
+        self._apply(query, update, upsert)
+
+    async def bulk_write(self, ops: List[Any], ordered: bool = True) -> None:
+        await self._io()
+        for op in ops:
+            # pymongo.UpdateOne keeps its arguments on private attributes.
+            self._apply(op._filter, op._doc, op._upsert)
+
+    def aggregate(self, pipeline: List[Dict[str, Any]]) -> FakeCursor:
+        # Supports the {$match: {_id}} + {$project: {total: {$size: messages}}} pipeline used by the API.
+        match = pipeline[0].get("$match", {})
+        docs = [d for d in self.docs.values() if _matches(d, match)]
+        return FakeCursor([{"_id": d["_id"], "total": len(d.get("messages") or [])} for d in docs])
+
+    def _apply(self, query: Dict[str, Any], update: Dict[str, Any], upsert: bool) -> None:
+        doc = next((d for d in self.docs.values() if _matches(d, query)), None)
+        if doc is None:
+            if not upsert:
+                return
+            doc = {"_id": query["_id"]}
+            doc.update(copy.deepcopy(update.get("$setOnInsert", {})))
+            self.docs[doc["_id"]] = doc
+        for key, value in update.get("$set", {}).items():
+            doc[key] = copy.deepcopy(value)
+        for key in update.get("$unset", {}):
+            doc.pop(key, None)
+        for key, value in update.get("$push", {}).items():
+            items = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+            doc.setdefault(key, []).extend(copy.deepcopy(items))
+
+
+class FakeMotorDatabase:
+    def __init__(self, latency_ms: float = 1.0):
+        self._latency = latency_ms
+        self._collections: Dict[str, FakeCollection] = {}
+
+    def __getattr__(self, name: str) -> FakeCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def __getitem__(self, name: str) -> FakeCollection:
+        if name not in self._collections:
+            self._collections[name] = FakeCollection(self._latency)
+        return self._collections[name]
+
+
+# --- yfinance ---
+
+MARKET_LATENCY_MS = 50.0
+
+
+def _seed(symbol: str) -> int:
+    return int(hashlib.sha1(symbol.encode()).hexdigest()[:8], 16)
+
+
+def _sleep():
+    if MARKET_LATENCY_MS:
+        time.sleep(MARKET_LATENCY_MS / 1000.0)
+
+
+class _FastInfo:
+    def __init__(self, price: float):
+        self.last_price = price
+
+
+class FakeTicker:
+    def __init__(self, symbol: str, *args: Any, **kwargs: Any):
+        self.ticker = symbol
+        self._rng = random.Random(_seed(symbol))
+        self._price = round(self._rng.uniform(100, 4000), 2)
+
+    @property
+    def info(self) -> Dict[str, Any]:
+        _sleep()
+        r, p = self._rng, self._price
+        return {
+            "currentPrice": p, "previousClose": round(p * 0.99, 2), "open": p, "dayHigh": p * 1.01, "dayLow": p * 0.98,
+            "volume": 1_250_000, "marketCap": int(p * 5e8), "trailingPE": round(r.uniform(10, 60), 2),
+            "forwardPE": round(r.uniform(10, 50), 2), "pegRatio": 1.4, "priceToBook": round(r.uniform(1, 15), 2),
+            "trailingEps": round(p / 30, 2), "dividendRate": 12.0, "dividendYield": 0.012,
+            "fiftyTwoWeekHigh": p * 1.2, "fiftyTwoWeekLow": p * 0.8, "grossMargins": 0.42, "operatingMargins": 0.24,
+            "profitMargins": 0.18, "returnOnEquity": 0.21, "returnOnAssets": 0.09, "totalRevenue": int(p * 1e8),
+            "revenueGrowth": 0.11, "earningsGrowth": 0.09, "ebitda": int(p * 3e7), "totalCash": int(p * 1e7),
+            "totalDebt": int(p * 5e6), "debtToEquity": round(r.uniform(0, 2.5), 2), "currentRatio": 1.8,
+            "quickRatio": 1.2, "operatingCashflow": int(p * 2e7), "freeCashflow": int(p * 1.5e7),
+            "beta": round(r.uniform(0.6, 1.8), 2), "targetMeanPrice": p * 1.1, "recommendationKey": "buy",
+            "sector": "Technology", "industry": "IT Services", "longName": f"{self.ticker} Ltd",
+            "longBusinessSummary": f"{self.ticker} is a synthetic company used for offline benchmarks.",
+        }
+
+    @property
+    def fast_info(self) -> _FastInfo:
+        return _FastInfo(self._price)
+
+    def history(self, period: str = "1y", **kwargs: Any) -> pd.DataFrame:
+        _sleep()
+        days = {"3mo": 63, "1y": 250, "5y": 1250}.get(period, 250)
+        end = datetime(2025, 1, 1)
+        idx = pd.DatetimeIndex([end - timedelta(days=days - i) for i in range(days)], name="Date")
+        closes = [self._price * (1 + 0.001 * ((i * 7919) % 41 - 20)) for i in range(days)]
+        return pd.DataFrame({
+            "Open": closes, "High": [c * 1.01 for c in closes], "Low": [c * 0.99 for c in closes],
+            "Close": closes, "Volume": [1_000_000] * days,
+        }, index=idx)
+
+    @property
+    def major_holders(self) -> pd.DataFrame:
+        return pd.DataFrame({"Value": [0.5, 0.3]}, index=pd.Index(["insidersPercentHeld", "institutionsPercentHeld"], name="Breakdown"))
+
+    @property
+    def calendar(self) -> Dict[str, Any]:
+        return {"Earnings Date": [datetime(2025, 1, 20).date()]}
+
+    @property
+    def news(self) -> List[Dict[str, Any]]:
+        _sleep()
+        return [{"title": f"{self.ticker} headline {i}", "publisher": "Yahoo Finance", "link": "https://example.invalid", "providerPublishTime": 0} for i in range(3)]
+
+
+def fake_download(symbol: str, *args: Any, **kwargs: Any) -> pd.DataFrame:
+    return FakeTicker(symbol).history(period="3mo").tail(5)
+
+
+# --- feedparser ---
+
+def fake_feedparser_parse(url: str, *args: Any, **kwargs: Any):
+    import feedparser
+
+    _sleep()
+    entries = [
+        feedparser.FeedParserDict({
+            "title": f"Market update {i}: stocks in focus",
+            "link": f"https://example.invalid/{i}",
+            "published": "Mon, 06 Jan 2025 09:00:00 GMT",
+        })
+        for i in range(10)
+    ]
+    return feedparser.FeedParserDict({"entries": entries})
+
+
+def install_market_fakes(latency_ms: float = MARKET_LATENCY_MS) -> None:
+    """Patch yfinance and feedparser so stock_data/tools hit the fakes."""
+    global MARKET_LATENCY_MS
+    import yfinance
+    import feedparser
+
+    MARKET_LATENCY_MS = latency_ms
+    yfinance.Ticker = FakeTicker
+    yfinance.download = fake_download
+    feedparser.parse = fake_feedparser_parse
@@ -0,0 +1,232 @@
+"""
+Prysm AI Agent - Local BM25 index over the RAG chunks.
+An inverted index kept in SQLite next to the Chroma collections: rag_service
+writes every chunk to both and deletes from both. Exact-term lookups
+("EBITDA margin FY24", "contingent liabilities") are answered here without an
+embedding; rag_service.query_rag fuses it with dense results otherwise.
+Chunks carry their namespace (see rag_scope.py), document, ticker and upload
+time, so searches apply the same scoping and filters as the dense side.
+"""
+import os
+import re
+import math
+import sqlite3
+import threading
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+BM25_INDEX_PATH = os.getenv("BM25_INDEX_PATH") or os.path.join(os.path.dirname(__file__), "bm25_index.sqlite3")
+BM25_K1 = 1.2
+BM25_B = 0.75
+# SQLite caps bound parameters per statement.
+_PARAM_SLICE = 500
+# Bumped when the table layout changes; an older file is dropped and rebuilt by sync().
+_SCHEMA_VERSION = 2
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.%][a-z0-9]+)*%?")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how in is it its of on or that the this to was were what when "
+    "which who why with about does did do their there these those than then into over under".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall((text or "").lower()) if t not in STOPWORDS]
+
+
+class IndexedChunk(NamedTuple):
+    chunk_id: str
+    text: str
+    source: str
+    namespace: str
+    ticker: Optional[str] = None
+    uploaded_at: Optional[int] = None
+
+
+class LexicalHit:
+    __slots__ = ("chunk_id", "score", "text", "matched")
+
+    def __init__(self, chunk_id: str, score: float, text: str, matched: int):
+        self.chunk_id = chunk_id
+        self.score = score
+        self.text = text
+        # Distinct query terms present in the chunk.
+        self.matched = matched
+
+
+class BM25Index:
+    def __init__(self, path: str = BM25_INDEX_PATH):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        # (chunk count, total length), recomputed after writes.
+        self._totals: Optional[Tuple[int, int]] = None
+        self.synced = False
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            if conn.execute("PRAGMA user_version").fetchone()[0] != _SCHEMA_VERSION:
+                conn.execute("DROP TABLE IF EXISTS postings")
+                conn.execute("DROP TABLE IF EXISTS chunks")
+                conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                " chunk_id TEXT PRIMARY KEY, source TEXT NOT NULL, namespace TEXT NOT NULL,"
+                " ticker TEXT, uploaded_at INTEGER, length INTEGER NOT NULL, text TEXT NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS postings ("
+                " term TEXT NOT NULL, chunk_id TEXT NOT NULL, tf INTEGER NOT NULL,"
+                " PRIMARY KEY (term, chunk_id)) WITHOUT ROWID"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS postings_chunk ON postings (chunk_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS chunks_source ON chunks (source)")
+            conn.execute("CREATE INDEX IF NOT EXISTS chunks_namespace ON chunks (namespace)")
+            self._conn = conn
+        return self._conn
+
+    # --- writes ---
+
+    def add(self, chunks: Iterable[IndexedChunk]) -> None:
+        chunk_rows, posting_rows = [], []
+        for chunk in chunks:
+            terms = tokenize(chunk.text)
+            chunk_rows.append((chunk.chunk_id, chunk.source, chunk.namespace, chunk.ticker, chunk.uploaded_at, len(terms), chunk.text))
+            posting_rows.extend((term, chunk.chunk_id, tf) for term, tf in Counter(terms).items())
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?, ?, ?, ?)", chunk_rows)
+                conn.executemany("INSERT OR REPLACE INTO postings VALUES (?, ?, ?)", posting_rows)
+            self._totals = None
+
+    def delete_source(self, source: str, namespace: str) -> None:
+        self._delete_where(source=source, namespace=namespace)
+
+    def delete_namespace(self, namespace: str) -> None:
+        self._delete_where(namespace=namespace)
+
+    def _delete_where(self, **columns: str) -> None:
+        where = " AND ".join(f"{column} = ?" for column in columns)
+        args = tuple(columns.values())
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute(f"DELETE FROM postings WHERE chunk_id IN (SELECT chunk_id FROM chunks WHERE {where})", args)
+                conn.execute(f"DELETE FROM chunks WHERE {where}", args)
+            self._totals = None
+
+    def clear(self) -> None:
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("DELETE FROM postings")
+                conn.execute("DELETE FROM chunks")
+            self._totals = None
+
+    def sync(self, expected: int, load_all: Callable[[], Iterable[IndexedChunk]]) -> None:
+        """
+        Rebuild from the vector store when the chunk counts disagree (first run
+        on an existing collection, or an interrupted write).
+        """
+        if self.count() != expected:
+            print(f"[BM25] Rebuilding index from the vector store ({expected} chunks)")
+            self.clear()
+            batch: List[IndexedChunk] = []
+            for chunk in load_all():
+                batch.append(chunk)
+                if len(batch) >= _PARAM_SLICE:
+                    self.add(batch)
+                    batch = []
+            if batch:
+                self.add(batch)
+        self.synced = True
+
+    # --- reads ---
+
+    def count(self) -> int:
+        return self._stats()[0]
+
+    def _stats(self) -> Tuple[int, int]:
+        with self._lock:
+            if self._totals is None:
+                n, total = self._connection().execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM chunks").fetchone()
+                self._totals = (n, total)
+            return self._totals
+
+    def search(
+        self,
+        query: str,
+        k: int,
+        namespaces: Optional[Sequence[str]] = None,
+        source: Optional[str] = None,
+        ticker: Optional[str] = None,
+        uploaded_after: Optional[int] = None,
+        uploaded_before: Optional[int] = None,
+    ) -> Tuple[List[LexicalHit], int]:
+        """
+        Top-k chunks by BM25 among those matching the filters, and the number of
+        distinct query terms searched for. IDF and length statistics are corpus-wide.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        n, total_length = self._stats()
+        if not terms or not n:
+            return [], len(terms)
+        filter_sql, filter_args = _filter_clause(namespaces, source, ticker, uploaded_after, uploaded_before)
+        avgdl = total_length / n
+        scores: Dict[str, float] = {}
+        matched: Dict[str, int] = {}
+        with self._lock:
+            conn = self._connection()
+            for i in range(0, len(terms), _PARAM_SLICE):
+                part = terms[i:i + _PARAM_SLICE]
+                marks = ",".join("?" * len(part))
+                df = dict(conn.execute(f"SELECT term, COUNT(*) FROM postings WHERE term IN ({marks}) GROUP BY term", part))
+                rows = conn.execute(
+                    f"SELECT p.term, p.chunk_id, p.tf, c.length FROM postings p JOIN chunks c ON c.chunk_id = p.chunk_id"
+                    f" WHERE p.term IN ({marks}){filter_sql}",
+                    [*part, *filter_args],
+                )
+                for term, chunk_id, tf, length in rows:
+                    idf = math.log(1 + (n - df[term] + 0.5) / (df[term] + 0.5))
+                    norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avgdl)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+                    matched[chunk_id] = matched.get(chunk_id, 0) + 1
+            top = sorted(scores, key=scores.get, reverse=True)[:k]
+            texts = dict(conn.execute(
+                f"SELECT chunk_id, text FROM chunks WHERE chunk_id IN ({','.join('?' * len(top))})", top
+            )) if top else {}
+        return [LexicalHit(c, scores[c], texts.get(c, ""), matched[c]) for c in top], len(terms)
+
+
+def _filter_clause(
+    namespaces: Optional[Sequence[str]],
+    source: Optional[str],
+    ticker: Optional[str],
+    uploaded_after: Optional[int],
+    uploaded_before: Optional[int],
+) -> Tuple[str, List[Any]]:
+    clauses: List[str] = []
+    args: List[Any] = []
+    if namespaces:
+        clauses.append(f"c.namespace IN ({','.join('?' * len(namespaces))})")
+        args.extend(namespaces)
+    if source:
+        clauses.append("c.source = ?")
+        args.append(source)
+    if ticker:
+        clauses.append("c.ticker = ?")
+        args.append(ticker)
+    if uploaded_after is not None:
+        clauses.append("c.uploaded_at >= ?")
+        args.append(uploaded_after)
+    if uploaded_before is not None:
+        clauses.append("c.uploaded_at <= ?")
+        args.append(uploaded_before)
+    return "".join(f" AND {c}" for c in clauses), args
+
+
+bm25_index = BM25Index()
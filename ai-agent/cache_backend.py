@@ -0,0 +1,329 @@
+"""
+Prysm AI Agent - Cache backends for market data and tool results.
+stock_data.py and tools.py cache upstream responses (quotes and fundamentals,
+price history, news) through `cache`, chosen by CACHE_BACKEND:
+- memory: an in-process LRU (the default; each uvicorn worker has its own)
+- sqlite: a local SQLite file (CACHE_SQLITE_PATH) shared by every worker on the
+  host, so one worker's Yahoo fetch serves the others
+
+Both backends have the same TTL rule: an entry stored with `ttl` seconds expires
+at wall-clock time set + ttl (wall clock, because workers do not share a
+monotonic clock), and a ttl <= 0 stores nothing. The memory backend keeps the
+objects themselves, so callers must not mutate what they get back.
+
+The sqlite backend stores JSON (dates as ISO strings, tuples as lists); only
+pandas objects (price history) are pickled. Payloads over
+CACHE_COMPRESS_MIN_BYTES are zlib-compressed. Unpickling runs code chosen by
+whoever wrote the blob, so the file is created 0600 and must only be writable
+by the user the workers run as; do not point CACHE_SQLITE_PATH at a shared or
+world-writable location.
+"""
+import os
+import abc
+import json
+import time
+import zlib
+import pickle
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from telemetry import count_event
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").lower()
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "2048"))
+CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH") or os.path.join(os.path.dirname(__file__), "shared_cache.sqlite3")
+CACHE_COMPRESS_MIN_BYTES = int(os.getenv("CACHE_COMPRESS_MIN_BYTES", "1024"))
+# Expired rows are purged (and the file trimmed to CACHE_MAX_ENTRIES) every this many writes.
+_SQLITE_PURGE_EVERY = 256
+
+# Returned by get() on a miss, since None is a valid cached value (a failed fetch).
+MISS = object()
+
+# First byte: payload format; second byte: compression.
+_JSON = b"j"
+_PICKLE = b"p"
+_RAW = b"-"
+_ZLIB = b"z"
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if hasattr(value, "item") and callable(value.item):
+        return value.item()  # numpy scalars
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _is_pandas(value: Any) -> bool:
+    return type(value).__module__.split(".")[0] == "pandas"
+
+
+def encode(value: Any) -> bytes:
+    """JSON for plain data, pickle for pandas objects; TypeError for anything else."""
+    if _is_pandas(value):
+        kind, payload = _PICKLE, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    else:
+        kind, payload = _JSON, json.dumps(value, default=_json_default, separators=(",", ":")).encode("utf-8")
+    if len(payload) >= CACHE_COMPRESS_MIN_BYTES:
+        return kind + _ZLIB + zlib.compress(payload, 6)
+    return kind + _RAW + payload
+
+
+def decode(blob: bytes) -> Any:
+    kind, compression, payload = blob[:1], blob[1:2], blob[2:]
+    if compression == _ZLIB:
+        payload = zlib.decompress(payload)
+    if kind == _JSON:
+        return json.loads(payload)
+    if kind == _PICKLE:
+        return pickle.loads(payload)
+    raise ValueError(f"unknown payload format {kind!r}")
+
+
+def expires_at(ttl: float, now: Optional[float] = None) -> float:
+    return (time.time() if now is None else now) + ttl
+
+
+def is_live(expiry: float, now: Optional[float] = None) -> bool:
+    return (time.time() if now is None else now) < expiry
+
+
+class CacheBackend(abc.ABC):
+    """get/set/delete by (namespace, key); namespaces group one kind of data (e.g. "stock_data")."""
+
+    name = "base"
+
+    def __init__(self):
+        # Per-key [lock, users] so concurrent misses in one process fetch once. The entry
+        # is removed by the last thread that used it, never while another waits on it.
+        self._inflight: Dict[Tuple[str, Hashable], List[Any]] = {}
+        self._inflight_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @abc.abstractmethod
+    def get(self, namespace: str, key: Hashable) -> Any:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def set(self, namespace: str, key: Hashable, value: Any, ttl: float) -> None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def delete(self, namespace: str, key: Hashable) -> None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def clear(self, namespace: Optional[str] = None) -> None:
+        raise NotImplementedError
+
+    def get_or_set(
+        self,
+        namespace: str,
+        key: Hashable,
+        ttl: float,
+        produce: Callable[[], Any],
+        refresh: bool = False,
+        failure_ttl: Optional[float] = None,
+    ) -> Any:
+        """
+        Cached value, or produce() stored for `ttl` seconds. With ttl <= 0 the cache
+        is bypassed; with `refresh` produce() always runs and replaces the entry
+        (the warmer uses this to renew entries before they expire). A None result
+        (a failed fetch) is kept for at most `failure_ttl` seconds when given.
+        """
+        if ttl <= 0:
+            return produce()
+        if not refresh:
+            value = self._lookup(namespace, key)
+            if value is not MISS:
+                return value
+        slot_key = (namespace, key)
+        with self._inflight_lock:
+            slot = self._inflight.setdefault(slot_key, [threading.Lock(), 0])
+            slot[1] += 1
+        try:
+            with slot[0]:
+                # Another thread may have filled it while this one waited.
+                value = MISS if refresh else self.get(namespace, key)
+                if value is MISS:
+                    value = produce()
+                    store_ttl = min(ttl, failure_ttl) if value is None and failure_ttl is not None else ttl
+                    self.set(namespace, key, value, store_ttl)
+        finally:
+            with self._inflight_lock:
+                slot[1] -= 1
+                if slot[1] == 0:
+                    del self._inflight[slot_key]
+        return value
+
+    def _lookup(self, namespace: str, key: Hashable) -> Any:
+        value = self.get(namespace, key)
+        result = "miss" if value is MISS else "hit"
+        if value is MISS:
+            self.misses += 1
+        else:
+            self.hits += 1
+        count_event("cache", cache=namespace, result=result)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
+
+
+class MemoryCache(CacheBackend):
+    name = "memory"
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        super().__init__()
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, Hashable], Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, namespace: str, key: Hashable) -> Any:
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is None:
+                return MISS
+            expiry, value = entry
+            if not is_live(expiry):
+                del self._entries[(namespace, key)]
+                return MISS
+            self._entries.move_to_end((namespace, key))
+            return value
+
+    def set(self, namespace: str, key: Hashable, value: Any, ttl: float) -> None:
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[(namespace, key)] = (expires_at(ttl), value)
+            self._entries.move_to_end((namespace, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, namespace: str, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop((namespace, key), None)
+
+    def clear(self, namespace: Optional[str] = None) -> None:
+        with self._lock:
+            if namespace is None:
+                self._entries.clear()
+            else:
+                for k in [k for k in self._entries if k[0] == namespace]:
+                    del self._entries[k]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = len(self._entries)
+        return {**super().stats(), "entries": size}
+
+
+class SqliteCache(CacheBackend):
+    """One row per entry; WAL lets workers read while another writes. Keys are stored as str(key)."""
+
+    name = "sqlite"
+
+    def __init__(self, path: str = CACHE_SQLITE_PATH, max_entries: int = CACHE_MAX_ENTRIES):
+        super().__init__()
+        self.path = path
+        self.max_entries = max_entries
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            # Opened lazily: a forked worker must not inherit the parent's connection.
+            # Owner-only: entries are unpickled on read (see the module docstring).
+            os.close(os.open(self.path, os.O_CREAT | os.O_RDWR, 0o600))
+            os.chmod(self.path, 0o600)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " namespace TEXT NOT NULL, key TEXT NOT NULL, expires_at REAL NOT NULL, value BLOB NOT NULL,"
+                " PRIMARY KEY (namespace, key)) WITHOUT ROWID"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires_at)")
+            self._conn = conn
+        return self._conn
+
+    def get(self, namespace: str, key: Hashable) -> Any:
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT expires_at, value FROM cache WHERE namespace = ? AND key = ?", (namespace, str(key))
+            ).fetchone()
+        if row is None or not is_live(row[0]):
+            return MISS
+        try:
+            return decode(row[1])
+        except Exception as e:
+            print(f"[CACHE] Dropping unreadable entry {namespace}/{key}: {e}")
+            self.delete(namespace, key)
+            return MISS
+
+    def set(self, namespace: str, key: Hashable, value: Any, ttl: float) -> None:
+        if ttl <= 0:
+            return
+        try:
+            blob = encode(value)
+        except (TypeError, ValueError) as e:
+            print(f"[CACHE] Not caching {namespace}/{key}: {e}")
+            return
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)", (namespace, str(key), expires_at(ttl), blob)
+                )
+            self._writes += 1
+            if self._writes % _SQLITE_PURGE_EVERY == 0:
+                self._purge(conn)
+
+    def _purge(self, conn: sqlite3.Connection) -> None:
+        with conn:
+            conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+            # Over the cap: drop the entries closest to expiry.
+            conn.execute(
+                "DELETE FROM cache WHERE (namespace, key) IN (SELECT namespace, key FROM cache ORDER BY expires_at"
+                " LIMIT MAX(0, (SELECT COUNT(*) FROM cache) - ?))",
+                (self.max_entries,),
+            )
+
+    def delete(self, namespace: str, key: Hashable) -> None:
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (namespace, str(key)))
+
+    def clear(self, namespace: Optional[str] = None) -> None:
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                if namespace is None:
+                    conn.execute("DELETE FROM cache")
+                else:
+                    conn.execute("DELETE FROM cache WHERE namespace = ?", (namespace,))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = self._connection().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        return {**super().stats(), "entries": size}
+
+
+BACKENDS = {"memory": MemoryCache, "sqlite": SqliteCache}
+
+
+def load_cache_backend(name: str = CACHE_BACKEND) -> CacheBackend:
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown CACHE_BACKEND {name!r}; expected one of {', '.join(BACKENDS)}")
+    return BACKENDS[name]()
+
+
+cache = load_cache_backend()
@@ -0,0 +1,51 @@
+"""
+Prysm AI Agent - Run cancellation.
+A RunScope is bound to each /chat run through a context variable, so it is visible
+from the graph, from tools running in executor threads, and from data fetchers.
+Blocking code cannot be interrupted, so it calls `check_cancelled()` before each
+upstream request and stops early once the client has gone away.
+"""
+import threading
+from contextvars import ContextVar
+from typing import Optional
+
+
+class RunCancelled(Exception):
+    """Raised inside a run whose client disconnected."""
+
+
+class IngestCancelled(Exception):
+    """Raised inside an ingestion job that was cancelled (DELETE /upload_doc/{job_id})."""
+
+
+class RunScope:
+    def __init__(self):
+        self._cancelled = threading.Event()
+        self.reason: Optional[str] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        if not self._cancelled.is_set():
+            self.reason = reason
+            self._cancelled.set()
+
+
+_current_run: ContextVar[Optional[RunScope]] = ContextVar("prysm_current_run", default=None)
+
+
+def bind_run(scope: Optional[RunScope]) -> None:
+    """Bind `scope` to the current context (call at the top of the task that owns the run)."""
+    _current_run.set(scope)
+
+
+def current_run() -> Optional[RunScope]:
+    return _current_run.get()
+
+
+def check_cancelled() -> None:
+    scope = _current_run.get()
+    if scope is not None and scope.cancelled:
+        raise RunCancelled(scope.reason or "cancelled")
@@ -0,0 +1,350 @@
+"""
+Prysm AI Agent - Record/replay cassettes for upstream market and news data.
+Captures what yfinance, `requests` (Yahoo/Google Finance scraping) and feedparser
+return into a local cassette directory, and plays it back offline. Playback can
+add latency and inject errors, so benchmarks and fallback-chain timing runs are
+deterministic.
+
+    CASSETTE_MODE=record  CASSETTE_DIR=cassettes/nifty  -> call upstream, save every response
+    CASSETTE_MODE=replay  CASSETTE_DIR=cassettes/nifty  -> never touch the network
+
+Playback knobs (replay mode only):
+- CASSETTE_LATENCY_MS: fixed delay per call, or "recorded" to replay the recorded upstream time
+- CASSETTE_JITTER_MS: extra uniform random delay per call
+- CASSETTE_ERROR_RATE: probability (0-1) that a call raises InjectedUpstreamError
+- CASSETTE_ERROR_SOURCES: comma list of sources the error rate applies to (yfinance,requests,feedparser)
+- CASSETTE_FAIL: comma list of "source:operation" that always fail, e.g. "yfinance:info,yfinance:fast_info"
+  to force get_stock_data down its fallback chain
+- CASSETTE_SEED: RNG seed for jitter/error injection
+- CASSETTE_ALLOW_MISSING: 1 to fall through to the real upstream on a cassette miss
+"""
+import os
+import time
+import pickle
+import random
+import hashlib
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Optional, Tuple
+
+DEFAULT_CASSETTE_DIR = str(Path(__file__).parent / "cassettes" / "default")
+
+SOURCES = ("yfinance", "requests", "feedparser")
+
+
+class CassetteMiss(LookupError):
+    """Replay found no recording for a call."""
+
+
+class InjectedUpstreamError(ConnectionError):
+    """Synthetic upstream failure raised by error injection."""
+
+
+def _stable_repr(value: Any) -> str:
+    if isinstance(value, dict):
+        return "{" + ",".join(f"{k!r}:{_stable_repr(v)}" for k, v in sorted(value.items(), key=lambda kv: str(kv[0]))) + "}"
+    if isinstance(value, (list, tuple)):
+        return "[" + ",".join(_stable_repr(v) for v in value) + "]"
+    if isinstance(value, bytes):
+        return hashlib.sha1(value).hexdigest()
+    return repr(value)
+
+
+class CassetteStore:
+    """One pickle file per recorded call under <root>/<source>/<key>.pkl."""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+
+    def key(self, source: str, operation: str, identity: Any) -> str:
+        return hashlib.sha1(f"{source}|{operation}|{_stable_repr(identity)}".encode()).hexdigest()
+
+    def _path(self, source: str, key: str) -> Path:
+        return self.root / source / f"{key}.pkl"
+
+    def load(self, source: str, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(source, key)
+        if not path.exists():
+            return None
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+    def save(self, source: str, key: str, entry: Dict[str, Any]) -> None:
+        path = self._path(source, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+        with self._lock:
+            with open(tmp, "wb") as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+            self.recorded += 1
+
+
+class Cassette:
+    def __init__(
+        self,
+        mode: str,
+        root: str,
+        latency: Optional[str] = None,
+        jitter_ms: Optional[float] = None,
+        error_rate: Optional[float] = None,
+        error_sources: Optional[str] = None,
+        fail: Optional[str] = None,
+        seed: Optional[int] = None,
+        allow_missing: Optional[bool] = None,
+    ):
+        self.mode = mode
+        self.store = CassetteStore(root)
+        latency = latency if latency is not None else os.getenv("CASSETTE_LATENCY_MS", "0")
+        self.replay_recorded_latency = str(latency).strip().lower() == "recorded"
+        self.latency_ms = 0.0 if self.replay_recorded_latency else float(latency or 0)
+        self.jitter_ms = jitter_ms if jitter_ms is not None else float(os.getenv("CASSETTE_JITTER_MS", "0"))
+        self.error_rate = error_rate if error_rate is not None else float(os.getenv("CASSETTE_ERROR_RATE", "0"))
+        sources = error_sources if error_sources is not None else os.getenv("CASSETTE_ERROR_SOURCES", ",".join(SOURCES))
+        self.error_sources = {s.strip() for s in sources.split(",") if s.strip()}
+        fail = fail if fail is not None else os.getenv("CASSETTE_FAIL", "")
+        self.fail = {f.strip() for f in fail.split(",") if f.strip()}
+        self._rng = random.Random(seed if seed is not None else int(os.getenv("CASSETTE_SEED", "0")))
+        self._rng_lock = threading.Lock()
+        self.allow_missing = allow_missing if allow_missing is not None else os.getenv("CASSETTE_ALLOW_MISSING", "0") == "1"
+        self.injected_errors = 0
+        # Set while a yfinance call is being recorded, so its internal HTTP traffic is not recorded twice.
+        self._local = threading.local()
+
+    # --- core ---
+
+    def call(self, source: str, operation: str, identity: Any, real: Callable[[], Any],
+             encode: Callable[[Any], Any] = lambda v: v, decode: Callable[[Any], Any] = lambda v: v) -> Any:
+        if self.mode == "replay":
+            return self._replay(source, operation, identity, real, decode)
+        if self.mode == "record" and not getattr(self._local, "suppress", False):
+            return self._record(source, operation, identity, real, encode)
+        return real()
+
+    def _record(self, source: str, operation: str, identity: Any, real: Callable[[], Any], encode: Callable[[Any], Any]) -> Any:
+        key = self.store.key(source, operation, identity)
+        started = time.perf_counter()
+        self._local.suppress = source == "yfinance"
+        try:
+            value = real()
+        except Exception as e:
+            self.store.save(source, key, self._entry(source, operation, identity, started, error=e))
+            raise
+        finally:
+            self._local.suppress = False
+        self.store.save(source, key, self._entry(source, operation, identity, started, value=encode(value)))
+        return value
+
+    def _replay(self, source: str, operation: str, identity: Any, real: Callable[[], Any], decode: Callable[[Any], Any]) -> Any:
+        entry = self.store.load(source, self.store.key(source, operation, identity))
+        # Forced failures apply even without a recording, so fallback chains can be exercised directly.
+        if f"{source}:{operation}" in self.fail or source in self.fail or (entry is not None and self._roll_error(source)):
+            self._delay(entry or {})
+            self.injected_errors += 1
+            raise InjectedUpstreamError(f"Injected failure for {source}:{operation}")
+        if entry is None:
+            self.store.misses += 1
+            if self.allow_missing:
+                return real()
+            raise CassetteMiss(f"No recording for {source}:{operation} {identity!r} in {self.store.root}")
+        self.store.replayed += 1
+        self._delay(entry)
+        if entry.get("error") is not None:
+            raise entry["error"]
+        return decode(entry["value"])
+
+    def _entry(self, source: str, operation: str, identity: Any, started: float, value: Any = None, error: Optional[BaseException] = None) -> Dict[str, Any]:
+        entry = {
+            "source": source,
+            "operation": operation,
+            "identity": _stable_repr(identity),
+            "value": value,
+            "error": None,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+            "recorded_at": time.time(),
+        }
+        if error is not None:
+            try:
+                pickle.dumps(error)
+                entry["error"] = error
+            except Exception:
+                entry["error"] = RuntimeError(f"{type(error).__name__}: {error}")
+        return entry
+
+    def _delay(self, entry: Dict[str, Any]) -> None:
+        delay = entry.get("elapsed_ms", 0.0) if self.replay_recorded_latency else self.latency_ms
+        if self.jitter_ms:
+            with self._rng_lock:
+                delay += self._rng.uniform(0, self.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+
+    def _roll_error(self, source: str) -> bool:
+        if not self.error_rate or source not in self.error_sources:
+            return False
+        with self._rng_lock:
+            return self._rng.random() < self.error_rate
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "dir": str(self.store.root),
+            "recorded": self.store.recorded,
+            "replayed": self.store.replayed,
+            "misses": self.store.misses,
+            "injected_errors": self.injected_errors,
+        }
+
+
+# --- requests ---
+
+def _encode_response(resp: Any) -> Dict[str, Any]:
+    return {
+        "status_code": resp.status_code,
+        "headers": dict(resp.headers),
+        "content": resp.content,
+        "url": resp.url,
+        "encoding": resp.encoding,
+        "reason": resp.reason,
+    }
+
+
+def _decode_response(data: Dict[str, Any]) -> Any:
+    import requests
+    from requests.structures import CaseInsensitiveDict
+
+    resp = requests.Response()
+    resp.status_code = data["status_code"]
+    resp.headers = CaseInsensitiveDict(data["headers"])
+    resp._content = data["content"]
+    resp.url = data["url"]
+    resp.encoding = data["encoding"]
+    resp.reason = data["reason"]
+    return resp
+
+
+def _patch_requests(cassette: Cassette) -> None:
+    import requests
+
+    original = requests.Session.request
+
+    def request(self, method, url, *args, **kwargs):
+        identity = (str(method).upper(), url, kwargs.get("params"), kwargs.get("data"), kwargs.get("json"))
+        return cassette.call(
+            "requests", str(method).upper(), identity,
+            lambda: original(self, method, url, *args, **kwargs),
+            encode=_encode_response, decode=_decode_response,
+        )
+
+    requests.Session.request = request
+
+
+# --- feedparser ---
+
+def _patch_feedparser(cassette: Cassette) -> None:
+    import feedparser
+
+    original = feedparser.parse
+
+    def parse(url_file_stream_or_string, *args, **kwargs):
+        return cassette.call("feedparser", "parse", url_file_stream_or_string, lambda: original(url_file_stream_or_string, *args, **kwargs))
+
+    feedparser.parse = parse
+
+
+# --- yfinance (API level: the library's own HTTP stack changes between versions) ---
+
+def _encode_yf_value(operation: str, value: Any) -> Any:
+    if operation == "fast_info":
+        # FastInfo holds a reference to the live Ticker; keep only what the agent reads.
+        return {"last_price": getattr(value, "last_price", None)}
+    return value
+
+
+def _decode_yf_value(operation: str, value: Any) -> Any:
+    if operation == "fast_info":
+        return SimpleNamespace(**value)
+    return value
+
+
+class CassetteTicker:
+    """Stand-in for yf.Ticker; the real Ticker is only built when a call goes upstream."""
+
+    def __init__(self, cassette: Cassette, real_cls: Any, symbol: str, *args: Any, **kwargs: Any):
+        self._cassette = cassette
+        self._real_cls = real_cls
+        self._args: Tuple[Any, ...] = (symbol,) + args
+        self._kwargs = kwargs
+        self._real = None
+        self.ticker = symbol
+
+    def _live(self) -> Any:
+        if self._real is None:
+            self._real = self._real_cls(*self._args, **self._kwargs)
+        return self._real
+
+    def _fetch(self, operation: str, identity: Any, real: Callable[[], Any]) -> Any:
+        return self._cassette.call(
+            "yfinance", operation, identity, real,
+            encode=lambda v: _encode_yf_value(operation, v),
+            decode=lambda v: _decode_yf_value(operation, v),
+        )
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        attr = getattr(self._real_cls, name, None)
+        if callable(attr) and not isinstance(attr, property):
+            def method(*args: Any, **kwargs: Any) -> Any:
+                return self._fetch(name, (self.ticker, args, kwargs), lambda: getattr(self._live(), name)(*args, **kwargs))
+            return method
+        return self._fetch(name, (self.ticker,), lambda: getattr(self._live(), name))
+
+
+def _patch_yfinance(cassette: Cassette) -> None:
+    import yfinance
+
+    real_ticker = yfinance.Ticker
+    real_download = yfinance.download
+
+    def ticker(symbol: str, *args: Any, **kwargs: Any) -> CassetteTicker:
+        return CassetteTicker(cassette, real_ticker, symbol, *args, **kwargs)
+
+    def download(tickers: Any, *args: Any, **kwargs: Any) -> Any:
+        identity = (tickers, args, {k: v for k, v in kwargs.items() if k != "progress"})
+        return cassette.call("yfinance", "download", identity, lambda: real_download(tickers, *args, **kwargs))
+
+    yfinance.Ticker = ticker
+    yfinance.download = download
+
+
+# --- install ---
+
+_active: Optional[Cassette] = None
+
+
+def install(mode: Optional[str] = None, root: Optional[str] = None, **options: Any) -> Optional[Cassette]:
+    """Patch yfinance, requests and feedparser (CASSETTE_MODE / CASSETTE_DIR by default). No-op when off."""
+    global _active
+    mode = (mode or os.getenv("CASSETTE_MODE") or "off").strip().lower()
+    root = root or os.getenv("CASSETTE_DIR") or DEFAULT_CASSETTE_DIR
+    if mode not in {"record", "replay"}:
+        return None
+    if _active is not None:
+        return _active
+    cassette = Cassette(mode=mode, root=root, **options)
+    _patch_requests(cassette)
+    _patch_feedparser(cassette)
+    _patch_yfinance(cassette)
+    _active = cassette
+    print(f"[CASSETTE] {mode} mode, dir={root}")
+    return cassette
+
+
+def active_cassette() -> Optional[Cassette]:
+    return _active
@@ -0,0 +1,170 @@
+"""
+Prysm AI Agent - Conversation context builder.
+Builds the history part of the LLM prompt under a token budget:
+- UI payload tags ([CHART:{...}], [RISK:{...}], ...) become short placeholders
+- <thinking> blocks are dropped
+- the newest turns are kept until the budget runs out, and daily snapshot
+  summaries stand in for older context
+"""
+import os
+import re
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+HISTORY_TOKEN_BUDGET = int(os.getenv("CONTEXT_HISTORY_TOKEN_BUDGET", "2000"))
+SNAPSHOT_TOKEN_BUDGET = int(os.getenv("CONTEXT_SNAPSHOT_TOKEN_BUDGET", "600"))
+MAX_HISTORY_TURNS = int(os.getenv("CONTEXT_MAX_HISTORY_TURNS", "20"))
+
+UI_TAGS = ("CHART", "RISK", "TIMELINE", "SENTIMENT", "COMPARISON")
+_UI_TAG_START = re.compile(r"\[(%s):" % "|".join(UI_TAGS))
+_THINKING_BLOCK = re.compile(r"<thinking>.*?(</thinking>|$)", re.DOTALL | re.IGNORECASE)
+_FLAG_TAGS = re.compile(r"\[DOC_SEARCH_ACTIVE\]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English/Gemini)."""
+    return (len(text) + 3) // 4 if text else 0
+
+
+def _find_tag_end(text: str, start: int) -> int:
+    """Index just past the `]` closing the tag opened at `start`, honouring JSON strings."""
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        c = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif c == "\\":
+                escaped = True
+            elif c == '"':
+                in_string = False
+            continue
+        if c == '"':
+            in_string = True
+        elif c in "[{":
+            depth += 1
+        elif c in "]}":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return len(text)
+
+
+def _placeholder(tag: str, body: str) -> str:
+    try:
+        payload = json.loads(body)
+    except Exception:
+        payload = None
+    label = ""
+    if isinstance(payload, dict):
+        if tag == "COMPARISON":
+            label = f"{payload.get('ticker1', '')} vs {payload.get('ticker2', '')}".strip()
+        else:
+            label = payload.get("title") or payload.get("ticker") or ""
+    return f"[{tag.lower()} shown{': ' + label if label else ''}]"
+
+
+def strip_ui_payloads(text: str) -> str:
+    """Replace UI payload tags with short placeholders and drop thinking blocks."""
+    if not text:
+        return ""
+    text = _THINKING_BLOCK.sub("", text)
+    text = _FLAG_TAGS.sub("", text)
+    out = []
+    pos = 0
+    for m in _UI_TAG_START.finditer(text):
+        if m.start() < pos:
+            continue
+        end = _find_tag_end(text, m.start())
+        out.append(text[pos:m.start()])
+        out.append(_placeholder(m.group(1), text[m.end():end - 1]))
+        pos = end
+    out.append(text[pos:])
+    return "".join(out).strip()
+
+
+def iter_segments(text: str):
+    """Yield ("text", str) and ("ui", tag) segments of a stored model answer, in order."""
+    pos = 0
+    for m in _UI_TAG_START.finditer(text or ""):
+        if m.start() < pos:
+            continue
+        end = _find_tag_end(text, m.start())
+        if m.start() > pos:
+            yield ("text", text[pos:m.start()])
+        yield ("ui", text[m.start():end])
+        pos = end
+    if text and pos < len(text):
+        yield ("text", text[pos:])
+
+
+def _turn_text(turn: Dict[str, Any]) -> str:
+    parts = turn.get("parts") or []
+    return (parts[0].get("text") if parts and isinstance(parts[0], dict) else "") or ""
+
+
+def build_history_messages(
+    history: List[Dict[str, Any]],
+    snapshots: Optional[List[Dict[str, Any]]] = None,
+    budget: int = HISTORY_TOKEN_BUDGET,
+    snapshot_budget: int = SNAPSHOT_TOKEN_BUDGET,
+) -> Tuple[List[BaseMessage], Dict[str, Any]]:
+    """
+    Returns (messages, report). Messages are oldest-first and ready to sit between
+    the system prompt and the new user message.
+    """
+    kept: List[BaseMessage] = []
+    used = 0
+    for turn in reversed((history or [])[-MAX_HISTORY_TURNS:]):
+        role = turn.get("role")
+        text = _turn_text(turn)
+        if role != "user":
+            text = strip_ui_payloads(text)
+        if not text:
+            continue
+        cost = estimate_tokens(text)
+        if used + cost > budget:
+            break
+        used += cost
+        kept.append(HumanMessage(content=text) if role == "user" else AIMessage(content=text))
+    kept.reverse()
+
+    # Older context comes from the daily snapshots, newest first.
+    summary_lines: List[str] = []
+    snapshot_used = 0
+    for snap in reversed(snapshots or []):
+        if not isinstance(snap, dict) or not snap.get("summary"):
+            continue
+        line = f"{snap.get('date', '')}: {snap['summary']}"
+        cost = estimate_tokens(line)
+        if snapshot_used + cost > snapshot_budget:
+            break
+        snapshot_used += cost
+        summary_lines.append(line)
+
+    messages: List[BaseMessage] = []
+    if summary_lines:
+        summary_lines.reverse()
+        messages.append(SystemMessage(content="Earlier conversation (daily summaries):\n" + "\n".join(summary_lines)))
+    messages.extend(kept)
+
+    report = {
+        "history_turns": len(kept),
+        "history_turns_available": len(history or []),
+        "history_tokens": used,
+        "snapshot_count": len(summary_lines),
+        "snapshot_tokens": snapshot_used,
+    }
+    return messages, report
+
+
+def estimate_prompt_tokens(messages: List[BaseMessage]) -> int:
+    total = 0
+    for m in messages:
+        content = m.content if isinstance(m.content, str) else json.dumps(m.content)
+        total += estimate_tokens(content)
+    return total
@@ -0,0 +1,183 @@
+"""
+Prysm AI Agent - Embedding backends for BAAI/bge-small-en-v1.5.
+
+EMBEDDING_BACKEND selects how rag_service's LocalEmbeddingFunction runs the model:
+- torch      SentenceTransformer in full precision (the original behaviour)
+- onnx       ONNX Runtime on the model's published onnx/model.onnx
+- onnx-int8  the same graph with dynamically quantized int8 weights, built once
+             into EMBEDDING_ONNX_DIR on first use
+
+All backends tokenize first and group texts into length-bucketed batches:
+texts are sorted by token count and a batch closes when it reaches
+EMBEDDING_BATCH_SIZE texts or its padded size (texts x longest) would exceed
+EMBEDDING_BATCH_TOKENS. Short chunks are not padded to the length of long ones.
+EMBEDDING_THREADS sets the intra-op thread count (0 keeps the library default).
+
+Compare backends with `python -m benchmarks.bench_embeddings`.
+"""
+import os
+import abc
+from typing import Dict, List, Optional, Type
+
+import numpy as np
+
+EMBEDDING_MODEL_ID = "BAAI/bge-small-en-v1.5"
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+EMBEDDING_BATCH_TOKENS = int(os.getenv("EMBEDDING_BATCH_TOKENS", "8192"))
+EMBEDDING_MAX_LENGTH = int(os.getenv("EMBEDDING_MAX_LENGTH", "512"))
+EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR") or os.path.join(os.path.dirname(__file__), "models")
+
+
+def plan_batches(lengths: List[int], max_items: int, token_budget: int) -> List[List[int]]:
+    """
+    Indexes of `lengths` grouped into batches, longest first. A batch's padded
+    cost is len(batch) * its longest entry; a single over-budget text still
+    gets a batch of its own.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+    batches: List[List[int]] = []
+    current: List[int] = []
+    longest = 0
+    for i in order:
+        # Sorted descending, so the first entry of a batch is its longest.
+        candidate = longest or lengths[i]
+        if current and (len(current) >= max_items or (len(current) + 1) * candidate > token_budget):
+            batches.append(current)
+            current, longest = [], 0
+            candidate = lengths[i]
+        current.append(i)
+        longest = candidate
+    if current:
+        batches.append(current)
+    return batches
+
+
+class EmbeddingBackend(abc.ABC):
+    name = ""
+
+    def __init__(
+        self,
+        model_id: str = EMBEDDING_MODEL_ID,
+        threads: int = EMBEDDING_THREADS,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        batch_tokens: int = EMBEDDING_BATCH_TOKENS,
+        max_length: int = EMBEDDING_MAX_LENGTH,
+    ):
+        self.model_id = model_id
+        self.threads = threads
+        self.batch_size = batch_size
+        self.batch_tokens = batch_tokens
+        self.max_length = max_length
+
+    @property
+    def cache_key(self) -> str:
+        """Model identity for the embedding cache; vectors from different backends are not mixed."""
+        return self.model_id if self.name == "torch" else f"{self.model_id}#{self.name}"
+
+    def _token_ids(self, texts: List[str]) -> List[List[int]]:
+        return self.tokenizer(texts, truncation=True, max_length=self.max_length)["input_ids"]
+
+    @abc.abstractmethod
+    def _encode_batch(self, texts: List[str], token_ids: List[List[int]]) -> np.ndarray:
+        raise NotImplementedError
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        token_ids = self._token_ids(texts)
+        out: List[Optional[np.ndarray]] = [None] * len(texts)
+        for batch in plan_batches([len(ids) for ids in token_ids], self.batch_size, self.batch_tokens):
+            vectors = self._encode_batch([texts[i] for i in batch], [token_ids[i] for i in batch])
+            for i, vector in zip(batch, vectors):
+                out[i] = vector
+        return np.vstack(out)
+
+
+class TorchBackend(EmbeddingBackend):
+    name = "torch"
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if self.threads:
+            torch.set_num_threads(self.threads)
+        self.model = SentenceTransformer(self.model_id, device="cpu")
+        self.model.max_seq_length = self.max_length
+        self.tokenizer = self.model.tokenizer
+
+    def _encode_batch(self, texts: List[str], token_ids: List[List[int]]) -> np.ndarray:
+        return self.model.encode(texts, batch_size=len(texts), convert_to_numpy=True)
+
+
+class OnnxBackend(EmbeddingBackend):
+    """
+    BGE pooling done by hand: the [CLS] hidden state, L2-normalized (what the
+    SentenceTransformer pipeline for this model does).
+    """
+    name = "onnx"
+    quantized = False
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        options = ort.SessionOptions()
+        if self.threads:
+            options.intra_op_num_threads = self.threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_id)
+        self.session = ort.InferenceSession(self._model_path(), options, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+    def _model_path(self) -> str:
+        from huggingface_hub import hf_hub_download
+
+        fp32_path = hf_hub_download(self.model_id, "onnx/model.onnx")
+        if not self.quantized:
+            return fp32_path
+        target_dir = os.path.join(EMBEDDING_ONNX_DIR, self.model_id.replace("/", "--"))
+        int8_path = os.path.join(target_dir, "model_int8.onnx")
+        if not os.path.exists(int8_path):
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            os.makedirs(target_dir, exist_ok=True)
+            print(f"[EMBEDDING] Quantizing {self.model_id} to int8 -> {int8_path}")
+            quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+        return int8_path
+
+    def _encode_batch(self, texts: List[str], token_ids: List[List[int]]) -> np.ndarray:
+        padded = self.tokenizer.pad({"input_ids": token_ids}, return_tensors="np")
+        feeds = {
+            "input_ids": padded["input_ids"].astype(np.int64),
+            "attention_mask": padded["attention_mask"].astype(np.int64),
+        }
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.zeros_like(feeds["input_ids"])
+        hidden = self.session.run(None, feeds)[0]
+        cls = hidden[:, 0]
+        norms = np.linalg.norm(cls, axis=1, keepdims=True)
+        return cls / np.maximum(norms, 1e-12)
+
+
+class OnnxInt8Backend(OnnxBackend):
+    name = "onnx-int8"
+    quantized = True
+
+
+BACKENDS: Dict[str, Type[EmbeddingBackend]] = {
+    TorchBackend.name: TorchBackend,
+    OnnxBackend.name: OnnxBackend,
+    OnnxInt8Backend.name: OnnxInt8Backend,
+}
+
+
+def load_backend(name: Optional[str] = None, **kwargs) -> EmbeddingBackend:
+    name = (name or EMBEDDING_BACKEND).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND {name!r}; expected one of {', '.join(BACKENDS)}")
+    return BACKENDS[name](**kwargs)
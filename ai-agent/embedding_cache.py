@@ -0,0 +1,98 @@
+"""
+Prysm AI Agent - Persistent embedding cache.
+Chunk embeddings are stored in a local SQLite file keyed by (model id, chunk hash),
+so identical chunks (a re-uploaded report, disclaimers and auditor text shared
+across filings) are embedded once. Keying by model id means switching the
+embedding model never serves vectors from the old one.
+"""
+import os
+import re
+import array
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "1").lower() in {"1", "true", "yes"}
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH") or os.path.join(os.path.dirname(__file__), "embedding_cache.sqlite3")
+# SQLite caps bound parameters per statement; look hashes up in slices of this size.
+_LOOKUP_SLICE = 500
+
+
+def normalize_chunk(text: str) -> str:
+    """Unicode-normalize and collapse whitespace, so extraction noise does not change the hash."""
+    text = unicodedata.normalize("NFKC", text or "")
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(normalize_chunk(text).encode("utf-8")).hexdigest()
+
+
+def _pack(vector: Sequence[float]) -> bytes:
+    return array.array("f", vector).tobytes()
+
+
+def _unpack(blob: bytes) -> List[float]:
+    values = array.array("f")
+    values.frombytes(blob)
+    return values.tolist()
+
+
+class EmbeddingCache:
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        # One connection shared by the embedding and ingest threads.
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " model_id TEXT NOT NULL,"
+                " chunk_hash TEXT NOT NULL,"
+                " vector BLOB NOT NULL,"
+                " PRIMARY KEY (model_id, chunk_hash))"
+            )
+            self._conn = conn
+        return self._conn
+
+    def get_many(self, model_id: str, hashes: Iterable[str]) -> Dict[str, List[float]]:
+        wanted = list(dict.fromkeys(hashes))
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            conn = self._connection()
+            for i in range(0, len(wanted), _LOOKUP_SLICE):
+                part = wanted[i:i + _LOOKUP_SLICE]
+                rows = conn.execute(
+                    f"SELECT chunk_hash, vector FROM embeddings WHERE model_id = ? AND chunk_hash IN ({','.join('?' * len(part))})",
+                    [model_id, *part],
+                ).fetchall()
+                found.update((h, _unpack(blob)) for h, blob in rows)
+        self.hits += len(found)
+        self.misses += len(wanted) - len(found)
+        return found
+
+    def put_many(self, model_id: str, items: Iterable[Tuple[str, Sequence[float]]]) -> None:
+        rows = [(model_id, h, _pack(vector)) for h, vector in items]
+        if not rows:
+            return
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.executemany("INSERT OR IGNORE INTO embeddings (model_id, chunk_hash, vector) VALUES (?, ?, ?)", rows)
+        self.writes += len(rows)
+
+    def stats(self) -> Dict[str, int]:
+        return {"enabled": 1 if EMBEDDING_CACHE_ENABLED else 0, "hits": self.hits, "misses": self.misses, "writes": self.writes}
+
+
+embedding_cache = EmbeddingCache()
@@ -0,0 +1,71 @@
+"""
+Prysm AI Agent - Bounded executors.
+Blocking work is split across separately sized thread pools so a burst of one
+kind (e.g. slow Yahoo calls) cannot starve another (e.g. Gemini calls).
+"""
+import os
+import asyncio
+import functools
+import contextvars
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+LLM_WORKERS = int(os.getenv("LLM_EXECUTOR_WORKERS", "8"))
+MARKET_DATA_WORKERS = int(os.getenv("MARKET_DATA_EXECUTOR_WORKERS", "16"))
+EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_EXECUTOR_WORKERS", "2"))
+INGEST_PROCESS_WORKERS = int(os.getenv("INGEST_PROCESS_WORKERS", "2"))
+# Ingestion jobs run at once; ingest_jobs.py enforces the same limit.
+INGEST_MAX_CONCURRENT_JOBS = int(os.getenv("INGEST_MAX_CONCURRENT_JOBS", "2"))
+# "spawn" keeps worker processes from inheriting the loaded embedding model and Chroma client.
+INGEST_MP_START_METHOD = os.getenv("INGEST_MP_START_METHOD", "spawn")
+
+# Gemini calls (intent, summaries, sentiment).
+LLM_EXECUTOR = ThreadPoolExecutor(max_workers=LLM_WORKERS, thread_name_prefix="prysm-llm")
+# yfinance / scraping / RSS. Also installed as the loop's default executor, which is
+# where LangGraph's ToolNode runs the (sync) tools.
+MARKET_DATA_EXECUTOR = ThreadPoolExecutor(max_workers=MARKET_DATA_WORKERS, thread_name_prefix="prysm-market")
+# PDF parsing, SentenceTransformer encodes and Chroma writes.
+EMBEDDING_EXECUTOR = ThreadPoolExecutor(max_workers=EMBEDDING_WORKERS, thread_name_prefix="prysm-embed")
+# Drives one ingestion pipeline per thread (rag_service.ingest_pdf); sized to the job limit.
+INGEST_EXECUTOR = ThreadPoolExecutor(max_workers=INGEST_MAX_CONCURRENT_JOBS, thread_name_prefix="prysm-ingest")
+# CPU-bound PDF text extraction (pdf_extract.py); created on first use.
+_ingest_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+async def run_in(executor: ThreadPoolExecutor, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run `fn` on `executor`, carrying over context variables (e.g. the run scope)."""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(executor, functools.partial(ctx.run, fn, *args, **kwargs))
+
+
+def ingest_process_pool() -> ProcessPoolExecutor:
+    global _ingest_process_pool
+    if _ingest_process_pool is None:
+        _ingest_process_pool = ProcessPoolExecutor(
+            max_workers=INGEST_PROCESS_WORKERS,
+            mp_context=multiprocessing.get_context(INGEST_MP_START_METHOD),
+        )
+    return _ingest_process_pool
+
+
+def run_llm_sync(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking Gemini call from a worker thread, bounded by the LLM pool."""
+    ctx = contextvars.copy_context()
+    return LLM_EXECUTOR.submit(ctx.run, fn, *args, **kwargs).result()
+
+
+def install_default_executor() -> None:
+    asyncio.get_running_loop().set_default_executor(MARKET_DATA_EXECUTOR)
+
+
+def shutdown_executors() -> None:
+    global _ingest_process_pool
+    for pool in (LLM_EXECUTOR, MARKET_DATA_EXECUTOR, EMBEDDING_EXECUTOR, INGEST_EXECUTOR):
+        pool.shutdown(wait=False, cancel_futures=True)
+    if _ingest_process_pool is not None:
+        _ingest_process_pool.shutdown(wait=False, cancel_futures=True)
+        _ingest_process_pool = None
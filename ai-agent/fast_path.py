@@ -0,0 +1,176 @@
+"""
+Prysm AI Agent - Direct-answer fast path.
+Short factual lookups ("what is INFY's price", "P/E of HDFCBANK") are answered from
+the cached get_stock_data snapshot with a templated reply, skipping intent
+extraction, the LangGraph loop and long-form generation. Anything that reads as
+analytical falls through to the graph.
+"""
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from symbols import ALIASES, normalize_symbol
+
+MAX_FAST_PATH_LENGTH = 80
+
+# metric id -> (pattern, label)
+METRIC_PATTERNS: Dict[str, Tuple[re.Pattern, str]] = {
+    "price": (re.compile(r"\b(price|trading at|quote|cmp|ltp|share price)\b", re.I), "Price"),
+    "pe": (re.compile(r"\b(p\s*/\s*e|pe ratio|pe|price to earnings)\b", re.I), "P/E"),
+    "pb": (re.compile(r"\b(p\s*/\s*b|pb ratio|price to book)\b", re.I), "P/B"),
+    "market_cap": (re.compile(r"\b(market cap(italisation|italization)?|mcap|m-cap)\b", re.I), "Market Cap"),
+    "week52": (re.compile(r"\b(52[\s-]*(week|wk)s?( high| low)?)\b", re.I), "52W Range"),
+    "dividend_yield": (re.compile(r"\b(dividend yield|dividend)\b", re.I), "Dividend Yield"),
+    "eps": (re.compile(r"\beps\b|\bearnings per share\b", re.I), "EPS"),
+    "roe": (re.compile(r"\b(roe|return on equity)\b", re.I), "ROE"),
+    "debt_to_equity": (re.compile(r"\b(d\s*/\s*e|debt to equity|debt/equity)\b", re.I), "Debt/Equity"),
+    "beta": (re.compile(r"\bbeta\b", re.I), "Beta"),
+    "volume": (re.compile(r"\bvolume\b", re.I), "Volume"),
+}
+
+# Words that signal the user wants reasoning, not a number.
+ANALYTICAL_MARKERS = re.compile(
+    r"\b(why|should|analy[sz]e|analysis|compare|vs|versus|outlook|future|risk|chart|graph|plot|explain|"
+    r"buy|sell|hold|sentiment|news|trend|good|bad|worth|overvalued|undervalued|document|report|pdf|"
+    r"predict|target|forecast|deep|dive|portfolio)\b",
+    re.I,
+)
+
+# Date and event questions ("when is the dividend", "next results") are not a snapshot figure.
+EVENT_MARKERS = re.compile(
+    r"\b(when|date|dates|ex[\s-]?date|ex[\s-]?dividend|record date|next|upcoming|declared|announced?|"
+    r"payout|paid|history|historical|results?)\b",
+    re.I,
+)
+
+# Words a simple lookup may contain besides the metric and the company.
+_FILLER = frozenset(
+    "what whats s is are was the a an of for in on at and its it me tell show give get check please pls "
+    "current currently today todays now right latest live share shares stock stocks ratio value how much "
+    "high low nse bse".split()
+)
+_WORD = re.compile(r"[a-z0-9&]+")
+
+
+def _metrics_named(text: str) -> Tuple[List[str], str]:
+    """(metric ids, text with the metric phrases blanked). A match inside a longer one ("price" in
+    "price to earnings") does not count as its own metric."""
+    spans = [(m.start(), m.end(), metric) for metric, (pattern, _) in METRIC_PATTERNS.items() for m in pattern.finditer(text)]
+    metrics: List[str] = []
+    for start, end, metric in spans:
+        nested = any(s <= start and end <= e and (e - s) > (end - start) for s, e, _ in spans)
+        if not nested and metric not in metrics:
+            metrics.append(metric)
+    chars = list(text)
+    for start, end, _ in spans:
+        chars[start:end] = " " * (end - start)
+    return metrics, "".join(chars)
+
+
+def _companies_named(text: str) -> Tuple[List[str], List[str]]:
+    """(known symbols named in `text`, leftover words that are neither filler nor a known company)."""
+    phrase = " " + " ".join(_WORD.findall(text.lower())) + " "
+    symbols: List[str] = []
+    for alias, symbol in ALIASES:
+        if f" {alias} " in phrase:
+            phrase = phrase.replace(f" {alias} ", " ")
+            if symbol not in symbols:
+                symbols.append(symbol)
+    leftover = [w for w in phrase.split() if w not in _FILLER]
+    return symbols, leftover
+
+
+def match_metric_lookup(message: str, selected_symbol: Optional[str] = None) -> Optional[Tuple[str, List[str]]]:
+    """
+    Return (symbol, metric ids) when `message` is a simple metric lookup, else None.
+    The company must be one known symbol (symbols.py) named by ticker or name; the UI
+    selection is used only when the message names no company. Any other word that is not
+    filler ("gold", "USD", a second company) sends the message to the graph instead.
+    """
+    text = (message or "").strip()
+    if not text or len(text) > MAX_FAST_PATH_LENGTH or ANALYTICAL_MARKERS.search(text) or EVENT_MARKERS.search(text):
+        return None
+
+    metrics, remainder = _metrics_named(text)
+    if not metrics:
+        return None
+
+    symbols, leftover = _companies_named(remainder)
+    if leftover or len(symbols) > 1:
+        return None
+    symbol = symbols[0] if symbols else normalize_symbol(selected_symbol)
+    if not symbol:
+        return None
+    return symbol, metrics
+
+
+def _num(value: Any) -> Optional[float]:
+    try:
+        v = float(value)
+    except (TypeError, ValueError):
+        return None
+    return v if v == v else None  # drop NaN
+
+
+def _inr(value: float) -> str:
+    if abs(value) >= 1e7:
+        return f"₹{value / 1e7:,.2f} Cr"
+    return f"₹{value:,.2f}"
+
+
+def _metric_line(metric: str, data: Dict[str, Any]) -> Optional[str]:
+    quote = data.get("quote", {}) or {}
+    fin = (data.get("financials", {}) or {}).get("detailed", {}) or {}
+    label = METRIC_PATTERNS[metric][1]
+
+    if metric == "price":
+        price = _num(quote.get("price"))
+        if price is None:
+            return None
+        change = _num(quote.get("changePercent"))
+        suffix = f" ({change:+.2f}% today)" if change is not None else ""
+        return f"{label}: {_inr(price)}{suffix}"
+    if metric == "pe":
+        v = _num(fin.get("trailingPE") or quote.get("pe"))
+        return f"{label}: {v:.2f}" if v else None
+    if metric == "pb":
+        v = _num(fin.get("priceToBook"))
+        return f"{label}: {v:.2f}" if v else None
+    if metric == "market_cap":
+        v = _num(fin.get("marketCap") or quote.get("marketCap"))
+        return f"{label}: {_inr(v)}" if v else None
+    if metric == "week52":
+        hi, lo = _num(quote.get("week52High")), _num(quote.get("week52Low"))
+        return f"{label}: {_inr(lo)} – {_inr(hi)}" if hi and lo else None
+    if metric == "dividend_yield":
+        v = _num(quote.get("dividendYield"))
+        return f"{label}: {v:.2f}%" if v is not None else None
+    if metric == "eps":
+        v = _num(quote.get("eps"))
+        return f"{label}: {_inr(v)}" if v else None
+    if metric == "roe":
+        v = _num(fin.get("returnOnEquity"))
+        return f"{label}: {v:.2f}%" if v else None
+    if metric == "debt_to_equity":
+        v = _num(fin.get("debtToEquity"))
+        return f"{label}: {v:.2f}" if v is not None else None
+    if metric == "beta":
+        v = _num(fin.get("beta"))
+        return f"{label}: {v:.2f}" if v is not None else None
+    if metric == "volume":
+        v = _num(quote.get("volume"))
+        return f"{label}: {int(v):,}" if v else None
+    return None
+
+
+def render_answer(symbol: str, metrics: List[str], data: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Templated answer, or None when any requested metric is missing (let the graph handle it)."""
+    if not data:
+        return None
+    lines = [_metric_line(metric, data) for metric in metrics]
+    if not all(lines):
+        return None
+    name = data.get("name") or symbol
+    header = f"**{name} ({symbol})**"
+    if len(lines) == 1:
+        return f"{header} — {lines[0]}."
+    return header + "\n" + "\n".join(f"- {line}" for line in lines)
@@ -0,0 +1,179 @@
+"""
+Prysm AI Agent - Numeric store for figures from uploaded financial statements.
+Ingestion (rag_service.ingest_pdf) writes the line items that table_extract finds
+as typed rows: (statement, line item, period, value), tagged with the document
+and namespace (see rag_scope.py). consult_knowledge_base answers questions like
+"FY24 revenue from operations" from here with one indexed lookup, before
+falling back to embedding retrieval.
+"""
+import os
+import re
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from table_extract import find_periods
+
+FINANCIAL_STORE_PATH = os.getenv("FINANCIAL_STORE_PATH") or os.path.join(os.path.dirname(__file__), "financials.sqlite3")
+FINANCIAL_TABLES_ENABLED = os.getenv("FINANCIAL_TABLES_ENABLED", "1").lower() in {"1", "true", "yes"}
+# Line items returned per lookup.
+FINANCIAL_LOOKUP_LIMIT = 3
+
+_WORD_RE = re.compile(r"[a-z][a-z&]*")
+_PERIOD_TEXT_RE = re.compile(r"\bfy\s?'?\d{2,4}\b|\b20\d{2}(?:\s?[-–/]\s?\d{2,4})?\b")
+# Words that carry no meaning for matching a question to a line item.
+_FILLER = frozenset(
+    "a an and are as at be by for from has have how in is it its of on or the this to was were what when which "
+    "during year years ended ending period fy show give tell me us much did does do value figure amount number "
+    "reported report company firm crore crores lakh lakhs million millions rs inr per".split()
+)
+# Words that mark a question as a request for a figure rather than prose.
+_NUMERIC_CUES = frozenset("much amount figure value total number".split())
+
+
+def _terms(text: str) -> List[str]:
+    # Plurals folded so "finance cost" matches "finance costs".
+    words = _WORD_RE.findall(_PERIOD_TEXT_RE.sub(" ", text.lower()))
+    return [w[:-1] if len(w) > 3 and w.endswith("s") and not w.endswith("ss") else w for w in words if w not in _FILLER]
+
+
+class FinancialStore:
+    def __init__(self, path: str = FINANCIAL_STORE_PATH):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS line_items ("
+                " doc_id TEXT NOT NULL, namespace TEXT NOT NULL, statement TEXT NOT NULL, basis TEXT,"
+                " line_item TEXT NOT NULL, period TEXT NOT NULL, value REAL NOT NULL, unit TEXT, page INTEGER)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS line_items_namespace ON line_items (namespace, line_item)")
+            conn.execute("CREATE INDEX IF NOT EXISTS line_items_doc ON line_items (doc_id)")
+            self._conn = conn
+        return self._conn
+
+    # --- writes ---
+
+    def add_rows(self, doc_id: str, namespace: str, rows: Iterable[Dict[str, Any]]) -> int:
+        values = [
+            (doc_id, namespace, r["statement"], r.get("basis"), r["line_item"], r["period"], r["value"], r.get("unit"), r.get("page"))
+            for r in rows
+        ]
+        if not values:
+            return 0
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.executemany("INSERT INTO line_items VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", values)
+        return len(values)
+
+    def delete_document(self, doc_id: str, namespace: str) -> None:
+        self._delete_where(doc_id=doc_id, namespace=namespace)
+
+    def delete_namespace(self, namespace: str) -> None:
+        self._delete_where(namespace=namespace)
+
+    def _delete_where(self, **columns: str) -> None:
+        where = " AND ".join(f"{column} = ?" for column in columns)
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute(f"DELETE FROM line_items WHERE {where}", tuple(columns.values()))
+
+    def clear(self) -> None:
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("DELETE FROM line_items")
+
+    # --- reads ---
+
+    def lookup(
+        self,
+        question: str,
+        namespaces: Sequence[str],
+        doc_id: Optional[str] = None,
+        limit: int = FINANCIAL_LOOKUP_LIMIT,
+    ) -> List[Dict[str, Any]]:
+        """
+        Figures answering `question`, or [] when it does not read as a numeric lookup.
+        The question must name a period ("FY24", "2023-24") or ask for an amount, and
+        every word of the matched line item (ignoring filler) must appear in it, or
+        every word of the question in the line item. Periods named in the question
+        narrow the rows; without one, all periods of the matched items are returned.
+        """
+        periods = find_periods(question)
+        terms = set(_terms(question))
+        if not terms or not (periods or _NUMERIC_CUES & set(_WORD_RE.findall(question.lower()))):
+            return []
+        scope = f"namespace IN ({','.join('?' * len(namespaces))})"
+        args: List[Any] = list(namespaces)
+        if doc_id:
+            scope += " AND doc_id = ?"
+            args.append(doc_id)
+        with self._lock:
+            conn = self._connection()
+            items = [row[0] for row in conn.execute(f"SELECT DISTINCT line_item FROM line_items WHERE {scope}", args)]
+            ranked = []
+            for item in items:
+                score = _match_score(terms, item)
+                if score is not None:
+                    ranked.append((score, item))
+            ranked = sorted(ranked)[:limit]
+            if not ranked:
+                return []
+            matched = [item for _, item in ranked]
+            sql = (
+                f"SELECT doc_id, statement, basis, line_item, period, value, unit, page FROM line_items"
+                f" WHERE {scope} AND line_item IN ({','.join('?' * len(matched))})"
+            )
+            query_args = [*args, *matched]
+            if periods:
+                sql += f" AND period IN ({','.join('?' * len(periods))})"
+                query_args.extend(periods)
+            rows = conn.execute(sql + " ORDER BY period DESC, page", query_args).fetchall()
+        order = {item: i for i, item in enumerate(matched)}
+        figures, seen = [], set()
+        for doc, statement, basis, line_item, period, value, unit, page in sorted(rows, key=lambda r: order[r[3]]):
+            # The same figure often repeats (standalone vs consolidated, or a later restatement); keep the first.
+            key = (doc, statement, basis, line_item, period)
+            if key in seen:
+                continue
+            seen.add(key)
+            figures.append({
+                "doc_id": doc,
+                "statement": statement,
+                "basis": basis,
+                "line_item": line_item,
+                "period": period,
+                "value": value,
+                "unit": unit,
+                "page": page,
+            })
+        return figures
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            rows, docs = self._connection().execute("SELECT COUNT(*), COUNT(DISTINCT doc_id) FROM line_items").fetchone()
+        return {"rows": rows, "documents": docs}
+
+
+def _match_score(terms: set, line_item: str) -> Optional[Tuple[float, int]]:
+    """Sort key (lower is better) when `line_item` matches the question terms, else None."""
+    item_terms = set(_terms(line_item))
+    if not item_terms:
+        return None
+    overlap = len(terms & item_terms)
+    if not overlap or (overlap < len(item_terms) and overlap < len(terms)):
+        return None
+    # Prefer items fully covered by the question, then the ones with fewest extra words.
+    return (-overlap / len(item_terms), len(item_terms))
+
+
+financial_store = FinancialStore()
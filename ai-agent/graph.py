@@ -11,8 +11,8 @@ from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
 from langgraph.prebuilt import ToolNode, tools_condition
 from langchain_core.messages import BaseMessage, SystemMessage, ToolMessage
-from langchain_google_genai import ChatGoogleGenerativeAI
 
+from llm_provider import get_chat_model, provider_name
 from tools import generate_chart, generate_risk_gauge, generate_future_timeline, generate_sentiment_analysis, compare_stocks, consult_knowledge_base
 
 from pathlib import Path
@@ -50,15 +50,9 @@ class AgentState(TypedDict):
     intent: Optional[str]
 
 # --- 2. MODEL & TOOLS SETUP ---
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY not found in environment variables")
-
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash",
-    api_key=GEMINI_API_KEY,
-    temperature=0.7
-)
+# Gemini by default; LLM_PROVIDER=fake swaps in the offline scripted model.
+print(f"[DEBUG] LLM provider: {provider_name()}")
+llm = get_chat_model(temperature=0.7)
 
 # Bind tools to the model
 tools = [generate_chart, generate_risk_gauge, generate_future_timeline, generate_sentiment_analysis, compare_stocks, consult_knowledge_base]
@@ -107,11 +101,12 @@ The visual tool MUST be called in addition to your detailed text analysis.
 
 # --- 4. NODES ---
 
-def chatbot(state: AgentState):
+async def chatbot(state: AgentState):
     """Execution node for the LLM."""
     # Ensure system prompt is always the first message (or added to context)
     # LangChain models usually handle SystemMessages automatically if at start
-    return {"messages": [llm_with_tools.invoke(state["messages"])]}
+    # Async so the model call stays on the event loop instead of occupying a tool thread.
+    return {"messages": [await llm_with_tools.ainvoke(state["messages"])]}
 
 # We use the prebuilt ToolNode which handles execution and output formatting
 tool_node = ToolNode(tools)
@@ -0,0 +1,280 @@
+"""
+Prysm AI Agent - Background document ingestion jobs.
+POST /upload_doc stores the file and returns a job id at once. The job then runs
+the streaming pipeline in rag_service.ingest_pdf on the ingest executor:
+- page ranges are extracted in parallel in the ingestion process pool
+- text is chunked incrementally as the ranges arrive
+- chunks are embedded and stored in batches on the embedding executor, overlapping
+  with extraction of the next pages
+
+Progress (pages parsed, chunks embedded, ETA) is polled on GET /upload_doc/{job_id}.
+Jobs can be cancelled between page ranges and batches. A file whose hash is
+already indexed (or being ingested by another job) is not ingested again: the
+job finishes at once with the existing doc_id. At most INGEST_MAX_CONCURRENT_JOBS run at
+once, and at most INGEST_MAX_QUEUED_JOBS wait behind them.
+"""
+import os
+import time
+import uuid
+import asyncio
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from executors import EMBEDDING_EXECUTOR, INGEST_EXECUTOR, INGEST_MAX_CONCURRENT_JOBS, run_in
+from rag_scope import namespace_for
+from cancellation import IngestCancelled
+from readiness import RAG
+from telemetry import count_event
+
+INGEST_MAX_QUEUED_JOBS = int(os.getenv("INGEST_MAX_QUEUED_JOBS", "16"))
+# Finished jobs stay queryable this long.
+INGEST_JOB_TTL_SECONDS = float(os.getenv("INGEST_JOB_TTL_SECONDS", "3600"))
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+TERMINAL_STATES = {SUCCEEDED, FAILED, CANCELLED}
+
+
+class IngestQueueFull(Exception):
+    pass
+
+
+class IngestJob:
+    def __init__(
+        self,
+        filename: str,
+        doc_id: str,
+        path: str,
+        file_hash: Optional[str] = None,
+        session_id: Optional[str] = None,
+        ticker: Optional[str] = None,
+    ):
+        self.job_id = uuid.uuid4().hex
+        self.filename = filename
+        self.doc_id = doc_id
+        self.path = path
+        self.file_hash = file_hash
+        self.session_id = session_id
+        self.ticker = ticker
+        self.namespace = namespace_for(session_id)
+        self.deduplicated = False
+        self.status = QUEUED
+        self.stage = "queued"
+        self.pages_total = 0
+        self.pages_parsed = 0
+        self.chunks_total = 0
+        self.chunks_embedded = 0
+        # Chunks produced so far; chunks_total is only known once the last page is chunked.
+        self.chunks_emitted = 0
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.cancel_requested = False
+        self.task: Optional[asyncio.Task] = None
+        # Monotonic start of the pipeline, for rate-based ETA.
+        self._pipeline_started: Optional[float] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in TERMINAL_STATES
+
+    def record_progress(self, **fields: int) -> None:
+        """Progress callback for ingest_pdf (called from the ingest thread)."""
+        for name, value in fields.items():
+            setattr(self, name, value)
+        if self.pages_total and self.pages_parsed >= self.pages_total:
+            self.stage = "embedding"
+
+    def eta_seconds(self) -> Optional[float]:
+        """
+        Remaining time from the observed embedding rate; None until there is a rate to go on.
+        Extraction and embedding overlap, so the total chunk count is extrapolated from
+        the pages parsed so far until the last page is in.
+        """
+        if self.status != RUNNING:
+            return 0.0 if self.done else None
+        if not self._pipeline_started or not self.chunks_embedded or not self.pages_parsed:
+            return None
+        expected = self.chunks_total or self.chunks_emitted * self.pages_total / self.pages_parsed
+        rate = self.chunks_embedded / max(time.monotonic() - self._pipeline_started, 1e-6)
+        return round(max(expected - self.chunks_embedded, 0) / rate, 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "doc_id": self.doc_id,
+            "filename": self.filename,
+            "session_id": self.session_id,
+            "ticker": self.ticker,
+            "deduplicated": self.deduplicated,
+            "status": self.status,
+            "stage": self.stage,
+            "pages_total": self.pages_total,
+            "pages_parsed": self.pages_parsed,
+            "chunks_total": self.chunks_total,
+            "chunks_embedded": self.chunks_embedded,
+            "chunks_emitted": self.chunks_emitted,
+            "eta_seconds": self.eta_seconds(),
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class IngestJobManager:
+    def __init__(
+        self,
+        max_concurrent: int = INGEST_MAX_CONCURRENT_JOBS,
+        max_queued: int = INGEST_MAX_QUEUED_JOBS,
+        ttl: float = INGEST_JOB_TTL_SECONDS,
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.ttl = ttl
+        self._jobs: "OrderedDict[str, IngestJob]" = OrderedDict()
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.completed_total: Dict[str, int] = {SUCCEEDED: 0, FAILED: 0, CANCELLED: 0}
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        # Created lazily so it binds to the running loop.
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrent)
+        return self._slots
+
+    def submit(
+        self,
+        path: str,
+        filename: str,
+        doc_id: str,
+        file_hash: Optional[str] = None,
+        session_id: Optional[str] = None,
+        ticker: Optional[str] = None,
+    ) -> IngestJob:
+        """
+        Queue a job. If the same file is already being ingested into the same
+        namespace, that job is returned instead (its `path` differs from `path`,
+        which the caller then owns).
+        """
+        self._expire()
+        if file_hash:
+            namespace = namespace_for(session_id)
+            for job in self._jobs.values():
+                if job.file_hash == file_hash and job.namespace == namespace and not job.done:
+                    count_event("ingest_dedup", scope="in_flight")
+                    return job
+        active = sum(1 for j in self._jobs.values() if not j.done)
+        if active >= self.max_concurrent + self.max_queued:
+            raise IngestQueueFull()
+        job = IngestJob(filename, doc_id, path, file_hash, session_id, ticker)
+        self._jobs[job.job_id] = job
+        job.task = asyncio.create_task(self._run(job))
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        self._expire()
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[IngestJob]:
+        job = self._jobs.get(job_id)
+        if job is None or job.done:
+            return job
+        job.cancel_requested = True
+        if job.status == QUEUED and job.task is not None:
+            # Still waiting for a slot: nothing to undo.
+            job.task.cancel()
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": sum(1 for j in self._jobs.values() if j.status == RUNNING),
+            "queued": sum(1 for j in self._jobs.values() if j.status == QUEUED),
+            "max_concurrent": self.max_concurrent,
+            "max_queued": self.max_queued,
+            "completed_total": dict(self.completed_total),
+        }
+
+    async def shutdown(self) -> None:
+        for job in list(self._jobs.values()):
+            if not job.done and job.task is not None:
+                job.cancel_requested = True
+                job.task.cancel()
+
+    # --- worker ---
+
+    async def _run(self, job: IngestJob) -> None:
+        try:
+            async with self._semaphore():
+                if job.cancel_requested:
+                    raise IngestCancelled()
+                job.status = RUNNING
+                job.started_at = time.time()
+                await self._ingest(job)
+                job.status = SUCCEEDED
+                job.stage = "done"
+                if job.deduplicated:
+                    print(f"[INGEST] {job.filename}: already indexed as {job.doc_id}")
+                else:
+                    print(f"[INGEST] {job.filename}: {job.chunks_embedded} chunks from {job.pages_total} pages")
+        except (IngestCancelled, asyncio.CancelledError):
+            job.status = CANCELLED
+            job.stage = "cancelled"
+            await self._discard(job)
+            print(f"[INGEST] Job {job.job_id} cancelled")
+        except Exception as e:
+            job.status = FAILED
+            job.error = str(e)
+            await self._discard(job)
+            print(f"[INGEST] Job {job.job_id} failed: {e}")
+        finally:
+            job.finished_at = time.time()
+            self.completed_total[job.status] = self.completed_total.get(job.status, 0) + 1
+            count_event("ingest_job", status=job.status)
+            try:
+                os.remove(job.path)
+            except OSError:
+                pass
+
+    async def _ingest(self, job: IngestJob) -> None:
+        rag = await RAG.aget()
+        if job.file_hash:
+            existing = await run_in(EMBEDDING_EXECUTOR, rag.find_document, job.file_hash, job.namespace)
+            if existing:
+                job.doc_id = existing
+                job.deduplicated = True
+                count_event("ingest_dedup", scope="indexed")
+                return
+        job.stage = "parsing"
+        job._pipeline_started = time.monotonic()
+        metadata = rag.document_metadata(job.session_id, job.ticker, job.filename, job.created_at)
+        stored = await run_in(
+            INGEST_EXECUTOR,
+            rag.ingest_pdf,
+            job.path,
+            job.doc_id,
+            job.record_progress,
+            lambda: job.cancel_requested,
+            job.file_hash,
+            job.namespace,
+            metadata,
+        )
+        if not stored:
+            raise ValueError("No extractable text in PDF")
+        job.chunks_total = job.chunks_embedded = stored
+
+    async def _discard(self, job: IngestJob) -> None:
+        if job.started_at is None:
+            return
+        try:
+            rag = await RAG.aget()
+            await run_in(EMBEDDING_EXECUTOR, rag.delete_document, job.doc_id, job.namespace)
+        except Exception as e:
+            print(f"[INGEST] Cleanup of {job.doc_id} failed: {e}")
+
+    def _expire(self) -> None:
+        cutoff = time.time() - self.ttl
+        for job_id in [j.job_id for j in self._jobs.values() if j.done and (j.finished_at or 0) < cutoff]:
+            self._jobs.pop(job_id, None)
+
+
+ingest_jobs = IngestJobManager()
@@ -0,0 +1,260 @@
+"""
+Prysm AI Agent - LLM provider.
+Single place that decides which model backs the agent:
+- the chat model used by the LangGraph `chatbot` node (`get_chat_model`)
+- plain text generation used by intent extraction, snapshot summaries and
+  sentiment scoring (`generate_text`)
+
+LLM_PROVIDER=gemini (default) uses Gemini 2.5 Flash. LLM_PROVIDER=fake uses a
+deterministic offline model that streams tokens at a configurable rate and issues
+the same tool calls the real model is instructed to make, so the whole pipeline can
+be load-tested and profiled without network access.
+"""
+import os
+import re
+import json
+import time
+import uuid
+import asyncio
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from telemetry import span
+
+GEMINI_MODEL = "gemini-2.5-flash"
+
+_text_client = None
+
+
+def provider_name() -> str:
+    return (os.getenv("LLM_PROVIDER") or "gemini").strip().lower()
+
+
+def is_fake() -> bool:
+    return provider_name() == "fake"
+
+
+# --- Chat model (LangGraph) ---
+
+def get_chat_model(temperature: float = 0.7) -> BaseChatModel:
+    if is_fake():
+        return FakeChatModel()
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY not found in environment variables (or set LLM_PROVIDER=fake)")
+    return ChatGoogleGenerativeAI(model=GEMINI_MODEL, api_key=api_key, temperature=temperature)
+
+
+# --- Plain text generation ---
+
+def _gemini_client():
+    global _text_client
+    if _text_client is None:
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            return None
+        try:
+            from google import genai
+            _text_client = genai.Client(api_key=api_key)
+        except Exception as e:
+            print(f"[LLM] Gemini client init failed: {e}")
+            return None
+    return _text_client
+
+
+def text_llm_available() -> bool:
+    return is_fake() or _gemini_client() is not None
+
+
+def generate_text(prompt: str, temperature: Optional[float] = None) -> str:
+    """Blocking one-shot completion. Run it on the LLM executor."""
+    with span("llm_text", provider=provider_name()):
+        if is_fake():
+            return fake_text_response(prompt)
+        client = _gemini_client()
+        if client is None:
+            raise RuntimeError("No text LLM configured")
+        from google.genai import types
+
+        config = types.GenerateContentConfig(temperature=temperature) if temperature is not None else None
+        response = client.models.generate_content(model=GEMINI_MODEL, contents=prompt, config=config)
+        return response.text or ""
+
+
+# --- Offline fake model ---
+
+FAKE_TTFT_MS = float(os.getenv("FAKE_LLM_TTFT_MS", "300"))
+FAKE_TOKENS_PER_SECOND = float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "150"))
+FAKE_ANSWER_WORDS = int(os.getenv("FAKE_LLM_ANSWER_WORDS", "400"))
+FAKE_TEXT_LATENCY_MS = float(os.getenv("FAKE_LLM_TEXT_LATENCY_MS", "200"))
+
+# Mirrors the TOOL TRIGGERS table the real model is prompted with.
+_TOOL_TRIGGERS = [
+    (re.compile(r"\b(compare|vs|versus|against)\b", re.I), "compare_stocks"),
+    (re.compile(r"\b(risk|risky|volatility|how safe)\b", re.I), "generate_risk_gauge"),
+    (re.compile(r"\b(future|outlook|targets?|timeline)\b", re.I), "generate_future_timeline"),
+    (re.compile(r"\b(sentiment|news|headlines|market mood)\b", re.I), "generate_sentiment_analysis"),
+    (re.compile(r"\b(chart|graph|visuali[sz]e|show me|plot)\b", re.I), "generate_chart"),
+    (re.compile(r"\b(document|file|uploaded|report|summary)\b", re.I), "consult_knowledge_base"),
+]
+_INTENT_WORDS = [
+    ("comparison", re.compile(r"\b(compare|vs|versus)\b", re.I)),
+    ("risk", re.compile(r"\brisk", re.I)),
+    ("future", re.compile(r"\b(future|outlook|target)", re.I)),
+    ("sentiment", re.compile(r"\b(sentiment|news)\b", re.I)),
+    ("chart", re.compile(r"\b(chart|graph|plot)\b", re.I)),
+    ("analysis", re.compile(r"\b(analy|stock|share|price)", re.I)),
+]
+_TICKER = re.compile(r"\b[A-Z][A-Z&]{1,14}\b")
+_NOT_TICKERS = {"THE", "AND", "FOR", "WHAT", "HOW", "IS", "OF", "VS", "IT", "ITS", "PE", "EPS", "ROE", "NSE", "BSE", "USER", "JSON"}
+_FILLER = (
+    "revenue growth margins valuation remains supported by steady order flow while operating leverage "
+    "and disciplined capital allocation underpin returns the balance sheet is conservative and cash "
+    "conversion is healthy though near term sentiment tracks sector rotation and global cues"
+).split()
+
+
+def _tickers(text: str) -> List[str]:
+    return [t for t in _TICKER.findall(text or "") if t not in _NOT_TICKERS]
+
+
+def _prompt_symbol(messages: Sequence[BaseMessage]) -> Optional[str]:
+    for m in messages:
+        if isinstance(m, SystemMessage) and isinstance(m.content, str):
+            match = re.search(r"(?:asking about|Selected stock context:) ([A-Z&]+)", m.content)
+            if match:
+                return match.group(1)
+    return None
+
+
+def fake_text_response(prompt: str) -> str:
+    """Deterministic stand-in for the one-shot prompts used outside the graph."""
+    time.sleep(FAKE_TEXT_LATENCY_MS / 1000.0)
+    if "Extract the ACTUAL stock ticker" in prompt:
+        match = re.search(r'User message: "(.*)"', prompt)
+        user = match.group(1) if match else ""
+        tickers = _tickers(user)
+        intent = next((name for name, pattern in _INTENT_WORDS if pattern.search(user)), "general")
+        return json.dumps({
+            "stock_symbol": tickers[0] if tickers else None,
+            "second_symbol": tickers[1] if len(tickers) > 1 else None,
+            "intent": intent,
+        })
+    if prompt.startswith("Summarize the following chat"):
+        return "- Summary (offline model): " + " ".join(prompt.split("CHAT:", 1)[-1].split()[:60])
+    if prompt.startswith("Analyze sentiment"):
+        return "{'overall': 'NEUTRAL', 'score': 50}"
+    return "OK"
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Scripted chat model:
+    - on a fresh user turn whose text matches a tool trigger, it returns that tool call
+    - otherwise (or after tool results) it streams a long-form answer word by word
+    """
+
+    ttft_ms: float = FAKE_TTFT_MS
+    tokens_per_second: float = FAKE_TOKENS_PER_SECOND
+    answer_words: int = FAKE_ANSWER_WORDS
+    tool_names: List[str] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "prysm-fake"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> "FakeChatModel":
+        names = [getattr(t, "name", None) or getattr(t, "__name__", "") for t in tools]
+        return self.model_copy(update={"tool_names": names})
+
+    # --- scripting ---
+
+    def _plan(self, messages: Sequence[BaseMessage]) -> AIMessage:
+        last = messages[-1] if messages else None
+        prompt_tokens = sum(len(str(m.content)) for m in messages) // 4
+        usage = {"input_tokens": prompt_tokens, "output_tokens": 0, "total_tokens": prompt_tokens}
+
+        if isinstance(last, HumanMessage) and self.tool_names:
+            text = str(last.content)
+            symbol = (_tickers(text) or [_prompt_symbol(messages) or "RELIANCE"])[0]
+            for pattern, tool_name in _TOOL_TRIGGERS:
+                if tool_name in self.tool_names and pattern.search(text):
+                    return AIMessage(
+                        content="",
+                        tool_calls=[{"name": tool_name, "args": self._tool_args(tool_name, text, symbol), "id": f"call_{uuid.uuid4().hex[:12]}"}],
+                        usage_metadata=usage,
+                    )
+
+        symbol = _prompt_symbol(messages) or "the stock"
+        words = [f"<thinking>Offline analysis of {symbol}.</thinking>", f"**{symbol}**"]
+        words += [_FILLER[i % len(_FILLER)] for i in range(self.answer_words)]
+        usage = dict(usage, output_tokens=len(words), total_tokens=prompt_tokens + len(words))
+        if isinstance(last, ToolMessage):
+            words.insert(2, "(after reviewing the tool output)")
+        return AIMessage(content=" ".join(words), usage_metadata=usage)
+
+    @staticmethod
+    def _tool_args(tool_name: str, text: str, symbol: str) -> Dict[str, Any]:
+        if tool_name == "compare_stocks":
+            tickers = _tickers(text)
+            return {"ticker1": tickers[0] if tickers else symbol, "ticker2": tickers[1] if len(tickers) > 1 else "INFY"}
+        if tool_name == "generate_chart":
+            return {"ticker": symbol, "chart_type": "line", "metric": "price"}
+        if tool_name == "consult_knowledge_base":
+            return {"query": text}
+        return {"ticker": symbol}
+
+    def _pieces(self, message: AIMessage) -> List[str]:
+        words = message.content.split(" ")
+        return [w + (" " if i < len(words) - 1 else "") for i, w in enumerate(words)]
+
+    # --- BaseChatModel hooks ---
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        message = self._plan(messages)
+        if message.content:
+            time.sleep(self.ttft_ms / 1000.0 + len(self._pieces(message)) / self.tokens_per_second)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        message = self._plan(messages)
+        time.sleep(self.ttft_ms / 1000.0)
+        for chunk in self._chunks(message):
+            if run_manager and chunk.text:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+            time.sleep(1.0 / self.tokens_per_second)
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        message = self._plan(messages)
+        await asyncio.sleep(self.ttft_ms / 1000.0)
+        for chunk in self._chunks(message):
+            if run_manager and chunk.text:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+            await asyncio.sleep(1.0 / self.tokens_per_second)
+
+    def _chunks(self, message: AIMessage) -> Iterator[ChatGenerationChunk]:
+        if message.tool_calls:
+            call = message.tool_calls[0]
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content="",
+                tool_call_chunks=[{"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": 0}],
+                usage_metadata=message.usage_metadata,
+            ))
+            return
+        pieces = self._pieces(message)
+        for i, piece in enumerate(pieces):
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content=piece,
+                usage_metadata=message.usage_metadata if i == len(pieces) - 1 else None,
+            ))
@@ -0,0 +1,128 @@
+"""
+Prysm AI Agent - Event-loop watchdog.
+A probe task on the event loop wakes every LOOP_WATCHDOG_INTERVAL_MS and records
+how late it woke (loop lag) into a histogram. A separate thread watches the
+probe's heartbeat: if the loop has not come back within LOOP_WATCHDOG_THRESHOLD_MS,
+it logs the stack the loop thread is stuck in, so the blocking call (a sync
+yfinance fetch, PDF parsing, ...) is named in the log while the stall is happening.
+
+Enable with LOOP_WATCHDOG_ENABLED=1; stats are exported on GET /metrics.
+"""
+import os
+import sys
+import time
+import asyncio
+import threading
+import traceback
+from typing import Any, Dict, Optional
+
+from telemetry import Histogram, count_event, register_gauges, register_metric
+
+LOOP_WATCHDOG_ENABLED = os.getenv("LOOP_WATCHDOG_ENABLED", "0").lower() in {"1", "true", "yes"}
+LOOP_WATCHDOG_INTERVAL_MS = float(os.getenv("LOOP_WATCHDOG_INTERVAL_MS", "50"))
+LOOP_WATCHDOG_THRESHOLD_MS = float(os.getenv("LOOP_WATCHDOG_THRESHOLD_MS", "200"))
+# Frames of the blocked stack to print (innermost last).
+LOOP_WATCHDOG_STACK_DEPTH = int(os.getenv("LOOP_WATCHDOG_STACK_DEPTH", "25"))
+
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LOOP_LAG = register_metric(Histogram("prysm_event_loop_lag_seconds", "How late the event loop ran a timer scheduled for now.", LAG_BUCKETS))
+LOOP_STALL = register_metric(Histogram("prysm_event_loop_stall_seconds", "Duration of loop stalls longer than the watchdog threshold.", LAG_BUCKETS))
+
+
+class LoopWatchdog:
+    def __init__(
+        self,
+        interval_ms: float = LOOP_WATCHDOG_INTERVAL_MS,
+        threshold_ms: float = LOOP_WATCHDOG_THRESHOLD_MS,
+        stack_depth: int = LOOP_WATCHDOG_STACK_DEPTH,
+    ):
+        self.interval = interval_ms / 1000.0
+        self.threshold = threshold_ms / 1000.0
+        self.stack_depth = stack_depth
+        self._probe: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._loop_thread_id: Optional[int] = None
+        # Monotonic time of the probe's last wake-up; read by the watchdog thread.
+        self._last_beat = time.monotonic()
+        self._stall_reported = False
+        self.stalls_total = 0
+        self.max_lag_seconds = 0.0
+        self.last_stall_seconds = 0.0
+
+    async def start(self) -> None:
+        if self._probe is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._probe = asyncio.create_task(self._run_probe())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        print(f"[LOOP_WATCHDOG] Enabled (interval {self.interval * 1000:.0f}ms, threshold {self.threshold * 1000:.0f}ms)")
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._probe is not None:
+            self._probe.cancel()
+            try:
+                await self._probe
+            except asyncio.CancelledError:
+                pass
+            self._probe = None
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    # --- loop side ---
+
+    async def _run_probe(self) -> None:
+        while True:
+            scheduled = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - scheduled - self.interval)
+            LOOP_LAG.observe(lag)
+            if lag > self.max_lag_seconds:
+                self.max_lag_seconds = lag
+            if self._stall_reported:
+                # The loop is back; report how long the stall lasted in total.
+                stalled = now - self._last_beat
+                self.last_stall_seconds = stalled
+                LOOP_STALL.observe(stalled)
+                print(f"[LOOP_WATCHDOG] Event loop recovered after {stalled * 1000:.0f}ms")
+                self._stall_reported = False
+            self._last_beat = now
+
+    # --- watchdog thread ---
+
+    def _watch(self) -> None:
+        poll = max(self.threshold / 4, 0.01)
+        while not self._stop.wait(poll):
+            blocked_for = time.monotonic() - self._last_beat - self.interval
+            if blocked_for < self.threshold or self._stall_reported:
+                continue
+            self._stall_reported = True
+            self.stalls_total += 1
+            count_event("loop_blocked")
+            print(f"[LOOP_WATCHDOG] Event loop blocked for {blocked_for * 1000:.0f}ms; loop thread is in:\n{self._loop_stack()}")
+
+    def _loop_stack(self) -> str:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return "  <loop thread stack unavailable>"
+        stack = traceback.extract_stack(frame)[-self.stack_depth:]
+        return "".join(traceback.format_list(stack)).rstrip()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": 1 if self._probe is not None else 0,
+            "stalls_total": self.stalls_total,
+            "max_lag_seconds": round(self.max_lag_seconds, 6),
+            "last_stall_seconds": round(self.last_stall_seconds, 6),
+            "threshold_seconds": self.threshold,
+        }
+
+
+loop_watchdog = LoopWatchdog()
+register_gauges("prysm_event_loop", loop_watchdog.stats)
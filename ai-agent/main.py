@@ -1,27 +1,46 @@
 import os
 import json
 import uuid
+import base64
+import time
 import asyncio
 import httpx
 from datetime import datetime, timezone
-from typing import Optional, AsyncGenerator, Dict, Any, List
-from fastapi import FastAPI, HTTPException, Request, UploadFile, File
+from typing import Optional, AsyncGenerator, Dict, Any, List, Tuple
+from fastapi import FastAPI, HTTPException, Request, Response, UploadFile, File, Form, Query
 from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 
 # LangGraph & LangChain Imports
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, ToolMessage
-from graph import graph
-
-# Tool Imports for Auto-Inject
-from tools import generate_risk_gauge, generate_future_timeline, generate_sentiment_analysis, compare_stocks, consult_knowledge_base
-from stock_data import get_stock_data, generate_price_history
-from rag_service import process_pdf, clear_db as clear_rag_db
+from langchain_core.messages import HumanMessage, SystemMessage, ToolMessage
+
+# The graph, stock_data and rag_service load lazily (or are preloaded after startup), see readiness.py.
+from readiness import GRAPH, MARKET_DATA, RAG, preload, readiness, startup_stats
+from rag_scope import GLOBAL_NAMESPACE, bind_rag_session, namespace_for
+from ingest_jobs import ingest_jobs, IngestQueueFull
+from embedding_cache import embedding_cache
+from cache_backend import cache as market_cache
+from warmer import market_warmer
+from persistence import turn_writer, is_stale_pending_turn, recovered_turn_update, CHECKPOINT_INTERVAL
+from sse import SSEWriter, negotiate_compression, response_headers
+from executors import LLM_EXECUTOR, MARKET_DATA_EXECUTOR, EMBEDDING_EXECUTOR, run_in, install_default_executor, shutdown_executors
+from admission import admission, AdmissionRejected
+from context_builder import build_history_messages, estimate_prompt_tokens, iter_segments
+from answer_cache import ANSWER_CACHE_ENABLED, answer_cache, make_key
+from fast_path import match_metric_lookup, render_answer
+from prompts import build_system_prompt, stock_context_cache
+from cassette import install as install_cassette
+from loop_watchdog import LOOP_WATCHDOG_ENABLED, loop_watchdog
+from telemetry import (
+    TRACE_HEADER, TRACE_ID_HEADER, TURNS, Trace, bind_trace, observe_stage, register_gauges,
+    render_prometheus, span, tracing_requested,
+)
 
 # MONGODB Imports
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import DESCENDING
 
 # Load .env from backend directory (Robust)
 from pathlib import Path
@@ -37,6 +56,9 @@ for p in possible_paths:
         break
 if env_path: load_dotenv(dotenv_path=env_path, override=True)
 
+# CASSETTE_MODE=record|replay swaps upstream market/news calls for a local cassette store.
+install_cassette()
+
 app = FastAPI(title="Prysm AI Agent (LangGraph + Mongo)", version="2.1.0")
 
 # CORS middleware
@@ -48,6 +70,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Cache and admission state shown on GET /metrics next to the stage histograms.
+register_gauges("prysm_admission", admission.stats)
+register_gauges("prysm_answer_cache", answer_cache.stats)
+register_gauges("prysm_stock_context_cache", stock_context_cache.stats)
+register_gauges("prysm_ingest_jobs", ingest_jobs.stats)
+register_gauges("prysm_embedding_cache", embedding_cache.stats)
+register_gauges("prysm_rag", lambda: RAG.peek().rag_cache_stats() if RAG.loaded else {})
+register_gauges("prysm_startup", startup_stats)
+register_gauges(f"prysm_{market_cache.name}_cache", market_cache.stats)
+register_gauges("prysm_warmer", market_warmer.stats)
+
 BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
 MONGO_URI = os.getenv("MONGO_URI")
 
@@ -58,6 +91,13 @@ db = None
 @app.on_event("startup")
 async def startup_db_client():
     global client_mongo, db
+    # Sync tools run on the loop's default executor; keep it bounded and separate from Gemini calls.
+    install_default_executor()
+    if LOOP_WATCHDOG_ENABLED:
+        await loop_watchdog.start()
+    await market_warmer.start()
+    # Off the request path: startup does not wait for it. GET /ready reports when it is done.
+    asyncio.create_task(preload())
     if MONGO_URI:
         try:
             client_mongo = AsyncIOMotorClient(MONGO_URI)
@@ -66,27 +106,34 @@ async def startup_db_client():
             print(f"Connected to MongoDB: prysm")
         except Exception as e:
             print(f"MongoDB Connection Failed: {e}")
+            return
+        try:
+            # Backs the keyset pagination used by GET /sessions.
+            await db.agent_sessions.create_index(
+                [("updated_at", DESCENDING), ("_id", DESCENDING)],
+                name="updated_at_id_desc",
+            )
+        except Exception as e:
+            print(f"MongoDB index creation failed: {e}")
+        turn_writer.bind(db.agent_sessions)
+        await turn_writer.start()
     else:
         print("WARNING: MONGO_URI not found.")
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await turn_writer.stop()
+    await loop_watchdog.stop()
+    await market_warmer.stop()
+    await ingest_jobs.shutdown()
     if client_mongo:
         client_mongo.close()
+    shutdown_executors()
 
 # --- HELPER: Intent Extraction ---
-from google import genai
-from google.genai import types
+from llm_provider import generate_text, text_llm_available
 import re
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-client_gemini = None
-if GEMINI_API_KEY:
-    try:
-        client_gemini = genai.Client(api_key=GEMINI_API_KEY)
-    except:
-        pass
-
 # ---- simplified ticker-context helpers (shared constants at module level) ----
 COMMON_WORDS = {
     "THE", "AND", "FOR", "STOCK", "PRICE", "CHART", "RISK", "WHAT", "SHOW", "GIVE", "TELL", "HAVE", "COPY",
@@ -163,19 +210,14 @@ Return ONLY valid JSON:
 {{"stock_symbol": "MAIN_TICKER" or null, "second_symbol": "SECOND_TICKER" or null, "intent": "risk/chart/future/sentiment/analysis/comparison/general"}}"""
 
     try:
-        if not client_gemini:
+        if not text_llm_available():
             return {
                 "stock_symbol": last_stock if (last_stock and _looks_like_followup(message)) else None,
                 "second_symbol": None,
                 "intent": "general",
             }
-        response = await asyncio.get_event_loop().run_in_executor(
-            None,
-            lambda: client_gemini.models.generate_content(
-                model="gemini-2.5-flash", contents=intent_prompt, config=types.GenerateContentConfig(temperature=0.1)
-            )
-        )
-        text = (response.text or "").strip().replace("```json", "").replace("```", "")
+        response_text = await run_in(LLM_EXECUTOR, generate_text, intent_prompt, 0.1)
+        text = (response_text or "").strip().replace("```json", "").replace("```", "")
         result = json.loads(text) if text else {}
 
         intent = (result.get("intent") or "general").strip().lower()
@@ -201,37 +243,31 @@ Return ONLY valid JSON:
 
 
 
-def create_stock_context(stock_data: dict) -> str:
-    if not stock_data: return "No data."
-    quote = stock_data.get('quote', {})
-    fin = stock_data.get('financials', {}).get('detailed', {})
-    ratios = stock_data.get('financials', {}).get('ratios', {})
-    shareholding = stock_data.get('shareholding', {})
-    company = stock_data.get('companyInfo', {})
-    
-    # Helper for safe formatting
-    def safe_pct(val):
-        if val is None: return "N/A"
-        try: return f"{float(val):.2f}"
-        except: return "N/A"
-    
-    desc = company.get('description') or "No description available."
-    desc = desc[:500] if len(desc) > 500 else desc
-    
-    context = (
-        f"Stock: {quote.get('symbol', 'N/A')} ({company.get('sector', 'N/A')})\n"
-        f"Price: {quote.get('price', 'N/A')} (Change: {quote.get('changePercent', 'N/A')}%)\n"
-        f"Market Cap: {fin.get('marketCap', 'N/A')}\n"
-        f"P/E: {fin.get('trailingPE', 'N/A')} | PEG: {fin.get('pegRatio', 'N/A')} | P/B: {fin.get('priceToBook', 'N/A')}\n"
-        f"Margins: Gross {safe_pct(fin.get('grossMargin'))}%, Net {safe_pct(fin.get('netMargin'))}%, Operating {safe_pct(fin.get('operatingMargin'))}%\n"
-        f"Returns: ROE {safe_pct(fin.get('returnOnEquity'))}%, ROA {safe_pct(fin.get('returnOnAssets'))}%\n"
-        f"Growth: Rev Growth {safe_pct(fin.get('revenueGrowth'))}%, Earnings Growth {safe_pct(fin.get('earningsGrowth'))}%\n"
-        f"Balance Sheet: Debt/Eq {fin.get('debtToEquity', 'N/A')}, Current Ratio {fin.get('currentRatio', 'N/A')}\n"
-        f"Cash Flow: Operating {fin.get('operatingCashflow', 'N/A')}, Free {fin.get('freeCashflow', 'N/A')}\n"
-        f"Shareholding: Promoters {shareholding.get('promoters', 'N/A')}%, FII {shareholding.get('fii', 'N/A')}%, DII {shareholding.get('dii', 'N/A')}%, Public {shareholding.get('public', 'N/A')}%\n"
-        f"Description: {desc}..."
-    )
-    return context
+# Fire-and-forget tasks; the loop keeps only weak references, so they are held here until done.
+_background_tasks: set = set()
+
+
+def _background_done(task: asyncio.Task) -> None:
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        print(f"[MAIN] Background task failed: {task.exception()!r}")
+
+
+def _spawn(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_done)
+    return task
+
+
+async def _session_has_documents(session_id: str) -> bool:
+    """Whether the session uploaded its own documents; True when that cannot be checked."""
+    try:
+        rag = await RAG.aget()
+        return await run_in(EMBEDDING_EXECUTOR, rag.has_documents, namespace_for(session_id))
+    except Exception as e:
+        print(f"[ANSWER_CACHE] Document check failed: {e}")
+        return True
 
 
 def _now_utc() -> datetime:
@@ -311,7 +347,7 @@ def _message_ts_to_date_str(msg: Dict[str, Any]) -> Optional[str]:
 
 
 async def _summarize_text_with_gemini(text: str) -> Optional[str]:
-    if not text or not client_gemini:
+    if not text or not text_llm_available():
         return None
     prompt = (
         "Summarize the following chat for durable storage. "
@@ -320,15 +356,8 @@ async def _summarize_text_with_gemini(text: str) -> Optional[str]:
         f"CHAT:\n{text}"
     )
     try:
-        response = await asyncio.get_event_loop().run_in_executor(
-            None,
-            lambda: client_gemini.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=prompt,
-                config=types.GenerateContentConfig(temperature=0.2),
-            ),
-        )
-        out = (response.text or "").strip()
+        response_text = await run_in(LLM_EXECUTOR, generate_text, prompt, 0.2)
+        out = (response_text or "").strip()
         return out[:1200]
     except Exception as e:
         print(f"[SNAPSHOT] Gemini summarize failed: {e}")
@@ -450,12 +479,64 @@ async def generate_response_stream(
     stock_symbol: Optional[str] = None,
     mode: Optional[str] = None,
     profile: Optional[str] = None,
+    trace: Optional[Trace] = None,
+):
+    """Admit the run (or shed it with an SSE error event), then stream the turn."""
+    bind_trace(trace)
+    try:
+        with span("admission_wait"):
+            await admission.acquire(session_id or f"anon:{uuid.uuid4()}")
+    except AdmissionRejected as e:
+        print(f"[ADMISSION] Rejected run for session {session_id}: {e.reason}")
+        TURNS.inc(outcome="rejected")
+        yield ("event", {
+            "error": "Prysm is handling too many requests right now. Please retry shortly.",
+            "code": "overloaded",
+            "reason": e.reason,
+            "retry_after": e.retry_after,
+        })
+        return
+    try:
+        async for chunk in _stream_turn(message, session_id, stock_symbol, mode, profile):
+            yield chunk
+    finally:
+        admission.release()
+    if trace is not None:
+        # Opt-in (X-Prysm-Trace: 1); clients that only read `content` ignore this frame.
+        summary = trace.summary()
+        print(f"[TRACE] {summary['trace_id']} total={summary['total_ms']}ms spans={len(summary['spans'])}")
+        yield ("event", {"trace": summary})
+
+
+async def _stream_turn(
+    message: str,
+    session_id: str = None,
+    stock_symbol: Optional[str] = None,
+    mode: Optional[str] = None,
+    profile: Optional[str] = None,
 ):
     
     # 1. Fetch Session from DB (null-safe)
+    turn_started_perf = time.perf_counter()
     session_data = None
     if session_id and db is not None:
-        session_data = await db.agent_sessions.find_one({"_id": session_id})
+        with span("session_load"):
+            # Make sure the previous turn's write-behind has landed before reading history.
+            await turn_writer.wait_for_session(session_id)
+            session_data = await db.agent_sessions.find_one({"_id": session_id})
+            pending_turn = (session_data or {}).get("pending_turn")
+            if pending_turn and is_stale_pending_turn(pending_turn):
+                # A previous stream died mid-turn; keep what it checkpointed. Matching updated_at
+                # leaves the turn alone if its stream checkpointed again since the read.
+                await db.agent_sessions.update_one(
+                    {
+                        "_id": session_id,
+                        "pending_turn.turn_id": pending_turn.get("turn_id"),
+                        "pending_turn.updated_at": pending_turn.get("updated_at"),
+                    },
+                    recovered_turn_update(pending_turn),
+                )
+                session_data = await db.agent_sessions.find_one({"_id": session_id})
     
     if not session_data:
         # If caller provided a session_id, keep it; otherwise create one.
@@ -469,27 +550,56 @@ async def generate_response_stream(
             "updated_at": _now_utc(),
         }
         if db is not None:
-            await db.agent_sessions.replace_one({"_id": session_id}, session_data, upsert=True)
+            with span("db_write", op="create_session"):
+                await db.agent_sessions.replace_one({"_id": session_id}, session_data, upsert=True)
+
+    # consult_knowledge_base searches this session's documents (plus shared ones).
+    bind_rag_session(session_id)
 
     # Archive older days into snapshots before adding more turns
     if db is not None:
-        try:
-            await _archive_previous_days(session_id)
-        except Exception as e:
-            print(f"[SNAPSHOT] Archive failed: {e}")
+        with span("archive"):
+            try:
+                await _archive_previous_days(session_id)
+            except Exception as e:
+                print(f"[SNAPSHOT] Archive failed: {e}")
     
-    # Re-fetch after potential archival
-    if db is not None:
-        session_data = await db.agent_sessions.find_one({"_id": session_id}) or session_data
+            # Re-fetch after potential archival
+            session_data = await db.agent_sessions.find_one({"_id": session_id}) or session_data
     history = session_data.get("messages", [])
 
     # 2. Intent & Context
     normalized_mode = (mode or "").strip().lower() or None
     normalized_profile = (profile or "").strip().lower() or None
 
+    # Fast path: simple metric lookups are answered from the cached snapshot, no LLM involved.
+    lookup = match_metric_lookup(message, stock_symbol)
+    if lookup:
+        lookup_symbol, metrics = lookup
+        market_warmer.record(lookup_symbol)
+        with span("stock_data"):
+            stock_data = await MARKET_DATA.aget()
+            lookup_data = await run_in(MARKET_DATA_EXECUTOR, stock_data.get_stock_data, lookup_symbol)
+        answer = render_answer(lookup_symbol, metrics, lookup_data)
+        if answer:
+            print(f"[MAIN] Fast path answer for {lookup_symbol}: {metrics}")
+            yield ("text", answer)
+            if len(history) == 0 and db is not None:
+                with span("db_write", op="title"):
+                    await db.agent_sessions.update_one(
+                        {"_id": session_id},
+                        {"$set": {"title": f"{lookup_symbol} Quote", "preview": _derive_preview(message), "updated_at": _now_utc()}},
+                        upsert=True,
+                    )
+            turn_writer.commit_turn(session_id, str(uuid.uuid4()), message, answer, _derive_preview(message), {"fast_path": True})
+            TURNS.inc(outcome="fast_path")
+            observe_stage("turn", time.perf_counter() - turn_started_perf, turn_started_perf, outcome="fast_path")
+            return
+
     # If user explicitly chose Overall, reduce sticky-stock behavior by not feeding prior stock context
     intent_history = [] if normalized_mode == "overall" else history
-    intent_data = await extract_intent(message, intent_history)
+    with span("intent"):
+        intent_data = await extract_intent(message, intent_history)
 
     selected_symbol = (stock_symbol or "").strip() or None
     requested_symbol = intent_data.get("stock_symbol")
@@ -517,11 +627,12 @@ async def generate_response_stream(
         session_data["preview"] = _derive_preview(message)
         session_data["updated_at"] = _now_utc()
         if db is not None:
-            await db.agent_sessions.update_one(
-                {"_id": session_id},
-                {"$set": {"title": session_data["title"], "preview": session_data["preview"], "updated_at": session_data["updated_at"]}},
-                upsert=True,
-            )
+            with span("db_write", op="title"):
+                await db.agent_sessions.update_one(
+                    {"_id": session_id},
+                    {"$set": {"title": session_data["title"], "preview": session_data["preview"], "updated_at": session_data["updated_at"]}},
+                    upsert=True,
+                )
 
     profile_hint = ""
     if normalized_profile == "strategic":
@@ -538,53 +649,45 @@ async def generate_response_stream(
     # Build system prompt.
     # - If a ticker is explicitly requested (or Stock mode is selected), enforce it.
     # - If a ticker is only selected in UI, include it as context without forcing it.
+    prompt_symbol = None
+    data = None
     if active_symbol and enforce_symbol:
-        data = get_stock_data(active_symbol)
-        context = create_stock_context(data)
-        system_prompt_text = f"""You are Prysm, an expert financial analyst.
-
-IMPORTANT: The user is asking about {active_symbol}. You MUST analyze {active_symbol}.
-Do NOT ask the user for the ticker - it is {active_symbol}.
-
-Stock Data for {active_symbol}:
-{context}
-
-RULES:
-1. Use your tools (generate_chart, generate_risk_gauge, generate_future_timeline, generate_sentiment_analysis) to provide visual insights.
-2. If the user asks to COMPARE {active_symbol} with another stock (e.g. INFY), **IMMEDIATELY call the `compare_stocks` tool**. Do not say "I don't have data for INFY". The tool will fetch it.
-3. If the user attaches a document or asks about a file, use `consult_knowledge_base`.
-4. Always provide detailed analysis based on real data.
-{mode_hint}{profile_hint}
-"""
+        prompt_symbol = active_symbol
     elif contextual_symbol:
-        data = get_stock_data(contextual_symbol)
-        context = create_stock_context(data)
-        system_prompt_text = f"""You are Prysm, an expert financial analyst.
-
-Selected stock context: {contextual_symbol}.
-The user has selected {contextual_symbol} in the UI. If the user's question is stock-specific but doesn't name a ticker, you may use {contextual_symbol} as the default.
-If the user's question is clearly portfolio-level / general, answer generally and do not force everything to be about {contextual_symbol}.
-
-Stock Data for {contextual_symbol} (context only):
-{context}
-
-RULES:
-1. Use your tools (generate_chart, generate_risk_gauge, generate_future_timeline, generate_sentiment_analysis) to provide visual insights when useful.
-2. If the user asks to COMPARE {contextual_symbol} with another stock (e.g. INFY), **IMMEDIATELY call the `compare_stocks` tool**.
-3. If the user asks about an uploaded document (PDF, report, annual report), ALWAYS use the `consult_knowledge_base` tool.
-{mode_hint}{profile_hint}
-"""
-    else:
-        system_prompt_text = """You are Prysm, an expert financial analyst.
-If the user asks about a stock without specifying a ticker, ask them which stock they want to analyze.
-If they ask to COMPARE two stocks, immediately use the `compare_stocks` tool (e.g. compare_stocks('TCS', 'INFY')).
-If the user asks about an uploaded document (PDF, report, annual report), ALWAYS use the `consult_knowledge_base` tool to search for relevant information before answering.""" + f"{mode_hint}{profile_hint}"
+        prompt_symbol = contextual_symbol
+    if prompt_symbol:
+        market_warmer.record(prompt_symbol)
+        with span("stock_data"):
+            stock_data = await MARKET_DATA.aget()
+            data = await run_in(MARKET_DATA_EXECUTOR, stock_data.get_stock_data, prompt_symbol)
+    with span("prompt_build", part="system"):
+        system_prompt_text = build_system_prompt(prompt_symbol, data, bool(active_symbol and enforce_symbol), mode_hint, profile_hint)
+
+    # Repeated research questions about the same stock (and same data) replay a cached answer.
+    # Follow-ups and sessions with their own documents depend on context other sessions lack.
+    cache_key = None
+    if ANSWER_CACHE_ENABLED and data and not history and not session_data.get("snapshots"):
+        if not await _session_has_documents(session_id):
+            cache_key = make_key(prompt_symbol, user_intent, normalized_profile, normalized_mode)
+    data_version = (data or {}).get("dataVersion")
+    if cache_key:
+        with span("answer_cache_lookup") as lookup_labels:
+            cached_answer = await answer_cache.lookup(cache_key, message, data_version)
+            lookup_labels["result"] = "hit" if cached_answer else "miss"
+        if cached_answer:
+            for segment in iter_segments(cached_answer):
+                yield segment
+            turn_writer.commit_turn(session_id, str(uuid.uuid4()), message, cached_answer, _derive_preview(message), {"cached": True})
+            TURNS.inc(outcome="cached")
+            observe_stage("turn", time.perf_counter() - turn_started_perf, turn_started_perf, outcome="cached")
+            return
 
     # 3. Message Construction (LangChain format)
-    lc_messages = [SystemMessage(content=system_prompt_text)]
-    for turn in history[-5:]: 
-        if turn['role'] == 'user': lc_messages.append(HumanMessage(content=turn['parts'][0]['text']))
-        else: lc_messages.append(AIMessage(content=turn['parts'][0]['text']))
+    # History is fitted into a token budget with UI payloads/thinking stripped;
+    # daily snapshot summaries cover anything older.
+    with span("prompt_build", part="history"):
+        history_messages, context_report = build_history_messages(history, session_data.get("snapshots"))
+    lc_messages = [SystemMessage(content=system_prompt_text)] + history_messages
     
     # 4. AUTO-INJECT (DISABLED to prevent double-tool repetition)
     # The LangGraph agent is smart enough to call these tools itself.
@@ -603,87 +706,213 @@ If the user asks about an uploaded document (PDF, report, annual report), ALWAYS
     #         lc_messages.append(SystemMessage(content=f"AUTO-ANALYSIS DATA for {target_symbol}: {json.dumps(summary)}"))
 
     lc_messages.append(HumanMessage(content=message))
+    prompt_tokens_estimate = estimate_prompt_tokens(lc_messages)
+    print(f"[CONTEXT] prompt≈{prompt_tokens_estimate} tokens ({context_report})")
 
     # 5. EXECUTE GRAPH
     accumulated_text = ""
     inputs = {"messages": lc_messages}
+    turn_id = str(uuid.uuid4())
+    turn_started = _now_utc()
+    loop = asyncio.get_running_loop()
+    last_checkpoint = loop.time()
+    checkpointed_len = 0
+    # Provider-reported input tokens per model call in this turn (first entry is the user-facing prompt).
+    llm_input_tokens: List[int] = []
+    cached_input_tokens = 0
+    graph_started = loop.time()
+    ttft_ms: Optional[float] = None
+    tools_used: List[str] = []
+    # run_id -> perf_counter start, for per-call LLM and tool spans.
+    run_starts: Dict[str, float] = {}
     
-    async for event in graph.astream_events(inputs, version="v1"):
-        kind = event["event"]
-        if kind == "on_chat_model_stream":
-            content = event["data"]["chunk"].content
+    completed = False
+    try:
+        graph = await GRAPH.aget()
+        async for event in graph.astream_events(inputs, version="v1"):
+            kind = event["event"]
+            if kind == "on_chat_model_stream":
+                content = event["data"]["chunk"].content
             
-            # Handle both string and list content
-            text_content = ""
-            if isinstance(content, str):
-                text_content = content
-            elif isinstance(content, list):
-                text_content = "".join(str(item) if isinstance(item, str) else str(item.get("text", "")) for item in content)
+                # Handle both string and list content
+                text_content = ""
+                if isinstance(content, str):
+                    text_content = content
+                elif isinstance(content, list):
+                    text_content = "".join(str(item) if isinstance(item, str) else str(item.get("text", "")) for item in content)
             
-            if text_content:
-                yield f"data: {json.dumps({'content': text_content})}\n\n"
-                accumulated_text += text_content
-        elif kind == "on_tool_end":
-            output = event["data"].get("output")
+                if text_content:
+                    if ttft_ms is None:
+                        ttft_ms = round((loop.time() - graph_started) * 1000, 1)
+                        observe_stage("llm_ttft", ttft_ms / 1000)
+                    yield ("text", text_content)
+                    accumulated_text += text_content
+            elif kind in ("on_chat_model_start", "on_tool_start"):
+                run_starts[event.get("run_id")] = time.perf_counter()
+            elif kind == "on_chat_model_end":
+                started_at = run_starts.pop(event.get("run_id"), None)
+                if started_at is not None:
+                    observe_stage("llm_call", time.perf_counter() - started_at, started_at)
+                usage = getattr(event["data"].get("output"), "usage_metadata", None) or {}
+                if usage.get("input_tokens"):
+                    llm_input_tokens.append(usage["input_tokens"])
+                    # Tokens served from the provider's prompt cache (stable prefix reuse).
+                    cached_input_tokens += (usage.get("input_token_details") or {}).get("cache_read", 0) or 0
+            elif kind == "on_tool_end":
+                tools_used.append(event.get("name", ""))
+                started_at = run_starts.pop(event.get("run_id"), None)
+                if started_at is not None:
+                    observe_stage("tool", time.perf_counter() - started_at, started_at, tool=event.get("name", ""))
+                output = event["data"].get("output")
             
-            # LangGraph's ToolNode wraps output in ToolMessage
-            if hasattr(output, 'content'):
-                output = output.content
-                if isinstance(output, str) and output.startswith("{"):
-                    try:
-                        output = json.loads(output)
-                    except:
-                        pass
+                # LangGraph's ToolNode wraps output in ToolMessage
+                if hasattr(output, 'content'):
+                    output = output.content
+                    if isinstance(output, str) and output.startswith("{"):
+                        try:
+                            output = json.loads(output)
+                        except:
+                            pass
             
-            # Handle both dict and string outputs
-            ui = None
-            if isinstance(output, dict):
-                ui = output.get("ui_content")
-            elif isinstance(output, str) and output.startswith("["):
-                ui = output
+                # Handle both dict and string outputs
+                ui = None
+                if isinstance(output, dict):
+                    ui = output.get("ui_content")
+                elif isinstance(output, str) and output.startswith("["):
+                    ui = output
             
-            if ui:
-                yield f"data: {json.dumps({'content': ui})}\n\n"
-                accumulated_text += ui
-
-    # 6. Save to DB (if available)
-    now_ts = _now_utc()
-    new_messages = [
-        {"role": "user", "parts": [{"text": message}], "ts": now_ts},
-        {"role": "model", "parts": [{"text": accumulated_text}], "ts": now_ts}
-    ]
-    if db is not None:
-        await db.agent_sessions.update_one(
-            {"_id": session_id},
-            {
-                "$push": {"messages": {"$each": new_messages}},
-                "$set": {"preview": _derive_preview(message), "updated_at": now_ts},
-                "$setOnInsert": {"title": "New Chat", "created_at": now_ts},
-            },
-            upsert=True
-        )
+                if ui:
+                    yield ("ui", ui)
+                    accumulated_text += ui
+
+            # Checkpoint partial output of long streams so a dropped connection keeps the turn.
+            if len(accumulated_text) > checkpointed_len and loop.time() - last_checkpoint >= CHECKPOINT_INTERVAL:
+                turn_writer.checkpoint(session_id, turn_id, message, accumulated_text, turn_started)
+                checkpointed_len = len(accumulated_text)
+                last_checkpoint = loop.time()
+        completed = True
+        # Answers grounded in a user's uploaded documents are not shareable.
+        if cache_key and accumulated_text and "consult_knowledge_base" not in tools_used:
+            _spawn(answer_cache.store(cache_key, message, data_version, accumulated_text))
+    finally:
+        # 6. Save to DB (write-behind; the stream closes without waiting on Mongo).
+        # If the client disconnected, the run was cancelled; keep what was produced so far.
+        extra = {
+            "prompt_tokens": llm_input_tokens[0] if llm_input_tokens else prompt_tokens_estimate,
+            "prompt_tokens_estimated": not llm_input_tokens,
+            "input_tokens_total": sum(llm_input_tokens) if llm_input_tokens else prompt_tokens_estimate,
+            "cached_input_tokens": cached_input_tokens,
+            "ttft_ms": ttft_ms,
+        }
+        print(f"[CONTEXT] Turn tokens for session {session_id}: {extra}")
+        if not completed:
+            extra["interrupted"] = True
+            print(f"[MAIN] Run for session {session_id} cancelled after {len(accumulated_text)} chars")
+        turn_writer.commit_turn(session_id, turn_id, message, accumulated_text, _derive_preview(message), extra)
+        outcome = "completed" if completed else "interrupted"
+        TURNS.inc(outcome=outcome)
+        observe_stage("turn", time.perf_counter() - turn_started_perf, turn_started_perf, outcome=outcome)
 
 
 # --- API ENDPOINTS ---
 
 @app.post("/chat")
-async def chat_endpoint(request: ChatRequest):
+async def chat_endpoint(request: ChatRequest, http_request: Request):
+    compress = negotiate_compression(http_request.headers.get("accept-encoding"))
+    writer = SSEWriter(compress=compress)
+    headers = response_headers(compress)
+    trace = Trace() if tracing_requested(http_request.headers.get(TRACE_HEADER)) else None
+    if trace is not None:
+        headers[TRACE_ID_HEADER] = trace.trace_id
     return StreamingResponse(
-        generate_response_stream(
-            request.message,
-            request.session_id,
-            request.stock_symbol,
-            request.mode,
-            request.profile,
+        writer.stream(
+            generate_response_stream(
+                request.message,
+                request.session_id,
+                request.stock_symbol,
+                request.mode,
+                request.profile,
+                trace,
+            ),
+            is_disconnected=http_request.is_disconnected,
         ),
-        media_type="text/event-stream"
+        media_type="text/event-stream",
+        headers=headers,
     )
 
+# Sidebar only needs these fields; never ship messages/snapshots in the list view.
+SESSION_LIST_PROJECTION = {"title": 1, "preview": 1, "updated_at": 1, "created_at": 1}
+SESSION_LIST_MAX_LIMIT = 100
+
+
+def _encode_session_cursor(session: Dict[str, Any]) -> Optional[str]:
+    updated_at = session.get("updated_at")
+    if not isinstance(updated_at, datetime):
+        return None
+    raw = json.dumps({"u": updated_at.isoformat(), "id": session["_id"]})
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_session_cursor(cursor: str) -> Optional[Dict[str, Any]]:
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        return {"updated_at": datetime.fromisoformat(raw["u"]), "_id": raw["id"]}
+    except Exception:
+        return None
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus text exposition: stage latency histograms, event counters and cache/admission gauges."""
+    return Response(content=render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/ready")
+async def get_readiness():
+    """200 once the components in STARTUP_PRELOAD are loaded and warm, 503 until then (load times per component)."""
+    ready, report = readiness()
+    return Response(content=json.dumps(report), status_code=200 if ready else 503, media_type="application/json")
+
+@app.get("/admission")
+async def get_admission_stats():
+    """Queue depth, in-flight runs, rejections and wait-time stats for /chat admission."""
+    return admission.stats()
+
 @app.get("/sessions")
-async def get_sessions():
+async def get_sessions(
+    response: Response,
+    limit: int = Query(50, ge=1, le=SESSION_LIST_MAX_LIMIT),
+    cursor: Optional[str] = None,
+):
+    """
+    List sessions newest-first with keyset pagination on (updated_at, _id).
+    The next page's cursor is returned in the X-Next-Cursor header so the body
+    stays a plain list for the sidebar.
+    """
     if db is None: return []
-    cursor = db.agent_sessions.find().sort("updated_at", -1)
-    sessions = await cursor.to_list(length=50)
+
+    query: Dict[str, Any] = {}
+    if cursor:
+        after = _decode_session_cursor(cursor)
+        if not after:
+            raise HTTPException(status_code=400, detail="Invalid cursor.")
+        query = {
+            "$or": [
+                {"updated_at": {"$lt": after["updated_at"]}},
+                {"updated_at": after["updated_at"], "_id": {"$lt": after["_id"]}},
+            ]
+        }
+
+    cursor_db = (
+        db.agent_sessions.find(query, SESSION_LIST_PROJECTION)
+        .sort([("updated_at", DESCENDING), ("_id", DESCENDING)])
+        .limit(limit)
+    )
+    sessions = await cursor_db.to_list(length=limit)
+
+    if len(sessions) == limit:
+        next_cursor = _encode_session_cursor(sessions[-1])
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
     return sessions
 
 @app.get("/sessions/{session_id}")
@@ -692,6 +921,44 @@ async def get_session(session_id: str):
     session = await db.agent_sessions.find_one({"_id": session_id})
     return session or {"error": "Not Found"}
 
+@app.get("/sessions/{session_id}/messages")
+async def get_session_messages(
+    session_id: str,
+    before: Optional[int] = Query(None, ge=0),
+    limit: int = Query(20, ge=1, le=SESSION_LIST_MAX_LIMIT),
+):
+    """
+    Page backwards through a session's messages without loading the whole document.
+    `before` is an index into the messages array (exclusive); omit it for the latest turns.
+    """
+    if db is None: return {"error": "DB not found"}
+
+    sized = await db.agent_sessions.aggregate([
+        {"$match": {"_id": session_id}},
+        {"$project": {"total": {"$size": {"$ifNull": ["$messages", []]}}}},
+    ]).to_list(length=1)
+    if not sized:
+        return {"error": "Not Found"}
+
+    total = sized[0]["total"]
+    end = total if before is None else min(before, total)
+    start = max(end - limit, 0)
+
+    messages: List[Dict[str, Any]] = []
+    if end > start:
+        doc = await db.agent_sessions.find_one(
+            {"_id": session_id},
+            {"messages": {"$slice": [start, end - start]}, "_id": 1},
+        )
+        messages = (doc or {}).get("messages", [])
+
+    return {
+        "messages": messages,
+        "start": start,
+        "total": total,
+        "next_before": start if start > 0 else None,
+    }
+
 @app.post("/sessions")
 async def create_session():
     new_id = str(uuid.uuid4())
@@ -708,40 +975,94 @@ async def create_session():
 
 # --- RAG ENDPOINTS ---
 import tempfile
-import shutil
-
-@app.post("/upload_doc")
-async def upload_document(file: UploadFile = File(...)):
-    """Upload a PDF document, process it, and add to the RAG vector database."""
+import hashlib
+
+def _save_upload(file: UploadFile) -> Tuple[str, str]:
+    """Copy the upload to a temp file, hashing it on the way (for duplicate detection)."""
+    digest = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp:
+        for block in iter(lambda: file.file.read(1 << 20), b""):
+            digest.update(block)
+            tmp.write(block)
+        return tmp.name, digest.hexdigest()
+
+
+@app.post("/upload_doc", status_code=202)
+async def upload_document(
+    file: UploadFile = File(...),
+    session_id: Optional[str] = Form(None),
+    ticker: Optional[str] = Form(None),
+    shared: bool = Form(False),
+):
+    """
+    Accept a PDF and queue it for ingestion into the RAG vector database.
+    With a session_id the document goes to that session's own collection and is
+    only searched from that session. Without one it is shared with every session,
+    which must be asked for explicitly with shared=true.
+    Returns a job id immediately; poll GET /upload_doc/{job_id} for progress.
+    """
     if not file.filename.endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are supported.")
-    
+    if not session_id and not shared:
+        raise HTTPException(status_code=400, detail="session_id is required (or shared=true to share the document with every session).")
+
     try:
-        # Save to temp file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp:
-            shutil.copyfileobj(file.file, tmp)
-            tmp_path = tmp.name
-        
-        # Process and add to ChromaDB
-        doc_id = file.filename.replace('.pdf', '') + '_' + str(uuid.uuid4())[:8]
-        success, chunk_count = process_pdf(tmp_path, doc_id)
-        
-        # Cleanup temp file
-        os.remove(tmp_path)
-        
-        if success:
-            return {"status": "success", "message": f"Processed {chunk_count} chunks from {file.filename}", "doc_id": doc_id}
-        else:
-            raise HTTPException(status_code=500, detail="Failed to process PDF.")
+        tmp_path, file_hash = await run_in(EMBEDDING_EXECUTOR, _save_upload, file)
     except Exception as e:
         print(f"[RAG Upload Error] {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+    doc_id = file.filename.replace('.pdf', '') + '_' + str(uuid.uuid4())[:8]
+    try:
+        job = ingest_jobs.submit(tmp_path, file.filename, doc_id, file_hash, session_id or None, ticker or None)
+    except IngestQueueFull:
+        os.remove(tmp_path)
+        raise HTTPException(status_code=429, detail="Too many documents are being processed. Please retry shortly.")
+    if job.path != tmp_path:
+        # Same file is already being ingested; report that job.
+        os.remove(tmp_path)
+    return {"status": job.status, "job_id": job.job_id, "doc_id": job.doc_id, "message": f"Queued {file.filename} for processing"}
+
+@app.get("/upload_doc/{job_id}")
+async def get_upload_job(job_id: str):
+    """Ingestion progress: status, pages parsed, chunks embedded and ETA."""
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.delete("/upload_doc/{job_id}")
+async def cancel_upload_job(job_id: str):
+    """Cancel a queued or running ingestion job; chunks it already stored are removed."""
+    job = ingest_jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.get("/documents")
+async def get_documents(session_id: Optional[str] = None):
+    """Documents in a session's namespace (or the shared one without session_id)."""
+    rag = await RAG.aget()
+    documents = await run_in(EMBEDDING_EXECUTOR, rag.list_documents, namespace_for(session_id))
+    return {"documents": documents}
+
+@app.delete("/documents/{doc_id}")
+async def remove_document(doc_id: str, session_id: Optional[str] = None):
+    """Delete one document's chunks (vectors, lexical index and table rows) from a session's namespace, or the shared one."""
+    rag = await RAG.aget()
+    removed = await run_in(EMBEDDING_EXECUTOR, rag.delete_document, doc_id, namespace_for(session_id))
+    if not removed:
+        if session_id and await run_in(EMBEDDING_EXECUTOR, rag.has_document, doc_id, GLOBAL_NAMESPACE):
+            raise HTTPException(status_code=403, detail="Shared documents cannot be deleted from a session")
+        raise HTTPException(status_code=404, detail="Document not found")
+    return {"status": "success", "doc_id": doc_id, "chunks_removed": removed}
+
 @app.post("/clear_rag")
-async def clear_rag():
-    """Clear all documents from the RAG vector database."""
+async def clear_rag(session_id: Optional[str] = None):
+    """Clear one session's documents, or all documents from the RAG vector database."""
     try:
-        clear_rag_db()
+        rag = await RAG.aget()
+        await run_in(EMBEDDING_EXECUTOR, rag.clear_db, namespace_for(session_id) if session_id else None)
         return {"status": "success", "message": "RAG database cleared."}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
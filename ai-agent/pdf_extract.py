@@ -0,0 +1,42 @@
+"""
+Prysm AI Agent - PDF text extraction.
+Kept free of heavy imports (no Chroma, no SentenceTransformer) because these
+functions run in the ingestion process pool, which imports this module in every
+worker.
+"""
+from typing import Any, Dict, List, Tuple
+
+from pypdf import PdfReader
+
+from table_extract import extract_rows, looks_like_statement
+
+
+def count_pages(file_path: str) -> int:
+    return len(PdfReader(file_path).pages)
+
+
+def extract_pages(file_path: str, start: int, end: int) -> List[str]:
+    """Text of pages [start, end); pages without extractable text come back as ""."""
+    return extract_page_range(file_path, start, end, tables=False)[0]
+
+
+def extract_page_range(file_path: str, start: int, end: int, tables: bool = True) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """
+    Text of pages [start, end) and, with `tables`, the financial line items on them
+    (see table_extract.py). Statement pages are extracted a second time in layout
+    mode, which keeps each table row on one line.
+    """
+    reader = PdfReader(file_path)
+    texts: List[str] = []
+    rows: List[Dict[str, Any]] = []
+    for index in range(start, min(end, len(reader.pages))):
+        page = reader.pages[index]
+        text = page.extract_text() or ""
+        texts.append(text)
+        if tables and looks_like_statement(text):
+            try:
+                layout = page.extract_text(extraction_mode="layout") or text
+            except TypeError:
+                layout = text  # pypdf < 3.17 has no layout mode
+            rows.extend(extract_rows(layout, index + 1))
+    return texts, rows
@@ -0,0 +1,216 @@
+"""
+Prysm AI Agent - Write-behind persistence for chat turns.
+Streams hand their turn writes to a single background writer which batches them
+into ordered bulk writes, so closing an SSE stream never waits on MongoDB.
+"""
+import os
+import asyncio
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from telemetry import count_event, span
+
+# How long the writer waits to grow a batch, and how big a batch may get.
+FLUSH_INTERVAL = float(os.getenv("PERSIST_FLUSH_INTERVAL", "0.25"))
+MAX_BATCH = int(os.getenv("PERSIST_MAX_BATCH", "100"))
+# How often a long stream checkpoints its partial model output.
+CHECKPOINT_INTERVAL = float(os.getenv("PERSIST_CHECKPOINT_INTERVAL", "2.0"))
+# A pending_turn not checkpointed for this long belongs to a dead stream; a fresher
+# one may still be streaming in another request and is left alone.
+PENDING_TURN_STALE_SECONDS = float(os.getenv("PERSIST_PENDING_TURN_STALE_SECONDS", "120"))
+# Attempts per batch before it is given up on.
+WRITE_ATTEMPTS = 3
+
+
+def _now_utc() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def turn_messages(
+    user_message: str,
+    model_text: str,
+    ts: datetime,
+    extra: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """Build the user/model message pair stored in `agent_sessions.messages`."""
+    model_msg = {"role": "model", "parts": [{"text": model_text}], "ts": ts}
+    if extra:
+        model_msg.update(extra)
+    return [
+        {"role": "user", "parts": [{"text": user_message}], "ts": ts},
+        model_msg,
+    ]
+
+
+class TurnWriter:
+    """
+    Background queue of session writes.
+
+    Two kinds of writes are queued:
+    - checkpoints: `$set` of the in-flight `pending_turn` (partial model output)
+    - commits: `$push` of the finished user/model messages and `$unset` of `pending_turn`
+
+    Within a batch, a checkpoint is dropped if a later write for the same turn supersedes it.
+    """
+
+    def __init__(self, flush_interval: float = FLUSH_INTERVAL, max_batch: int = MAX_BATCH):
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.collection = None
+        self._queue: "asyncio.Queue[Tuple[str, str, str, Dict[str, Any]]]" = None
+        self._task: Optional[asyncio.Task] = None
+        self._pending: Dict[str, int] = {}
+        self._idle: Dict[str, asyncio.Event] = {}
+
+    def bind(self, collection) -> None:
+        self.collection = collection
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Flush everything still queued, then stop the writer."""
+        if self._task is None:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    # --- producers ---
+
+    def checkpoint(self, session_id: str, turn_id: str, user_message: str, partial_text: str, started_at: datetime) -> None:
+        self._enqueue(session_id, turn_id, "checkpoint", {
+            "$set": {
+                "pending_turn": {
+                    "turn_id": turn_id,
+                    "user": user_message,
+                    "text": partial_text,
+                    "started_at": started_at,
+                    "updated_at": _now_utc(),
+                }
+            }
+        })
+
+    def commit_turn(
+        self,
+        session_id: str,
+        turn_id: str,
+        user_message: str,
+        model_text: str,
+        preview: str,
+        extra: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        now_ts = _now_utc()
+        self._enqueue(session_id, turn_id, "commit", {
+            "$push": {"messages": {"$each": turn_messages(user_message, model_text, now_ts, extra)}},
+            "$set": {"preview": preview, "updated_at": now_ts},
+            "$unset": {"pending_turn": ""},
+            "$setOnInsert": {"title": "New Chat", "created_at": now_ts},
+        })
+
+    async def wait_for_session(self, session_id: str) -> None:
+        """Block until every queued write for `session_id` has reached the DB."""
+        event = self._idle.get(session_id)
+        if event is not None and self._pending.get(session_id):
+            await event.wait()
+
+    def _enqueue(self, session_id: str, turn_id: str, kind: str, update: Dict[str, Any]) -> None:
+        if self.collection is None or self._queue is None:
+            return
+        self._pending[session_id] = self._pending.get(session_id, 0) + 1
+        self._idle.setdefault(session_id, asyncio.Event()).clear()
+        self._queue.put_nowait((session_id, turn_id, kind, update))
+
+    # --- consumer ---
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._flush(batch)
+            finally:
+                for session_id, *_ in batch:
+                    self._mark_done(session_id)
+                    self._queue.task_done()
+
+    async def _flush(self, batch: List[Tuple[str, str, str, Dict[str, Any]]]) -> None:
+        # Keep only the latest checkpoint per turn, and none if the turn was committed.
+        latest: Dict[Tuple[str, str], int] = {}
+        for i, (session_id, turn_id, _, _) in enumerate(batch):
+            latest[(session_id, turn_id)] = i
+        ops = [
+            UpdateOne({"_id": session_id}, update, upsert=True)
+            for i, (session_id, turn_id, kind, update) in enumerate(batch)
+            if kind == "commit" or latest[(session_id, turn_id)] == i
+        ]
+        if len(ops) < len(batch):
+            count_event("coalesced", len(batch) - len(ops), kind="checkpoint")
+        for attempt in range(WRITE_ATTEMPTS):
+            try:
+                with span("db_write", op="bulk_write"):
+                    await self.collection.bulk_write(ops, ordered=True)
+                return
+            except Exception as e:
+                print(f"[PERSIST] Bulk write failed (attempt {attempt + 1}, {len(ops)} ops): {e}")
+                if attempt + 1 < WRITE_ATTEMPTS:
+                    await asyncio.sleep(0.5 * 2 ** attempt)
+        sessions = sorted({session_id for session_id, *_ in batch})
+        commits = sum(1 for _, _, kind, _ in batch if kind == "commit")
+        count_event("dropped", len(ops), kind="turn_write")
+        print(f"[PERSIST] ERROR: dropped {len(ops)} writes ({commits} turns) after {WRITE_ATTEMPTS} attempts; sessions: {', '.join(sessions)}")
+
+    def _mark_done(self, session_id: str) -> None:
+        left = self._pending.get(session_id, 1) - 1
+        if left <= 0:
+            self._pending.pop(session_id, None)
+            event = self._idle.pop(session_id, None)
+            if event is not None:
+                event.set()
+        else:
+            self._pending[session_id] = left
+
+
+def is_stale_pending_turn(pending_turn: Dict[str, Any], stale_after: float = PENDING_TURN_STALE_SECONDS) -> bool:
+    """True when the turn has not been checkpointed for `stale_after` seconds (its stream is gone)."""
+    updated_at = pending_turn.get("updated_at") or pending_turn.get("started_at")
+    if not isinstance(updated_at, datetime):
+        return True
+    if updated_at.tzinfo is None:
+        # Mongo returns naive UTC datetimes unless the client is tz-aware.
+        updated_at = updated_at.replace(tzinfo=timezone.utc)
+    return (_now_utc() - updated_at).total_seconds() >= stale_after
+
+
+def recovered_turn_update(pending_turn: Dict[str, Any]) -> Dict[str, Any]:
+    """Update that folds a stale `pending_turn` (stream died mid-turn) into `messages`."""
+    ts = pending_turn.get("started_at") or _now_utc()
+    return {
+        "$push": {"messages": {"$each": turn_messages(
+            pending_turn.get("user", ""),
+            pending_turn.get("text", ""),
+            ts,
+            {"interrupted": True},
+        )}},
+        "$unset": {"pending_turn": ""},
+    }
+
+
+turn_writer = TurnWriter()
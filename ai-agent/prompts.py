@@ -0,0 +1,128 @@
+"""
+Prysm AI Agent - System prompt assembly.
+The prompt is laid out stable-first: the static instructions, then the per-symbol
+stock block (cached and keyed by the data version of the snapshot it was built
+from), then the mode/profile hints. The cache saves re-rendering the block on
+every turn. The whole system prompt is only a few hundred tokens, below the
+minimum prefix length providers cache, so this ordering does not by itself earn
+provider-side prompt caching; cached_input_tokens on stored turns shows whether
+any applies.
+"""
+import os
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+STOCK_CONTEXT_CACHE_SIZE = int(os.getenv("STOCK_CONTEXT_CACHE_SIZE", "256"))
+
+PROMPT_PREFIX = """You are Prysm, an expert financial analyst.
+
+RULES:
+1. Use your tools (generate_chart, generate_risk_gauge, generate_future_timeline, generate_sentiment_analysis) to provide visual insights when useful.
+2. If the user asks to COMPARE two stocks (e.g. TCS vs INFY), **IMMEDIATELY call the `compare_stocks` tool** (e.g. compare_stocks('TCS', 'INFY')). Do not say "I don't have data for INFY". The tool will fetch it.
+3. If the user attaches a document or asks about an uploaded document (PDF, report, annual report), ALWAYS use the `consult_knowledge_base` tool to search for relevant information before answering.
+4. Always provide detailed analysis based on real data.
+"""
+
+NO_SYMBOL_BLOCK = """
+No stock is selected. If the user asks about a stock without specifying a ticker, ask them which stock they want to analyze.
+"""
+
+
+def create_stock_context(stock_data: dict) -> str:
+    if not stock_data: return "No data."
+    quote = stock_data.get('quote', {})
+    fin = stock_data.get('financials', {}).get('detailed', {})
+    shareholding = stock_data.get('shareholding', {})
+    company = stock_data.get('companyInfo', {})
+    
+    # Helper for safe formatting
+    def safe_pct(val):
+        if val is None: return "N/A"
+        try: return f"{float(val):.2f}"
+        except: return "N/A"
+    
+    desc = company.get('description') or "No description available."
+    desc = desc[:500] if len(desc) > 500 else desc
+    
+    context = (
+        f"Stock: {quote.get('symbol', 'N/A')} ({company.get('sector', 'N/A')})\n"
+        f"Price: {quote.get('price', 'N/A')} (Change: {quote.get('changePercent', 'N/A')}%)\n"
+        f"Market Cap: {fin.get('marketCap', 'N/A')}\n"
+        f"P/E: {fin.get('trailingPE', 'N/A')} | PEG: {fin.get('pegRatio', 'N/A')} | P/B: {fin.get('priceToBook', 'N/A')}\n"
+        f"Margins: Gross {safe_pct(fin.get('grossMargin'))}%, Net {safe_pct(fin.get('netMargin'))}%, Operating {safe_pct(fin.get('operatingMargin'))}%\n"
+        f"Returns: ROE {safe_pct(fin.get('returnOnEquity'))}%, ROA {safe_pct(fin.get('returnOnAssets'))}%\n"
+        f"Growth: Rev Growth {safe_pct(fin.get('revenueGrowth'))}%, Earnings Growth {safe_pct(fin.get('earningsGrowth'))}%\n"
+        f"Balance Sheet: Debt/Eq {fin.get('debtToEquity', 'N/A')}, Current Ratio {fin.get('currentRatio', 'N/A')}\n"
+        f"Cash Flow: Operating {fin.get('operatingCashflow', 'N/A')}, Free {fin.get('freeCashflow', 'N/A')}\n"
+        f"Shareholding: Promoters {shareholding.get('promoters', 'N/A')}%, FII {shareholding.get('fii', 'N/A')}%, DII {shareholding.get('dii', 'N/A')}%, Public {shareholding.get('public', 'N/A')}%\n"
+        f"Description: {desc}..."
+    )
+    return context
+
+
+def _enforced_block(symbol: str, context: str) -> str:
+    return f"""
+IMPORTANT: The user is asking about {symbol}. You MUST analyze {symbol}.
+Do NOT ask the user for the ticker - it is {symbol}.
+If the user asks to COMPARE {symbol} with another stock, call `compare_stocks` with {symbol} as the first ticker.
+
+Stock Data for {symbol}:
+{context}
+"""
+
+
+def _contextual_block(symbol: str, context: str) -> str:
+    return f"""
+Selected stock context: {symbol}.
+The user has selected {symbol} in the UI. If the user's question is stock-specific but doesn't name a ticker, you may use {symbol} as the default.
+If the user's question is clearly portfolio-level / general, answer generally and do not force everything to be about {symbol}.
+
+Stock Data for {symbol} (context only):
+{context}
+"""
+
+
+class StockContextCache:
+    """LRU of rendered stock blocks keyed by (kind, symbol, data version)."""
+
+    def __init__(self, max_entries: int = STOCK_CONTEXT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str, str], str]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def block(self, kind: str, symbol: str, data: Optional[Dict[str, Any]]) -> str:
+        version = (data or {}).get("dataVersion") or "none"
+        key = (kind, symbol, version)
+        cached = self._entries.get(key)
+        if cached is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return cached
+        self.misses += 1
+        context = create_stock_context(data)
+        text = _enforced_block(symbol, context) if kind == "enforced" else _contextual_block(symbol, context)
+        self._entries[key] = text
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return text
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+stock_context_cache = StockContextCache()
+
+
+def build_system_prompt(
+    symbol: Optional[str],
+    data: Optional[Dict[str, Any]],
+    enforce: bool,
+    mode_hint: str = "",
+    profile_hint: str = "",
+) -> str:
+    if symbol:
+        block = stock_context_cache.block("enforced" if enforce else "contextual", symbol, data)
+    else:
+        block = NO_SYMBOL_BLOCK
+    return PROMPT_PREFIX + block + f"{mode_hint}{profile_hint}\n"
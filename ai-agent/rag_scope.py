@@ -0,0 +1,44 @@
+"""
+Prysm AI Agent - RAG namespaces.
+Documents uploaded with a session id live in that session's own Chroma
+collection (and BM25 partition). Documents uploaded without one go to the
+shared "global" namespace, which is the original `prysm_docs_v2` collection.
+
+The /chat run binds its session id here, so consult_knowledge_base (running in
+an executor thread) searches only that session's documents plus the shared ones.
+Kept free of heavy imports so main can bind the session without loading the model.
+"""
+import re
+import hashlib
+from contextvars import ContextVar
+from typing import Optional
+
+GLOBAL_NAMESPACE = "global"
+GLOBAL_COLLECTION = "prysm_docs_v2"
+SESSION_COLLECTION_PREFIX = "prysm_docs_s_"
+
+_current_session: ContextVar[Optional[str]] = ContextVar("prysm_rag_session", default=None)
+
+
+def namespace_for(session_id: Optional[str]) -> str:
+    return f"session:{session_id}" if session_id else GLOBAL_NAMESPACE
+
+
+def collection_name(namespace: str) -> str:
+    """Chroma collection for a namespace (names allow [a-zA-Z0-9._-], up to 63 chars)."""
+    if namespace == GLOBAL_NAMESPACE:
+        return GLOBAL_COLLECTION
+    session_id = namespace.split(":", 1)[1]
+    safe = re.sub(r"[^a-zA-Z0-9_-]", "", session_id)
+    if not safe or len(safe) > 40 or safe != session_id:
+        safe = hashlib.sha1(session_id.encode("utf-8")).hexdigest()
+    return SESSION_COLLECTION_PREFIX + safe
+
+
+def bind_rag_session(session_id: Optional[str]) -> None:
+    """Scope knowledge-base searches in the current context to `session_id`."""
+    _current_session.set(session_id)
+
+
+def current_rag_session() -> Optional[str]:
+    return _current_session.get()
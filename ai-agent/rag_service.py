@@ -1,12 +1,22 @@
-
 import os
-import shutil
-from typing import List
+import time
+import datetime
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, Dict, Hashable, Iterator, List, Optional, Sequence, Tuple, Union
 import chromadb
 from chromadb.utils import embedding_functions
-from pypdf import PdfReader
-from sentence_transformers import SentenceTransformer
-from dotenv import load_dotenv
+
+from bm25_index import IndexedChunk, bm25_index
+from cancellation import IngestCancelled
+from embedding_backend import EMBEDDING_MODEL_ID, load_backend
+from embedding_cache import EMBEDDING_CACHE_ENABLED, chunk_hash, embedding_cache
+from executors import EMBEDDING_EXECUTOR, ingest_process_pool
+from financial_store import FINANCIAL_TABLES_ENABLED, financial_store
+from pdf_extract import count_pages, extract_page_range
+from rag_scope import GLOBAL_COLLECTION, GLOBAL_NAMESPACE, SESSION_COLLECTION_PREFIX, collection_name, current_rag_session, namespace_for
+from telemetry import count_event, span
 
 # Setup Chroma
 DB_PATH = os.path.join(os.path.dirname(__file__), "chroma_db")
@@ -14,84 +24,678 @@ client = chromadb.PersistentClient(path=DB_PATH)
 
 # Use Local SOTA Model: BAAI/bge-small-en-v1.5
 # It's high performance but small enough (130MB) for local use.
+# EMBEDDING_BACKEND picks torch / onnx / onnx-int8 (see embedding_backend.py).
+# The model loads on first use, so importing this module only opens Chroma.
 class LocalEmbeddingFunction(embedding_functions.EmbeddingFunction):
     def __init__(self):
-        print("Loading BGE-Small-EN-v1.5 model... (First run may take a moment)")
-        self.model = SentenceTransformer('BAAI/bge-small-en-v1.5')
+        self._backend = None
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    print("Loading BGE-Small-EN-v1.5 model... (First run may take a moment)")
+                    self._backend = load_backend()
+                    print(f"[EMBEDDING] {EMBEDDING_MODEL_ID} on the {self._backend.name} backend")
+        return self._backend
 
     def __call__(self, input: List[str]) -> List[List[float]]:
         # BGE expects "Represent this sentence for searching relevant passages: " instruction for queries
         # but for docs it just wants text. Since we mix them here in a simple call, we'll embed directly.
         # For optimum BGE performance, queries should have instruction, but we'll keep it simple for now.
-        embeddings = self.model.encode(input).tolist()
+        embeddings = self.backend.encode(input).tolist()
         return embeddings
 
 # Initialize global embedding function
 embed_fn = LocalEmbeddingFunction()
 
 # Get/Create Collection (New name to avoid conflict with old Gemini vectors)
+# This is the shared "global" namespace; per-session collections are created on demand.
 collection = client.get_or_create_collection(
-    name="prysm_docs_v2",
+    name=GLOBAL_COLLECTION,
     embedding_function=embed_fn
 )
+_collections: Dict[str, Any] = {GLOBAL_NAMESPACE: collection}
+_collections_lock = threading.Lock()
+
+
+def get_collection(namespace: str = GLOBAL_NAMESPACE, create: bool = True):
+    """The Chroma collection for `namespace`; None if it does not exist and `create` is False."""
+    with _collections_lock:
+        found = _collections.get(namespace)
+        if found is not None:
+            return found
+        name = collection_name(namespace)
+        if create:
+            found = client.get_or_create_collection(name=name, embedding_function=embed_fn, metadata={"namespace": namespace})
+        else:
+            try:
+                found = client.get_collection(name=name, embedding_function=embed_fn)
+            except Exception:
+                return None
+        _collections[namespace] = found
+        return found
+
+
+def list_namespaces() -> List[str]:
+    namespaces = []
+    for entry in client.list_collections():
+        # Older Chroma clients return Collection objects, newer ones names.
+        name = getattr(entry, "name", entry)
+        if name == GLOBAL_COLLECTION:
+            namespaces.append(GLOBAL_NAMESPACE)
+        elif name.startswith(SESSION_COLLECTION_PREFIX):
+            metadata = client.get_collection(name=name, embedding_function=embed_fn).metadata or {}
+            if metadata.get("namespace"):
+                namespaces.append(metadata["namespace"])
+    return namespaces
+
+RAG_QUERY_CACHE_SIZE = int(os.getenv("RAG_QUERY_CACHE_SIZE", "256"))
+RAG_RESULT_CACHE_SIZE = int(os.getenv("RAG_RESULT_CACHE_SIZE", "256"))
+RAG_WARMUP_ENABLED = os.getenv("RAG_WARMUP_ENABLED", "1").lower() in {"1", "true", "yes"}
+# hybrid (BM25 + dense, reciprocal-rank fused) | dense | lexical
+RAG_RETRIEVAL_MODE = os.getenv("RAG_RETRIEVAL_MODE", "hybrid").lower()
+RETRIEVAL_MODES = ("hybrid", "dense", "lexical")
+# Candidates taken from each ranking before fusion, and the RRF rank constant.
+RAG_HYBRID_CANDIDATES = int(os.getenv("RAG_HYBRID_CANDIDATES", "20"))
+RAG_RRF_K = int(os.getenv("RAG_RRF_K", "60"))
+# Hybrid mode answers short keyword queries from BM25 alone when every top hit contains every term.
+RAG_LEXICAL_FAST_PATH = os.getenv("RAG_LEXICAL_FAST_PATH", "1").lower() in {"1", "true", "yes"}
+RAG_LEXICAL_MAX_TERMS = int(os.getenv("RAG_LEXICAL_MAX_TERMS", "6"))
+# Session-scoped searches also see documents uploaded without a session.
+RAG_INCLUDE_SHARED_DOCS = os.getenv("RAG_INCLUDE_SHARED_DOCS", "1").lower() in {"1", "true", "yes"}
+# For BGE models, adding this instruction to query improves retrieval
+QUERY_INSTRUCTION = "Represent this sentence for searching relevant passages: "
+
+
+class LRUCache:
+    """Small thread-safe LRU (consult_knowledge_base runs on executor threads)."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Any:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
 
-def process_pdf(file_path: str, doc_id: str):
+
+# Query vectors do not depend on the collection; top-k results are keyed by the
+# collection version, which every write bumps, so stale results are never served.
+query_embedding_cache = LRUCache(RAG_QUERY_CACHE_SIZE)
+query_result_cache = LRUCache(RAG_RESULT_CACHE_SIZE)
+_collection_version = 0
+_version_lock = threading.Lock()
+
+
+def collection_version() -> int:
+    return _collection_version
+
+
+def bump_collection_version() -> None:
+    global _collection_version
+    with _version_lock:
+        _collection_version += 1
+
+
+def rag_cache_stats() -> Dict[str, Any]:
+    return {
+        "collection_version": _collection_version,
+        "query_embeddings": query_embedding_cache.stats(),
+        "query_results": query_result_cache.stats(),
+        "financial_line_items": financial_store.stats(),
+    }
+
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+INGEST_PAGES_PER_TASK = int(os.getenv("INGEST_PAGES_PER_TASK", "16"))
+INGEST_EMBED_BATCH = int(os.getenv("INGEST_EMBED_BATCH", "64"))
+# Page ranges being extracted ahead of the chunker; bounds memory together with the batch size.
+INGEST_MAX_INFLIGHT_TASKS = int(os.getenv("INGEST_MAX_INFLIGHT_TASKS", "4"))
+
+
+def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[str]:
+    """Fixed-size character windows with overlap."""
+    return [text[i:i + chunk_size] for i in range(0, len(text), chunk_size - overlap)]
+
+
+class StreamingChunker:
     """
-    Reads a PDF, chunks it, and adds to ChromaDB.
+    Incremental chunk_text: feeding the document page by page yields exactly the
+    windows chunk_text would produce for the concatenated text, while holding at
+    most one window of text.
     """
-    try:
-        reader = PdfReader(file_path)
-        text = ""
-        for page in reader.pages:
-            t = page.extract_text()
-            if t: text += t + "\n"
-            
-        # Chunking Strategy
-        chunk_size = 1000
-        overlap = 200
+
+    def __init__(self, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP):
+        self.chunk_size = chunk_size
+        self.step = chunk_size - overlap
+        self._buffer = ""
+
+    def feed(self, text: str) -> List[str]:
+        self._buffer += text
         chunks = []
-        
-        for i in range(0, len(text), chunk_size - overlap):
-            chunks.append(text[i:i + chunk_size])
-            
-        if not chunks:
-            return False, 0
-            
-        # Add to Chroma
-        ids = [f"{doc_id}_{i}" for i in range(len(chunks))]
-        metadatas = [{"source": doc_id, "chunk_index": i} for i in range(len(chunks))]
-        
-        collection.add(
-            documents=chunks,
-            ids=ids,
-            metadatas=metadatas
-        )
-        return True, len(chunks)
-    except Exception as e:
-        print(f"RAG Process Error: {e}")
-        return False, 0
+        while len(self._buffer) >= self.chunk_size:
+            chunks.append(self._buffer[:self.chunk_size])
+            self._buffer = self._buffer[self.step:]
+        return chunks
+
+    def finish(self) -> List[str]:
+        tail = chunk_text(self._buffer, self.chunk_size, self.chunk_size - self.step)
+        self._buffer = ""
+        return tail
+
+
+def find_document(file_hash: str, namespace: str = GLOBAL_NAMESPACE) -> Optional[str]:
+    """doc_id of a fully indexed document with this file hash in `namespace`, if any."""
+    target = get_collection(namespace, create=False)
+    if target is None:
+        return None
+    found = target.get(
+        where={"$and": [{"file_hash": file_hash}, {"doc_complete": True}]},
+        limit=1,
+        include=["metadatas"],
+    )
+    metadatas = found.get("metadatas") or []
+    return metadatas[0]["source"] if metadatas else None
 
-def query_rag(query_text: str, n_results=3):
+
+def embed_chunks(chunks: List[str]) -> Tuple[List[str], List[List[float]]]:
     """
-    Search the vector DB.
+    Chunk hashes and embeddings. Embeddings come from the persistent cache where
+    possible; only unseen chunks (deduplicated within the batch) go to the model.
+    """
+    hashes = [chunk_hash(c) for c in chunks]
+    cached = embedding_cache.get_many(embed_fn.backend.cache_key, hashes) if EMBEDDING_CACHE_ENABLED else {}
+    missing: dict = {}
+    for h, chunk in zip(hashes, chunks):
+        if h not in cached and h not in missing:
+            missing[h] = chunk
+    if missing:
+        fresh = embed_fn(list(missing.values()))
+        computed = list(zip(missing.keys(), fresh))
+        if EMBEDDING_CACHE_ENABLED:
+            embedding_cache.put_many(embed_fn.backend.cache_key, computed)
+        cached.update(computed)
+    return hashes, [cached[h] for h in hashes]
+
+
+def document_metadata(
+    session_id: Optional[str] = None,
+    ticker: Optional[str] = None,
+    filename: Optional[str] = None,
+    uploaded_at: Optional[float] = None,
+) -> Dict[str, Any]:
+    """Per-document metadata stored on every chunk (the fields retrieval can filter on)."""
+    uploaded_at = int(uploaded_at if uploaded_at is not None else time.time())
+    metadata = {
+        "session_id": session_id,
+        "ticker": ticker.upper() if ticker else None,
+        "filename": filename,
+        "uploaded_at": uploaded_at,
+        "upload_date": datetime.datetime.fromtimestamp(uploaded_at, datetime.timezone.utc).strftime("%Y-%m-%d"),
+    }
+    # Chroma metadata values cannot be None.
+    return {k: v for k, v in metadata.items() if v is not None}
+
+
+def add_chunks(
+    doc_id: str,
+    chunks: List[str],
+    start_index: int = 0,
+    file_hash: Optional[str] = None,
+    last: bool = False,
+    namespace: str = GLOBAL_NAMESPACE,
+    doc_metadata: Optional[Dict[str, Any]] = None,
+) -> int:
+    """
+    Embed and store one batch of chunks for `doc_id` in `namespace`; ids continue
+    from `start_index`. `last` marks the document complete, which is what
+    find_document looks for.
+    """
+    if not chunks:
+        return 0
+    hashes, embeddings = embed_chunks(chunks)
+    metadatas = []
+    for offset, h in enumerate(hashes):
+        metadata = {**(doc_metadata or {}), "source": doc_id, "chunk_index": start_index + offset, "chunk_hash": h}
+        if file_hash:
+            metadata["file_hash"] = file_hash
+        metadatas.append(metadata)
+    if last:
+        metadatas[-1]["doc_complete"] = True
+    ids = [f"{doc_id}_{m['chunk_index']}" for m in metadatas]
+    get_collection(namespace).add(
+        documents=chunks,
+        embeddings=embeddings,
+        ids=ids,
+        metadatas=metadatas,
+    )
+    bm25_index.add(_indexed(chunk_id, text, m, namespace) for chunk_id, text, m in zip(ids, chunks, metadatas))
+    bump_collection_version()
+    return len(chunks)
+
+
+def _indexed(chunk_id: str, text: str, metadata: Dict[str, Any], namespace: str) -> IndexedChunk:
+    return IndexedChunk(chunk_id, text or "", metadata.get("source", ""), namespace, metadata.get("ticker"), metadata.get("uploaded_at"))
+
+
+def delete_document(doc_id: str, namespace: str = GLOBAL_NAMESPACE) -> int:
+    """Remove every chunk stored for `doc_id` in `namespace`; returns how many there were."""
+    # Table rows are written as pages arrive, possibly before the collection exists.
+    financial_store.delete_document(doc_id, namespace)
+    target = get_collection(namespace, create=False)
+    if target is None:
+        return 0
+    removed = len(target.get(where={"source": doc_id}, include=[])["ids"])
+    target.delete(where={"source": doc_id})
+    bm25_index.delete_source(doc_id, namespace)
+    bump_collection_version()
+    return removed
+
+
+def has_document(doc_id: str, namespace: str) -> bool:
+    target = get_collection(namespace, create=False)
+    return target is not None and bool(target.get(where={"source": doc_id}, limit=1, include=[])["ids"])
+
+
+def has_documents(namespace: str) -> bool:
+    target = get_collection(namespace, create=False)
+    return target is not None and target.count() > 0
+
+
+def list_documents(namespace: str = GLOBAL_NAMESPACE) -> List[Dict[str, Any]]:
+    """Documents in `namespace`, from the metadata of each document's first chunk."""
+    target = get_collection(namespace, create=False)
+    if target is None:
+        return []
+    found = target.get(where={"chunk_index": 0}, include=["metadatas"])
+    documents = []
+    for metadata in found.get("metadatas") or []:
+        documents.append({
+            "doc_id": metadata.get("source"),
+            "filename": metadata.get("filename"),
+            "ticker": metadata.get("ticker"),
+            "session_id": metadata.get("session_id"),
+            "upload_date": metadata.get("upload_date"),
+            "uploaded_at": metadata.get("uploaded_at"),
+        })
+    return sorted(documents, key=lambda d: d.get("uploaded_at") or 0, reverse=True)
+
+
+def _iter_page_ranges(
+    file_path: str, pages_total: int, should_cancel: Callable[[], bool]
+) -> Iterator[Tuple[int, List[str], List[Dict[str, Any]]]]:
+    """
+    Extract page ranges (text and financial table rows) in the process pool, a
+    bounded number ahead, yielding them in order.
+    """
+    pool = ingest_process_pool()
+    starts = deque(range(0, pages_total, INGEST_PAGES_PER_TASK))
+    inflight: Deque[Tuple[int, Future]] = deque()
+    try:
+        while starts or inflight:
+            while starts and len(inflight) < INGEST_MAX_INFLIGHT_TASKS:
+                start = starts.popleft()
+                inflight.append((start, pool.submit(
+                    extract_page_range, file_path, start, start + INGEST_PAGES_PER_TASK, FINANCIAL_TABLES_ENABLED
+                )))
+            if should_cancel():
+                raise IngestCancelled()
+            start, future = inflight.popleft()
+            with span("ingest_extract"):
+                texts, rows = future.result()
+            yield start + len(texts), texts, rows
+    finally:
+        for _, future in inflight:
+            future.cancel()
+
+
+def ingest_pdf(
+    file_path: str,
+    doc_id: str,
+    progress: Optional[Callable[..., None]] = None,
+    should_cancel: Optional[Callable[[], bool]] = None,
+    file_hash: Optional[str] = None,
+    namespace: str = GLOBAL_NAMESPACE,
+    doc_metadata: Optional[Dict[str, Any]] = None,
+) -> int:
+    """
+    Streaming ingestion pipeline; returns the number of chunks stored.
+    - pages are extracted in parallel worker processes (INGEST_MAX_INFLIGHT_TASKS ranges ahead)
+    - text is chunked incrementally as ranges arrive, in page order
+    - chunks are embedded and upserted INGEST_EMBED_BATCH at a time on the embedding
+      executor, one batch in flight while the next is being assembled
+    Memory stays bounded by the in-flight ranges plus two batches, whatever the PDF size.
+    Line items found in financial statement tables go to financial_store as they arrive.
+    Chunks are tagged with `file_hash`, so a later upload of the same file is found by
+    find_document instead of being indexed again, and with `doc_metadata` (see
+    document_metadata) for filtered retrieval.
     """
-    # For BGE models, adding this instruction to query improves retrieval
-    query_with_instruction = f"Represent this sentence for searching relevant passages: {query_text}"
-    
-    results = collection.query(
-        query_texts=[query_with_instruction],
-        n_results=n_results
+    progress = progress or (lambda **_: None)
+    should_cancel = should_cancel or (lambda: False)
+    pages_total = ingest_process_pool().submit(count_pages, file_path).result()
+    progress(pages_total=pages_total)
+
+    chunker = StreamingChunker()
+    batch: List[str] = []
+    submitted = 0
+    stored = 0
+    table_rows = 0
+    pending: Optional[Future] = None
+
+    def submit(chunks: List[str], last: bool = False) -> None:
+        # Wait for the previous batch first, so at most one is embedding while the next is assembled.
+        nonlocal pending, submitted, stored
+        if pending is not None:
+            stored += pending.result()
+            pending = None
+            progress(chunks_embedded=stored)
+        if chunks:
+            if should_cancel():
+                raise IngestCancelled()
+            pending = EMBEDDING_EXECUTOR.submit(
+                _embed_batch, doc_id, chunks, submitted, file_hash, last, namespace, doc_metadata
+            )
+            submitted += len(chunks)
+
+    try:
+        for pages_parsed, texts, rows in _iter_page_ranges(file_path, pages_total, should_cancel):
+            table_rows += financial_store.add_rows(doc_id, namespace, rows)
+            for text in texts:
+                if text:
+                    batch.extend(chunker.feed(text + "\n"))
+            progress(pages_parsed=pages_parsed, chunks_emitted=submitted + len(batch))
+            # Strictly more than a batch: the final batch must be non-empty to carry the completion mark.
+            while len(batch) > INGEST_EMBED_BATCH:
+                submit(batch[:INGEST_EMBED_BATCH])
+                batch = batch[INGEST_EMBED_BATCH:]
+        batch.extend(chunker.finish())
+        progress(chunks_emitted=submitted + len(batch))
+        submit(batch, last=True)
+        submit([])
+        if table_rows:
+            print(f"[RAG] {doc_id}: stored {table_rows} financial line items")
+    finally:
+        if pending is not None:
+            # Let a running upsert finish so cleanup by doc_id removes all of it.
+            try:
+                pending.result()
+            except Exception:
+                pass
+    return stored
+
+
+def _embed_batch(
+    doc_id: str,
+    chunks: List[str],
+    start_index: int,
+    file_hash: Optional[str],
+    last: bool,
+    namespace: str,
+    doc_metadata: Optional[Dict[str, Any]],
+) -> int:
+    with span("ingest_embed"):
+        return add_chunks(doc_id, chunks, start_index, file_hash, last, namespace, doc_metadata)
+
+
+def normalize_query(text: str) -> str:
+    # The BGE tokenizer lowercases, so case and spacing variants embed identically.
+    return " ".join((text or "").lower().split())
+
+
+def embed_query(normalized_query: str) -> List[float]:
+    key = (embed_fn.backend.cache_key, normalized_query)
+    vector = query_embedding_cache.get(key)
+    if vector is None:
+        vector = embed_fn([QUERY_INSTRUCTION + normalized_query])[0]
+        query_embedding_cache.put(key, vector)
+    return vector
+
+
+def reciprocal_rank_fusion(rankings: List[List[Tuple[str, str]]], n_results: int, k: int = RAG_RRF_K) -> List[str]:
+    """Fuse (chunk_id, text) rankings by summed 1 / (k + rank)."""
+    scores: Dict[str, float] = {}
+    texts: Dict[str, str] = {}
+    for ranking in rankings:
+        for rank, (chunk_id, text) in enumerate(ranking, start=1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank)
+            texts.setdefault(chunk_id, text)
+    return [texts[c] for c in sorted(scores, key=scores.get, reverse=True)[:n_results]]
+
+
+def _iter_all_chunks(namespaces: List[str]) -> Iterator[IndexedChunk]:
+    for namespace in namespaces:
+        target = get_collection(namespace)
+        offset = 0
+        while True:
+            page = target.get(include=["documents", "metadatas"], limit=500, offset=offset)
+            if not page["ids"]:
+                break
+            for chunk_id, text, metadata in zip(page["ids"], page["documents"], page["metadatas"]):
+                yield _indexed(chunk_id, text, metadata or {}, namespace)
+            offset += len(page["ids"])
+
+
+def _ensure_lexical_index() -> None:
+    # Once per process: backfills the BM25 index for chunks stored before it existed.
+    if not bm25_index.synced:
+        namespaces = list_namespaces()
+        expected = sum(get_collection(ns).count() for ns in namespaces)
+        bm25_index.sync(expected, lambda: _iter_all_chunks(namespaces))
+
+
+def _to_epoch(value: Union[None, int, float, str]) -> Optional[int]:
+    """Upload-date filter bound: epoch seconds or an ISO date/datetime string."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    parsed = datetime.datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return int(parsed.timestamp())
+
+
+def _chroma_where(filters: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    clauses = []
+    if filters.get("doc_id"):
+        clauses.append({"source": filters["doc_id"]})
+    if filters.get("ticker"):
+        clauses.append({"ticker": filters["ticker"]})
+    if filters.get("uploaded_after") is not None:
+        clauses.append({"uploaded_at": {"$gte": filters["uploaded_after"]}})
+    if filters.get("uploaded_before") is not None:
+        clauses.append({"uploaded_at": {"$lte": filters["uploaded_before"]}})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def _dense_search(normalized_query: str, k: int, namespaces: Sequence[str], filters: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """Top-k over the namespaces' collections, merged by distance (same model, so comparable)."""
+    vector = embed_query(normalized_query)
+    where = _chroma_where(filters)
+    candidates: List[Tuple[float, str, str]] = []
+    for namespace in namespaces:
+        target = get_collection(namespace, create=False)
+        if target is None or not target.count():
+            continue
+        results = target.query(
+            query_embeddings=[vector],
+            n_results=k,
+            where=where,
+            include=["documents", "distances"],
+        )
+        if not results['documents']:
+            continue
+        candidates.extend(zip(results['distances'][0], results['ids'][0], results['documents'][0]))
+    candidates.sort(key=lambda c: c[0])
+    return [(chunk_id, text) for _, chunk_id, text in candidates[:k]]
+
+
+def _lexical_search(normalized_query: str, k: int, namespaces: Sequence[str], filters: Dict[str, Any]):
+    _ensure_lexical_index()
+    return bm25_index.search(
+        normalized_query,
+        k,
+        namespaces=namespaces,
+        source=filters.get("doc_id"),
+        ticker=filters.get("ticker"),
+        uploaded_after=filters.get("uploaded_after"),
+        uploaded_before=filters.get("uploaded_before"),
     )
-    
-    if not results['documents']:
+
+
+def _is_strong_lexical_match(hits, n_terms: int, n_results: int) -> bool:
+    if not RAG_LEXICAL_FAST_PATH or not n_terms or n_terms > RAG_LEXICAL_MAX_TERMS:
+        return False
+    top = hits[:n_results]
+    return len(top) == n_results and all(h.matched == n_terms for h in top)
+
+
+def _search_namespaces(session_id: Optional[str], include_shared: bool) -> List[str]:
+    session_id = session_id or current_rag_session()
+    namespaces = [namespace_for(session_id)]
+    if session_id and include_shared:
+        namespaces.append(GLOBAL_NAMESPACE)
+    return namespaces
+
+
+def lookup_financials(
+    query_text: str,
+    session_id: Optional[str] = None,
+    doc_id: Optional[str] = None,
+    include_shared: bool = RAG_INCLUDE_SHARED_DOCS,
+) -> List[Dict[str, Any]]:
+    """
+    Figures from the financial statements in the searched documents (same scope as
+    query_rag) when the query asks for one, e.g. "revenue from operations FY24";
+    [] otherwise. No embedding is computed.
+    """
+    if not FINANCIAL_TABLES_ENABLED:
         return []
+    with span("rag_retrieval", mode="numeric") as extra:
+        figures = financial_store.lookup(query_text, _search_namespaces(session_id, include_shared), doc_id=doc_id)
+        extra["path"] = "numeric" if figures else "numeric_miss"
+    count_event("rag_retrieval", mode="numeric", path=extra["path"])
+    return figures
 
-    # Flatten results
-    docs = results['documents'][0]
+
+def query_rag(
+    query_text: str,
+    n_results=3,
+    mode: Optional[str] = None,
+    session_id: Optional[str] = None,
+    doc_id: Optional[str] = None,
+    ticker: Optional[str] = None,
+    uploaded_after: Union[None, int, float, str] = None,
+    uploaded_before: Union[None, int, float, str] = None,
+    include_shared: bool = RAG_INCLUDE_SHARED_DOCS,
+):
+    """
+    Search the vector DB.
+    Scope: the session's own collection (default: the session bound by /chat, see
+    rag_scope.py) plus, with `include_shared`, the global namespace. Only those
+    collections are searched, and `doc_id`, `ticker` and the upload-date bounds
+    (epoch seconds or ISO dates) filter within them.
+    `mode` (default RAG_RETRIEVAL_MODE):
+    - dense: embedding similarity in Chroma
+    - lexical: BM25 over the local inverted index
+    - hybrid: both, fused by reciprocal rank; a short query whose top BM25 hits
+      contain every term is answered lexically without computing an embedding
+    Repeated (near-identical) queries reuse the cached query vector and, until the
+    next write to the collection, the cached top-k documents.
+    """
+    mode = (mode or RAG_RETRIEVAL_MODE).lower()
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode {mode!r}; expected one of {', '.join(RETRIEVAL_MODES)}")
+    normalized = normalize_query(query_text)
+    namespaces = _search_namespaces(session_id, include_shared)
+    filters = {
+        "doc_id": doc_id,
+        "ticker": ticker.upper() if ticker else None,
+        "uploaded_after": _to_epoch(uploaded_after),
+        "uploaded_before": _to_epoch(uploaded_before),
+    }
+    # Read before querying: a write that lands mid-query makes this entry stale, not wrong.
+    key = (normalized, n_results, mode, tuple(namespaces), tuple(filters.values()), collection_version())
+    cached = query_result_cache.get(key)
+    if cached is not None:
+        return list(cached)
+
+    with span("rag_retrieval", mode=mode) as extra:
+        if mode == "dense":
+            docs = [text for _, text in _dense_search(normalized, n_results, namespaces, filters)]
+            path = "dense"
+        elif mode == "lexical":
+            hits, _ = _lexical_search(normalized, n_results, namespaces, filters)
+            docs = [h.text for h in hits]
+            path = "lexical"
+        else:
+            hits, n_terms = _lexical_search(normalized, RAG_HYBRID_CANDIDATES, namespaces, filters)
+            if _is_strong_lexical_match(hits, n_terms, n_results):
+                docs = [h.text for h in hits[:n_results]]
+                path = "lexical_fast"
+            else:
+                dense = _dense_search(normalized, RAG_HYBRID_CANDIDATES, namespaces, filters)
+                docs = reciprocal_rank_fusion([[(h.chunk_id, h.text) for h in hits], dense], n_results)
+                path = "fused"
+        extra["path"] = path
+    count_event("rag_retrieval", mode=mode, path=path)
+
+    query_result_cache.put(key, tuple(docs))
     return docs
 
-def clear_db():
-    client.delete_collection("prysm_docs_v2")
-    # Re-create immediately
+
+def warm_up() -> None:
+    """
+    Dummy encode (plus a query once documents exist, which loads the vector index)
+    and a BM25 index sync, so the first consult_knowledge_base call does not pay
+    lazy initialization.
+    """
+    started = time.perf_counter()
+    vector = embed_fn([QUERY_INSTRUCTION + "warm up"])[0]
+    if collection.count():
+        collection.query(query_embeddings=[vector], n_results=1)
+    _ensure_lexical_index()
+    print(f"[RAG] Embedding model warmed up in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+
+def clear_db(namespace: Optional[str] = None):
+    """Drop one namespace's documents, or every namespace when `namespace` is None."""
     global collection
-    collection = client.get_or_create_collection(name="prysm_docs_v2", embedding_function=embed_fn)
+    targets = [namespace] if namespace else list_namespaces()
+    for target in targets:
+        try:
+            client.delete_collection(collection_name(target))
+        except Exception:
+            pass  # never created
+        with _collections_lock:
+            _collections.pop(target, None)
+        bm25_index.delete_namespace(target)
+        financial_store.delete_namespace(target)
+    # Re-create immediately
+    collection = get_collection(GLOBAL_NAMESPACE)
+    bump_collection_version()
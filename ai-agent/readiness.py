@@ -0,0 +1,160 @@
+"""
+Prysm AI Agent - Lazy heavy dependencies and readiness.
+Importing main does not import the LangGraph graph (LLM client, tools with
+yfinance/feedparser), stock_data (pandas, yfinance, bs4) or rag_service (Chroma;
+the embedding model itself loads on first encode). Each is a LazyComponent,
+loaded on first use from a worker thread, or ahead of time by preload() at
+startup (STARTUP_PRELOAD), so uvicorn accepts connections right away.
+
+GET /ready answers 200 once every preloaded component is loaded and warm, and
+503 before that (or when one failed), so traffic goes to warm workers only.
+"""
+import os
+import time
+import asyncio
+import importlib
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+COLD = "cold"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+
+class LazyComponent:
+    def __init__(self, name: str, loader: Callable[[], Any], warm: Optional[Callable[[Any], None]] = None):
+        self.name = name
+        self._loader = loader
+        # Run by preload() only; on-demand loads skip it.
+        self._warm = warm
+        self._lock = threading.Lock()
+        self._value: Any = None
+        self.state = COLD
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self.warm_seconds: Optional[float] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self.state == READY
+
+    def peek(self) -> Any:
+        """The loaded value, or None without triggering a load."""
+        return self._value if self.state == READY else None
+
+    def get(self) -> Any:
+        """Load once (blocking; call from a worker thread) and return the value. A failed load is retried."""
+        if self.state == READY:
+            return self._value
+        with self._lock:
+            if self.state != READY:
+                self.state = LOADING
+                started = time.perf_counter()
+                try:
+                    value = self._loader()
+                except Exception as e:
+                    self.state = FAILED
+                    self.error = str(e)
+                    raise
+                self._value = value
+                self.load_seconds = time.perf_counter() - started
+                self.error = None
+                self.state = READY
+                print(f"[STARTUP] {self.name} loaded in {self.load_seconds * 1000:.0f}ms")
+        return self._value
+
+    async def aget(self) -> Any:
+        """get() without blocking the event loop on a cold load."""
+        if self.state == READY:
+            return self._value
+        return await asyncio.get_running_loop().run_in_executor(None, self.get)
+
+    def preload(self) -> None:
+        value = self.get()
+        if self._warm is not None and self.warm_seconds is None:
+            started = time.perf_counter()
+            self._warm(value)
+            self.warm_seconds = time.perf_counter() - started
+
+    def status(self) -> Dict[str, Any]:
+        status: Dict[str, Any] = {"state": self.state}
+        if self.load_seconds is not None:
+            status["load_ms"] = round(self.load_seconds * 1000, 1)
+        if self.warm_seconds is not None:
+            status["warm_ms"] = round(self.warm_seconds * 1000, 1)
+        if self.error:
+            status["error"] = self.error
+        return status
+
+
+def _load_graph() -> Any:
+    return importlib.import_module("graph").graph
+
+
+def _warm_rag(rag_service: Any) -> None:
+    if rag_service.RAG_WARMUP_ENABLED:
+        rag_service.warm_up()
+
+
+MARKET_DATA = LazyComponent("market_data", lambda: importlib.import_module("stock_data"))
+GRAPH = LazyComponent("graph", _load_graph)
+RAG = LazyComponent("rag", lambda: importlib.import_module("rag_service"), warm=_warm_rag)
+# Preload order: the graph imports stock_data through tools, so market data goes first.
+COMPONENTS: Dict[str, LazyComponent] = {c.name: c for c in (MARKET_DATA, GRAPH, RAG)}
+
+
+def _preload_names(value: str) -> List[str]:
+    value = value.strip().lower()
+    if value in {"", "none", "0"}:
+        return []
+    if value == "all":
+        return list(COMPONENTS)
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+# Comma-separated component names, "all" or "none".
+STARTUP_PRELOAD = _preload_names(os.getenv("STARTUP_PRELOAD", "all"))
+
+_preloading = False
+_preload_finished = False
+
+
+async def preload(names: Optional[List[str]] = None) -> None:
+    """Load (and warm) components one after another in a worker thread; failures are logged, not raised."""
+    global _preloading, _preload_finished
+    _preloading = True
+    started = time.perf_counter()
+    for name in STARTUP_PRELOAD if names is None else names:
+        component = COMPONENTS.get(name)
+        if component is None:
+            print(f"[STARTUP] Unknown component in STARTUP_PRELOAD: {name}")
+            continue
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, component.preload)
+        except Exception as e:
+            print(f"[STARTUP] Preloading {name} failed: {e}")
+    _preloading = False
+    _preload_finished = True
+    print(f"[STARTUP] Preload finished in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+
+def readiness() -> Tuple[bool, Dict[str, Any]]:
+    """(ready, report): ready once preload has finished and every preloaded component loaded."""
+    required = [n for n in STARTUP_PRELOAD if n in COMPONENTS]
+    ready = (_preload_finished or not required) and all(COMPONENTS[n].loaded for n in required)
+    return ready, {
+        "ready": ready,
+        "preloading": _preloading,
+        "preload": required,
+        "components": {name: c.status() for name, c in COMPONENTS.items()},
+    }
+
+
+def startup_stats() -> Dict[str, Any]:
+    """Load and warm-up times for the /metrics gauges."""
+    return {
+        "load_ms": {n: c.load_seconds * 1000 for n, c in COMPONENTS.items() if c.load_seconds is not None},
+        "warm_ms": {n: c.warm_seconds * 1000 for n, c in COMPONENTS.items() if c.warm_seconds is not None},
+        "ready": int(readiness()[0]),
+    }
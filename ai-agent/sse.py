@@ -0,0 +1,198 @@
+"""
+Prysm AI Agent - SSE Writer
+Turns the chat pipeline's chunk stream into `text/event-stream` frames.
+Text tokens are coalesced by a short time window and a byte budget, idle
+streams get keep-alive comments, and gzip is applied when negotiated.
+"""
+import os
+import json
+import zlib
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
+
+from cancellation import RunScope, bind_run
+
+try:
+    import orjson
+
+    def dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj)
+except ImportError:  # orjson is optional; fall back to the stdlib encoder
+    def dumps(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+# A chunk is ("text", str) for model tokens, ("ui", str) for tool UI payloads,
+# or ("event", dict) for a raw JSON event such as {"error": ...}.
+Chunk = Tuple[str, Any]
+
+COALESCE_WINDOW_MS = float(os.getenv("SSE_COALESCE_WINDOW_MS", "40"))
+COALESCE_MAX_BYTES = int(os.getenv("SSE_COALESCE_MAX_BYTES", "2048"))
+HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+DISCONNECT_POLL_SECONDS = float(os.getenv("SSE_DISCONNECT_POLL_SECONDS", "0.5"))
+COMPRESSION_ENABLED = os.getenv("SSE_COMPRESSION", "0").lower() in {"1", "true", "yes"}
+
+HEARTBEAT_FRAME = b": ping\n\n"
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+
+_SOURCE_DONE = object()
+
+
+def frame(payload: Dict[str, Any]) -> bytes:
+    return b"data: " + dumps(payload) + b"\n\n"
+
+
+def negotiate_compression(accept_encoding: Optional[str]) -> bool:
+    if not COMPRESSION_ENABLED or not accept_encoding:
+        return False
+    return "gzip" in accept_encoding.lower()
+
+
+def response_headers(compress: bool) -> Dict[str, str]:
+    headers = dict(SSE_HEADERS)
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
+    return headers
+
+
+class SSEWriter:
+    """
+    Pumps a chunk source on its own task and emits coalesced SSE frames.
+
+    - The first text token is flushed immediately so time-to-first-byte is unchanged.
+    - Later tokens are held for at most `window_ms` or until `max_bytes` are buffered.
+    - UI payloads and events flush any buffered text, then go out as their own frame.
+    - When nothing has been sent for `heartbeat_s` (e.g. a slow tool call), a comment frame is sent.
+
+    If the client disconnects (detected by polling `is_disconnected`, or by the server
+    closing this generator), the run scope is cancelled and the source task is cancelled,
+    which unwinds the graph run.
+    """
+
+    def __init__(
+        self,
+        window_ms: float = COALESCE_WINDOW_MS,
+        max_bytes: int = COALESCE_MAX_BYTES,
+        heartbeat_s: float = HEARTBEAT_SECONDS,
+        compress: bool = False,
+        run: Optional[RunScope] = None,
+    ):
+        self.run = run or RunScope()
+        self.window = window_ms / 1000.0
+        self.max_bytes = max_bytes
+        self.heartbeat = heartbeat_s
+        self.compress = compress
+        self._gzip = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+        self.frames_sent = 0
+
+    def _encode(self, data: bytes) -> bytes:
+        self.frames_sent += 1
+        if self._gzip is None:
+            return data
+        # Sync-flush so every frame is decodable as soon as it arrives.
+        return self._gzip.compress(data) + self._gzip.flush(zlib.Z_SYNC_FLUSH)
+
+    async def _pump(self, source: AsyncIterator[Chunk], queue: asyncio.Queue) -> None:
+        # This task (and everything it spawns) sees the run scope.
+        bind_run(self.run)
+        try:
+            async for chunk in source:
+                await queue.put(chunk)
+        finally:
+            await queue.put(_SOURCE_DONE)
+
+    async def _watch_disconnect(self, is_disconnected: Callable[[], Awaitable[bool]], pump: asyncio.Task) -> None:
+        while not pump.done():
+            await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+            if await is_disconnected():
+                print("[SSE] Client disconnected; cancelling run")
+                self.run.cancel("client_disconnected")
+                pump.cancel()
+                return
+
+    async def stream(
+        self,
+        source: AsyncIterator[Chunk],
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+    ) -> AsyncIterator[bytes]:
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        pump = asyncio.create_task(self._pump(source, queue))
+        watcher = asyncio.create_task(self._watch_disconnect(is_disconnected, pump)) if is_disconnected else None
+
+        buffer: list = []
+        buffered_bytes = 0
+        first_buffered_at: Optional[float] = None
+        last_sent = loop.time()
+        sent_text = False
+
+        def take_text() -> bytes:
+            nonlocal buffer, buffered_bytes, first_buffered_at, last_sent
+            data = frame({"content": "".join(buffer)})
+            buffer, buffered_bytes, first_buffered_at = [], 0, None
+            last_sent = loop.time()
+            return self._encode(data)
+
+        try:
+            while True:
+                now = loop.time()
+                if buffer:
+                    timeout = max(0.0, first_buffered_at + self.window - now)
+                else:
+                    timeout = max(0.0, last_sent + self.heartbeat - now)
+                try:
+                    chunk = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    if buffer:
+                        yield take_text()
+                    else:
+                        last_sent = loop.time()
+                        yield self._encode(HEARTBEAT_FRAME)
+                    continue
+
+                if chunk is _SOURCE_DONE:
+                    break
+
+                kind, payload = chunk
+                if kind == "text":
+                    if not payload:
+                        continue
+                    buffer.append(payload)
+                    buffered_bytes += len(payload.encode("utf-8"))
+                    if first_buffered_at is None:
+                        first_buffered_at = loop.time()
+                    if not sent_text or buffered_bytes >= self.max_bytes:
+                        sent_text = True
+                        yield take_text()
+                    continue
+
+                if buffer:
+                    yield take_text()
+                last_sent = loop.time()
+                if kind == "ui":
+                    yield self._encode(frame({"content": payload}))
+                else:
+                    yield self._encode(frame(payload))
+
+            if buffer:
+                yield take_text()
+            if self.run.cancelled:
+                return
+            # Propagate errors raised by the source.
+            await pump
+            if self._gzip is not None:
+                yield self._gzip.flush(zlib.Z_FINISH)
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+            if not pump.done():
+                # Closed before the source finished: the client is gone.
+                self.run.cancel("client_disconnected")
+                pump.cancel()
+                try:
+                    await pump
+                except (asyncio.CancelledError, Exception):
+                    pass
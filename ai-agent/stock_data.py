@@ -2,6 +2,7 @@
 Real-time stock data fetching using yfinance.
 """
 
+import os
 import yfinance as yf
 from datetime import datetime
 import pandas as pd
@@ -9,6 +10,11 @@ import traceback
 import requests
 from bs4 import BeautifulSoup
 import re
+import json
+import hashlib
+from cancellation import check_cancelled, RunCancelled
+from telemetry import span, count_event
+from cache_backend import cache
 
 def get_ticker_obj(symbol: str):
     """Helper to get yf.Ticker object, defaulting to NSE (.NS)."""
@@ -28,14 +34,13 @@ def generate_price_history(current_price: float, days: int = 365, symbol: str =
         return []
 
     try:
-        ticker_obj = get_ticker_obj(symbol)
         # Fetch 1y history to cover enough ground, or 'max' if needed
         # period='1y' or '1mo' depending on days
         period = "1y"
         if days > 365: period = "5y"
         elif days <= 30: period = "3mo" # Get a bit more for candles
         
-        hist = ticker_obj.history(period=period)
+        hist = get_history(symbol, period)
         
         # Reset index to get Date as column
         hist = hist.reset_index()
@@ -77,6 +82,7 @@ def scrape_stock_data(symbol: str) -> dict:
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
         }
         print(f"[DEBUG] Scraping URL: {url}")
+        check_cancelled()
         response = requests.get(url, headers=headers, timeout=5)
         
         if response.status_code != 200:
@@ -86,6 +92,7 @@ def scrape_stock_data(symbol: str) -> dict:
             g_ticker = symbol.replace('.NS', ':NSE').replace('.BO', ':BOM')
             g_url = f"https://www.google.com/finance/quote/{g_ticker}"
             print(f"[DEBUG] Google URL: {g_url}")
+            check_cancelled()
             g_resp = requests.get(g_url, headers=headers, timeout=5)
             if g_resp.status_code == 200:
                  g_soup = BeautifulSoup(g_resp.text, 'html.parser')
@@ -152,52 +159,92 @@ def scrape_stock_data(symbol: str) -> dict:
             'scraped': True
         }
         
+    except RunCancelled:
+        raise
     except Exception as e:
         print(f"[DEBUG] Scraping Exception: {e}")
         return None
 
-import time
 
-# Simple in-memory cache: {symbol: {'data': dict, 'timestamp': float}}
-# DISABLED: Always fetch fresh data per user request
-DATA_CACHE = {}
-CACHE_DURATION = 0  # 0 means cache is effectively disabled
+def compute_data_version(data: dict) -> str:
+    """Short content hash of a stock snapshot; changes whenever any field changes."""
+    raw = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
 
-def get_stock_data(symbol: str) -> dict:
-    """Get real-time stock data from Yahoo Finance (always fresh, no caching)."""
+# Snapshots live in the shared cache backend (cache_backend.py; per worker or per host).
+# Short TTL so quotes stay near real-time while repeat lookups (fast path, tools,
+# follow-up turns) reuse one snapshot. Set STOCK_DATA_CACHE_SECONDS=0 to disable.
+CACHE_DURATION = float(os.getenv("STOCK_DATA_CACHE_SECONDS", "60"))
+HISTORY_CACHE_SECONDS = float(os.getenv("HISTORY_CACHE_SECONDS", "300"))
+CALENDAR_CACHE_SECONDS = float(os.getenv("CALENDAR_CACHE_SECONDS", "21600"))
+# A failed fetch (None) is cached this long at most, whatever the entry's TTL, so one
+# upstream blip does not blank a quote for long (for every worker, on the sqlite backend).
+FAILURE_CACHE_SECONDS = float(os.getenv("STOCK_DATA_FAILURE_CACHE_SECONDS", "15"))
+
+def get_stock_data(symbol: str, refresh: bool = False, ttl: float = None) -> dict:
+    """
+    Get real-time stock data from Yahoo Finance (cached for CACHE_DURATION seconds).
+    `refresh` and `ttl` let the warmer (warmer.py) renew the entry ahead of expiry.
+    """
     if not symbol:
         return None
-        
     symbol = symbol.upper()
-        
-    # Cache is disabled (CACHE_DURATION = 0), always fetch fresh
-    # if symbol in DATA_CACHE:
-    #     cached = DATA_CACHE[symbol]
-    #     if time.time() - cached['timestamp'] < CACHE_DURATION:
-    #         print(f"[DEBUG] Returning cached data for {symbol}")
-    #         return cached['data']
-    
+    # Failures are cached too (as None, briefly), to prevent retry spam.
+    return cache.get_or_set(
+        "stock_data", symbol, CACHE_DURATION if ttl is None else ttl, lambda: _fetch_stock_data(symbol), refresh,
+        failure_ttl=FAILURE_CACHE_SECONDS,
+    )
+
+def get_history(symbol: str, period: str = "3mo", refresh: bool = False, ttl: float = None):
+    """Daily OHLCV DataFrame from Yahoo Finance (cached for HISTORY_CACHE_SECONDS)."""
+    symbol = symbol.upper()
+    def fetch():
+        check_cancelled()
+        with span("market_data", source="history"):
+            return get_ticker_obj(symbol).history(period=period)
+    return cache.get_or_set(
+        "history", f"{symbol}:{period}", HISTORY_CACHE_SECONDS if ttl is None else ttl, fetch, refresh
+    )
+
+def get_calendar(symbol: str, refresh: bool = False, ttl: float = None):
+    """Upcoming corporate events (earnings dates) from Yahoo Finance (cached for CALENDAR_CACHE_SECONDS)."""
+    symbol = symbol.upper()
+    def fetch():
+        check_cancelled()
+        with span("market_data", source="calendar"):
+            return get_ticker_obj(symbol).calendar
+    return cache.get_or_set("calendar", symbol, CALENDAR_CACHE_SECONDS if ttl is None else ttl, fetch, refresh)
+
+def _fetch_stock_data(symbol: str) -> dict:
     try:
+        check_cancelled()
         ticker = get_ticker_obj(symbol)
-        info = ticker.info
+        with span("market_data", source="info"):
+            info = ticker.info
+        price_source = "info"
         
         # Basic Validation: if no price, maybe invalid
         current_price = info.get('currentPrice') or info.get('regularMarketPrice') or info.get('previousClose')
         
         # FALLBACK 1: fast_info (Newer YF API)
         if not current_price:
+            check_cancelled()
             try:
-                current_price = ticker.fast_info.last_price
+                price_source = "fast_info"
+                with span("market_data", source="fast_info"):
+                    current_price = ticker.fast_info.last_price
                 print(f"[DEBUG] Using fast_info price: {current_price}")
             except: pass
             
         # FALLBACK 3: yf.download (Bulk endpoint, often works for cached/blocked tickers)
         if not current_price:
+            check_cancelled()
             try:
                 # progress=False prevents printing to stdout
                 import io
                 from contextlib import redirect_stdout
-                with redirect_stdout(io.StringIO()):
+                price_source = "download"
+                with span("market_data", source="download"), redirect_stdout(io.StringIO()):
                     df = yf.download(symbol, period="5d", progress=False)
                 
                 if not df.empty:
@@ -213,7 +260,9 @@ def get_stock_data(symbol: str) -> dict:
         # FALLBACK 4: Web Scraping (Last Resort)
         if not current_price:
             print("[DEBUG] All API methods failed. Attempting Web Scrape...")
-            scraped_data = scrape_stock_data(symbol)
+            price_source = "scrape"
+            with span("market_data", source="scrape"):
+                scraped_data = scrape_stock_data(symbol)
             if scraped_data:
                  current_price = scraped_data['currentPrice']
                  print(f"[DEBUG] Web Scrape successful: {current_price} | Using fallback data.")
@@ -224,7 +273,9 @@ def get_stock_data(symbol: str) -> dict:
 
         if not current_price:
             # Try removing suffix if added or clean up
+            count_event("market_data_source", source="none")
             return None
+        count_event("market_data_source", source=price_source)
 
         # --- Construct Quote ---
         quote = {
@@ -330,8 +381,10 @@ def get_stock_data(symbol: str) -> dict:
         # For this iteration, we keep shareholding dynamic but maybe random if real data unavailable?
         # Actually, let's keep shareholding somewhat static or simplified to avoid 0s. 
         # YFinance 'major_holders' [0] is % insiders, [1] is % institutions.
+        check_cancelled()
         try:
-           mh = ticker.major_holders
+           with span("market_data", source="major_holders"):
+               mh = ticker.major_holders
            if isinstance(mh, pd.DataFrame):
                 # Check structure: 'Breakdown' column or index?
                 # Usually it has columns [0, 1] or ['Breakdown', 'Value'] depending on version.
@@ -420,17 +473,17 @@ def get_stock_data(symbol: str) -> dict:
             "shareholding": shareholding,
             "companyInfo": company_info
         }
+        # Lets prompt/answer caches tell when the underlying data actually changed.
+        result["dataVersion"] = compute_data_version(result)
         
-        # Save to Cache
-        DATA_CACHE[symbol.upper()] = {'data': result, 'timestamp': time.time()}
         return result
 
+    except RunCancelled:
+        raise
     except Exception as e:
         print(f"Error fetching data for {symbol}: {e}")
         # traceback.print_exc() # Reduce noise
         
-        # Cache failure to prevent retry spam
-        DATA_CACHE[symbol.upper()] = {'data': None, 'timestamp': time.time()}
         return None
 
 def search_stocks(query: str) -> list:
@@ -0,0 +1,54 @@
+"""
+Prysm AI Agent - Known NSE symbols.
+The NIFTY 50 names in backend/src/services/stockService.js SYMBOL_MAP, with the
+company names people type for them. fast_path.py only answers for these, and
+the warmer only warms these.
+"""
+from typing import Dict, Optional, Tuple
+
+# symbol -> lowercase names that refer to it (the symbol itself included).
+# Ambiguous prefixes ("hdfc", "tata", "adani") are left out on purpose.
+SYMBOL_ALIASES: Dict[str, Tuple[str, ...]] = {
+    "RELIANCE": ("reliance", "reliance industries", "ril"),
+    "TCS": ("tcs", "tata consultancy", "tata consultancy services"),
+    "INFY": ("infy", "infosys"),
+    "HDFCBANK": ("hdfcbank", "hdfc bank"),
+    "ICICIBANK": ("icicibank", "icici bank"),
+    "WIPRO": ("wipro",),
+    "BHARTIARTL": ("bhartiartl", "bharti airtel", "airtel"),
+    "ITC": ("itc",),
+    "SBIN": ("sbin", "sbi", "state bank", "state bank of india"),
+    "KOTAKBANK": ("kotakbank", "kotak bank", "kotak mahindra bank", "kotak"),
+    "LT": ("lt", "l&t", "larsen", "larsen & toubro", "larsen and toubro"),
+    "HINDUNILVR": ("hindunilvr", "hul", "hindustan unilever"),
+    "ASIANPAINT": ("asianpaint", "asian paints"),
+    "MARUTI": ("maruti", "maruti suzuki"),
+    "SUNPHARMA": ("sunpharma", "sun pharma", "sun pharmaceutical"),
+    "AXISBANK": ("axisbank", "axis bank"),
+    "BAJFINANCE": ("bajfinance", "bajaj finance"),
+    "TATAMOTORS": ("tatamotors", "tata motors"),
+    "TATASTEEL": ("tatasteel", "tata steel"),
+    "ADANIENT": ("adanient", "adani enterprises"),
+}
+
+KNOWN_SYMBOLS = frozenset(SYMBOL_ALIASES)
+
+# (alias, symbol), longest first so "tata consultancy services" wins over shorter names.
+ALIASES = sorted(
+    ((alias, symbol) for symbol, aliases in SYMBOL_ALIASES.items() for alias in aliases),
+    key=lambda pair: len(pair[0]),
+    reverse=True,
+)
+
+
+def normalize_symbol(symbol: Optional[str]) -> Optional[str]:
+    """Upper-cased symbol without an exchange suffix, or None when blank."""
+    value = (symbol or "").strip().upper()
+    for suffix in (".NS", ".BO"):
+        if value.endswith(suffix):
+            value = value[: -len(suffix)]
+    return value or None
+
+
+def is_known_symbol(symbol: Optional[str]) -> bool:
+    return normalize_symbol(symbol) in KNOWN_SYMBOLS
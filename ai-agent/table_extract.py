@@ -0,0 +1,170 @@
+"""
+Prysm AI Agent - Financial table rows from PDF page text.
+Runs in the ingestion process pool next to pdf_extract, so it stays pure Python.
+
+A page is treated as a financial statement when it has a statement title
+(balance sheet, statement of profit and loss, cash flow statement) and a
+column header naming two or more periods. Each following line that ends in one
+numeric cell per period becomes a row:
+
+    {"statement", "basis", "line_item", "period", "value", "unit", "page"}
+
+Periods are normalized to the fiscal year they end in ("FY24", "2023-24",
+"31 March 2024" and "March 31, 2024" all become "FY2024"), so the same label is
+used when parsing questions (find_periods).
+"""
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+STATEMENT_TITLES = (
+    ("profit_and_loss", re.compile(r"statement\s+of\s+profit\s+(?:and|&)\s+loss|profit\s+(?:and|&)\s+loss\s+(?:statement|account)|income\s+statement")),
+    ("balance_sheet", re.compile(r"balance\s+sheet|statement\s+of\s+financial\s+position")),
+    ("cash_flow", re.compile(r"cash\s+flows?\s+statement|statement\s+of\s+cash\s+flows?")),
+)
+_BASIS_RE = re.compile(r"\b(consolidated|standalone)\b")
+_UNIT_RE = re.compile(
+    r"(?:₹|rs\.?|inr|`)\s*(?:in\s+)?(crores?|lakhs?|lacs?|millions?|billions?|thousands?)"
+    r"|\(\s*(?:all\s+amounts\s+)?in\s+(?:₹|rs\.?|inr)?\s*(crores?|lakhs?|millions?|billions?|thousands?)"
+)
+
+_MONTHS = "jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec"
+_PERIOD_PATTERNS = (
+    # FY24, FY 2024, FY'24
+    re.compile(r"\bfy\s?'?(\d{4}|\d{2})\b"),
+    # 2023-24, 2023-2024, 2023/24
+    re.compile(r"\b20\d{2}\s?[-–/]\s?(\d{4}|\d{2})\b"),
+    # 31 March 2024, 31st Mar, 2024, 31.03.2024, 31-03-24
+    re.compile(rf"\b3[01](?:st)?[\s.\-/]*(?:(?:{_MONTHS})[a-z]*|0?3|12|0?6|0?9)[\s.,\-/]*(20\d{{2}}|\d{{2}})\b"),
+    # March 31, 2024
+    re.compile(rf"\b(?:{_MONTHS})[a-z]*\.?\s+3[01](?:st)?,?\s+(20\d{{2}})\b"),
+)
+_BARE_YEAR_RE = re.compile(r"\b(20\d{2})\b")
+_NUMBER_RE = re.compile(r"^\(?-?[\d,]*\d(?:\.\d+)?\)?$")
+_NIL_CELLS = {"-", "–", "—", "nil"}
+_LABEL_PREFIX_RE = re.compile(r"^(?:\(?[ivx]+[.)]|\(?[a-z][.)]|\d+[.)])\s+")
+
+
+def _year(token: str) -> int:
+    year = int(token)
+    return year + 2000 if year < 100 else year
+
+
+def find_periods(text: str) -> List[str]:
+    """Fiscal-year labels mentioned in `text`, in order of appearance, without duplicates."""
+    lowered = text.lower()
+    found: List[Tuple[int, str]] = []
+    taken: List[Tuple[int, int]] = []
+    for pattern in _PERIOD_PATTERNS:
+        for match in pattern.finditer(lowered):
+            if any(s < match.end() and match.start() < e for s, e in taken):
+                continue
+            taken.append(match.span())
+            found.append((match.start(), f"FY{_year(match.group(1))}"))
+    if not found:
+        # A header of bare years ("2024   2023") counts only when it holds nothing else numeric.
+        years = _BARE_YEAR_RE.findall(lowered)
+        numbers = [t for t in lowered.split() if _NUMBER_RE.match(t)]
+        if len(years) >= 2 and len(years) == len(numbers):
+            found = [(i, f"FY{y}") for i, y in enumerate(years)]
+    labels: List[str] = []
+    for _, label in sorted(found):
+        if label not in labels:
+            labels.append(label)
+    return labels
+
+
+def parse_number(token: str) -> Optional[float]:
+    """'1,23,456.7' -> 123456.7, '(1,234)' -> -1234; None for anything else."""
+    token = token.strip()
+    if not _NUMBER_RE.match(token):
+        return None
+    negative = token.startswith("(") and token.endswith(")") or token.startswith("-")
+    digits = token.strip("()-").replace(",", "")
+    try:
+        value = float(digits)
+    except ValueError:
+        return None
+    return -value if negative else value
+
+
+def normalize_line_item(label: str) -> str:
+    label = _LABEL_PREFIX_RE.sub("", label.strip().lower())
+    label = re.sub(r"[^a-z0-9&%/ ]+", " ", label)
+    return " ".join(label.split())
+
+
+def detect_statement(text: str) -> Tuple[Optional[str], Optional[str]]:
+    """(statement kind, basis) from a page's title area."""
+    head = text[:600].lower()
+    for kind, pattern in STATEMENT_TITLES:
+        if pattern.search(head):
+            basis = _BASIS_RE.search(head)
+            return kind, basis.group(1) if basis else None
+    return None, None
+
+
+def detect_unit(text: str) -> Optional[str]:
+    match = _UNIT_RE.search(text[:1500].lower())
+    if not match:
+        return None
+    unit = (match.group(1) or match.group(2)).rstrip("s")
+    return "INR " + {"lac": "lakh"}.get(unit, unit)
+
+
+def looks_like_statement(text: str) -> bool:
+    """Cheap pre-check on plain text, so layout extraction runs only on likely statement pages."""
+    return detect_statement(text)[0] is not None
+
+
+def _split_row(line: str) -> Tuple[str, List[Optional[float]]]:
+    """Leading label and trailing numeric cells ('-' counts as an empty cell)."""
+    tokens = line.split()
+    cells: List[Optional[float]] = []
+    while tokens:
+        token = tokens[-1]
+        if token.lower() in _NIL_CELLS:
+            cells.append(None)
+        else:
+            value = parse_number(token)
+            if value is None:
+                break
+            cells.append(value)
+        tokens.pop()
+    cells.reverse()
+    return " ".join(tokens), cells
+
+
+def extract_rows(text: str, page: int) -> List[Dict[str, Any]]:
+    """Typed line-item rows from one page of a financial statement; [] for other pages."""
+    statement, basis = detect_statement(text)
+    if statement is None:
+        return []
+    unit = detect_unit(text)
+    rows: List[Dict[str, Any]] = []
+    periods: List[str] = []
+    for line in text.splitlines():
+        label, cells = _split_row(line)
+        header = find_periods(line)
+        # A header's trailing cells, if any, are the bare years themselves.
+        if len(header) >= 2 and all(v is not None and v.is_integer() and 1990 <= v <= 2100 for v in cells):
+            periods = header
+            continue
+        if not periods or len(cells) < len(periods):
+            continue
+        line_item = normalize_line_item(label)
+        if len(line_item) < 3 or not re.search(r"[a-z]", line_item):
+            continue
+        # Extra leading cells are note numbers; the last ones line up with the header.
+        for period, value in zip(periods, cells[-len(periods):]):
+            if value is None:
+                continue
+            rows.append({
+                "statement": statement,
+                "basis": basis,
+                "line_item": line_item,
+                "period": period,
+                "value": value,
+                "unit": unit,
+                "page": page,
+            })
+    return rows
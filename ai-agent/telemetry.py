@@ -0,0 +1,239 @@
+"""
+Prysm AI Agent - Telemetry
+Per-stage timing spans, counters and a Prometheus text exporter for GET /metrics.
+
+    with span("intent"):
+        ...
+    count_event("cache", cache="stock_data", result="hit")
+
+Every span is observed into the `prysm_stage_duration_seconds{stage=...}`
+histogram. When a request opted into tracing, the span is also added to that
+request's Trace (carried in a ContextVar, so executor work submitted via
+`run_in` reports into the same trace).
+"""
+import os
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+TRACE_HEADER = "X-Prysm-Trace"
+TRACE_ID_HEADER = "X-Trace-Id"
+TRACING_DEFAULT = os.getenv("TELEMETRY_TRACE_ALL", "0").lower() in {"1", "true", "yes"}
+
+# Seconds; covers cache hits (ms) through slow LLM turns (tens of seconds).
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (f'{k}="{v.replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for k, v in pairs)
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = STAGE_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        # label key -> [bucket counts..., sum, count]
+        self._series: Dict[LabelKey, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for i, bound in enumerate(self.buckets):
+                    lines.append(f"{self.name}_bucket{_format_labels(key, ('le', repr(bound)))} {_format_value(series[i])}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {_format_value(series[-1])}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {repr(round(series[-2], 6))}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {_format_value(series[-1])}")
+        return lines
+
+
+# --- Registry ---
+
+STAGE_DURATION = Histogram("prysm_stage_duration_seconds", "Time spent in each /chat pipeline stage.")
+STAGE_ERRORS = Counter("prysm_stage_errors_total", "Stages that raised an exception.")
+EVENTS = Counter("prysm_events_total", "Pipeline events: cache hits/misses, market data sources used, coalesced work.")
+TURNS = Counter("prysm_chat_turns_total", "Completed /chat turns by outcome.")
+
+_METRICS = [STAGE_DURATION, STAGE_ERRORS, EVENTS, TURNS]
+# Callables returning {metric_name: value}; rendered as gauges (e.g. admission.stats).
+_GAUGE_COLLECTORS: List[Tuple[str, Callable[[], Dict[str, Any]]]] = []
+
+
+def register_metric(metric: Any) -> Any:
+    """Add a Counter/Histogram owned by another module to /metrics."""
+    _METRICS.append(metric)
+    return metric
+
+
+def register_gauges(prefix: str, collect: Callable[[], Dict[str, Any]]) -> None:
+    """Expose the numeric fields of `collect()` as `<prefix>_<field>` gauges on /metrics."""
+    _GAUGE_COLLECTORS.append((prefix, collect))
+
+
+def _render_gauges() -> List[str]:
+    lines: List[str] = []
+    for prefix, collect in _GAUGE_COLLECTORS:
+        try:
+            values = collect() or {}
+        except Exception as e:
+            print(f"[TELEMETRY] Gauge collector {prefix} failed: {e}")
+            continue
+        for field, value in sorted(values.items()):
+            name = f"{prefix}_{field}"
+            if isinstance(value, dict):
+                lines.append(f"# TYPE {name} gauge")
+                for label, v in sorted(value.items()):
+                    if isinstance(v, (int, float)) and not isinstance(v, bool):
+                        lines.append(f"{name}{_format_labels(_label_key({'key': label}))} {_format_value(v)}")
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {_format_value(value)}")
+    return lines
+
+
+def render_prometheus() -> str:
+    lines: List[str] = []
+    for metric in _METRICS:
+        lines.extend(metric.render())
+    lines.extend(_render_gauges())
+    return "\n".join(lines) + "\n"
+
+
+# --- Traces ---
+
+class Trace:
+    def __init__(self, trace_id: Optional[str] = None):
+        self.trace_id = trace_id or uuid.uuid4().hex[:16]
+        self.started = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, started: float, duration: float, labels: Dict[str, Any], error: bool = False) -> None:
+        entry = {
+            "stage": stage,
+            "start_ms": round((started - self.started) * 1000, 1),
+            "duration_ms": round(duration * 1000, 1),
+        }
+        if labels:
+            entry.update({k: v for k, v in labels.items() if v is not None})
+        if error:
+            entry["error"] = True
+        with self._lock:
+            self.spans.append(entry)
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start_ms"])
+        return {
+            "trace_id": self.trace_id,
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 1),
+            "spans": spans,
+        }
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("prysm_trace", default=None)
+
+
+def tracing_requested(header_value: Optional[str]) -> bool:
+    if header_value is None:
+        return TRACING_DEFAULT
+    return header_value.strip().lower() in {"1", "true", "yes", "on"}
+
+
+def bind_trace(trace: Optional[Trace]) -> None:
+    """Attach `trace` to the current context (call inside the task that runs the request)."""
+    _current_trace.set(trace)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+# --- Recording ---
+
+def observe_stage(stage: str, seconds: float, started: Optional[float] = None, **labels: Any) -> None:
+    """Record a stage measured by the caller (e.g. TTFT, which is not a `with` block)."""
+    STAGE_DURATION.observe(seconds, stage=stage, **labels)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(stage, started if started is not None else time.perf_counter() - seconds, seconds, labels)
+
+
+@contextmanager
+def span(stage: str, **labels: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Time a block as `stage`. The yielded dict can be filled with extra labels
+    discovered inside the block (e.g. which market data source answered).
+    """
+    extra: Dict[str, Any] = {}
+    started = time.perf_counter()
+    error = False
+    try:
+        yield extra
+    except BaseException:
+        error = True
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        merged = {**labels, **extra}
+        STAGE_DURATION.observe(duration, stage=stage, **merged)
+        if error:
+            STAGE_ERRORS.inc(stage=stage)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(stage, started, duration, merged, error)
+
+
+def count_event(event: str, amount: float = 1.0, **labels: Any) -> None:
+    EVENTS.inc(amount, event=event, **labels)
@@ -8,33 +8,37 @@ from typing import Dict, Any, List, Optional
 import feedparser
 import yfinance as yf
 from langchain_core.tools import tool
-from stock_data import get_stock_data, generate_price_history, get_ticker_obj
-from google import genai
-from google.genai import types
+from stock_data import get_stock_data, generate_price_history, get_history, get_calendar
+from cache_backend import cache
+from cancellation import check_cancelled
+from executors import run_llm_sync
+from telemetry import span
+from llm_provider import generate_text, text_llm_available
 from dotenv import load_dotenv
 
 from pathlib import Path
 env_path = Path(__file__).parent.parent / "backend" / ".env"
 load_dotenv(dotenv_path=env_path)
 
-# Initialize Gemini for internal tool usage (Sentiment/Future extraction)
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-client = None
-if GEMINI_API_KEY:
-    try:
-        client = genai.Client(api_key=GEMINI_API_KEY)
-    except Exception as e:
-        print(f"[TOOLS] Gemini Init Failed: {e}")
+NEWS_CACHE_SECONDS = float(os.getenv("NEWS_CACHE_SECONDS", "600"))
 
 # --- HELPER: News Fetching ---
-def fetch_news_from_sources(ticker: str) -> List[Dict[str, Any]]:
-    """Aggregate news from Google News, Yahoo Finance, and MoneyControl."""
+def fetch_news_from_sources(ticker: str, refresh: bool = False, ttl: Optional[float] = None) -> List[Dict[str, Any]]:
+    """Aggregate news from Google News, Yahoo Finance, and MoneyControl (cached for NEWS_CACHE_SECONDS)."""
+    ticker = ticker.upper()
+    return cache.get_or_set(
+        "news", ticker, NEWS_CACHE_SECONDS if ttl is None else ttl, lambda: _fetch_news(ticker), refresh
+    )
+
+def _fetch_news(ticker: str) -> List[Dict[str, Any]]:
     all_articles = []
     
     # 1. Yahoo Finance
+    check_cancelled()
     try:
-        yf_ticker = yf.Ticker(f"{ticker}.NS")
-        yf_news = yf_ticker.news or []
+        with span("news_fetch", source="yahoo"):
+            yf_ticker = yf.Ticker(f"{ticker}.NS")
+            yf_news = yf_ticker.news or []
         for n in yf_news[:3]:
             all_articles.append({
                 "title": n.get("title", ""),
@@ -46,9 +50,11 @@ def fetch_news_from_sources(ticker: str) -> List[Dict[str, Any]]:
         pass
     
     # 2. Google News RSS
+    check_cancelled()
     try:
         google_url = f"https://news.google.com/rss/search?q={ticker}+stock+india&hl=en-IN&gl=IN&ceid=IN:en"
-        feed = feedparser.parse(google_url)
+        with span("news_fetch", source="google_rss"):
+            feed = feedparser.parse(google_url)
         for entry in feed.entries[:4]:
             source_name = entry.source.title if hasattr(entry, 'source') and hasattr(entry.source, 'title') else "Google News"
             all_articles.append({
@@ -61,9 +67,11 @@ def fetch_news_from_sources(ticker: str) -> List[Dict[str, Any]]:
         pass
     
     # 3. MoneyControl RSS
+    check_cancelled()
     try:
         mc_url = "https://www.moneycontrol.com/rss/latestnews.xml"
-        mc_feed = feedparser.parse(mc_url)
+        with span("news_fetch", source="moneycontrol_rss"):
+            mc_feed = feedparser.parse(mc_url)
         for entry in mc_feed.entries[:10]:
             if ticker.lower() in entry.title.lower():
                 all_articles.append({
@@ -111,13 +119,9 @@ def generate_chart(ticker: str, chart_type: str, metric: str, title: Optional[st
 
     # Use REAL yfinance data only
     try:
-        ticker_obj = get_ticker_obj(ticker)
-        if not ticker_obj:
-            return {"ui_content": "", "llm_data": {"result": "Data unavailable"}}
-        
         if chart_type in ["candlestick", "area", "line"]:
             # Get real historical data
-            hist = ticker_obj.history(period="3mo")
+            hist = get_history(ticker, "3mo")
             if hist.empty:
                 return {"ui_content": "", "llm_data": {"result": "No price history"}}
             
@@ -251,12 +255,8 @@ def generate_future_timeline(ticker: str) -> Dict[str, Any]:
     """Generates a visual Timeline/Roadmap for a stock."""
     # Try to get real calendar events from yfinance
     try:
-        ticker_obj = get_ticker_obj(ticker)
-        if not ticker_obj:
-            return {"ui_content": "", "llm_data": {"result": "Ticker data unavailable"}}
-        
         events = []
-        calendar = ticker_obj.calendar
+        calendar = get_calendar(ticker)
         
         if calendar and 'Earnings Date' in calendar:
             earnings_date = calendar['Earnings Date']
@@ -298,14 +298,15 @@ def generate_sentiment_analysis(ticker: str) -> Dict[str, Any]:
     # Mock AI analysis if client fails, or real if persistent
     overall = "Neutral"
     score = 50
-    if client:
+    check_cancelled()
+    if text_llm_available():
         try:
             titles = "\n".join([a['title'] for a in articles])
             prompt = f"Analyze sentiment for {ticker}: {titles}. Return JSON {{'overall': 'BULLISH', 'score': 80}}"
-            res = client.models.generate_content(model="gemini-2.5-flash", contents=prompt)
+            res_text = run_llm_sync(generate_text, prompt)
             # Minimal parsing for migration proof-of-concept
-            if "BULLISH" in res.text: overall = "Bullish"; score=80
-            elif "BEARISH" in res.text: overall = "Bearish"; score=30
+            if "BULLISH" in res_text: overall = "Bullish"; score=80
+            elif "BEARISH" in res_text: overall = "Bearish"; score=30
         except:
             pass
 
@@ -384,7 +385,7 @@ def compare_stocks(ticker1: str, ticker2: str) -> Dict[str, Any]:
     }
 
 # --- TOOL 6: RAG RETRIEVAL ---
-from rag_service import query_rag
+from readiness import RAG
 
 @tool
 def consult_knowledge_base(query: str) -> Dict[str, Any]:
@@ -392,8 +393,21 @@ def consult_knowledge_base(query: str) -> Dict[str, Any]:
     Searches uploaded documents (PDFs, reports) for information.
     Use this when the user asks about specific uploaded files within their "knowledge base".
     It retrieves relevant excerpts from the vector database.
+    Figures from financial statements (e.g. "revenue from operations FY24") are
+    answered from the extracted line-item table instead.
     """
-    docs = query_rag(query, n_results=3)
+    rag = RAG.get()
+    figures = rag.lookup_financials(query)
+    if figures:
+        return {
+            "ui_content": "[DOC_SEARCH_ACTIVE]",
+            "llm_data": {
+                "result": "Found figures in the financial statements of uploaded documents.",
+                "figures": figures
+            }
+        }
+
+    docs = rag.query_rag(query, n_results=3)
     
     if not docs:
         return {
@@ -0,0 +1,377 @@
+"""
+Prysm AI Agent - Market-hours-aware cache warmer.
+Keeps upstream data for the most-requested tickers in the cache (cache_backend.py),
+so the first question after the open does not pay a cold Yahoo fetch.
+
+- Popularity: /chat records every resolved symbol. Scores decay exponentially
+  (WARMER_POPULARITY_HALF_LIFE_HOURS) and live in a small SQLite file shared by
+  all workers. Only known symbols (symbols.py, plus WARMER_SYMBOLS) count. The
+  warmed set is the top WARMER_TOP_N, topped up from WARMER_SYMBOLS (the NIFTY 50
+  names in the backend's SYMBOL_MAP).
+- Schedule, in NSE hours (IST, Mon-Fri, 09:15-15:30, minus WARMER_HOLIDAYS):
+  - pre-open (WARMER_PREOPEN_MINUTES before 09:15): quote, history, news and
+    calendar for every symbol, spread over the window and cached until past the open
+  - open: each kind refreshed a little before its cache TTL runs out (quotes
+    every WARMER_QUOTE_INTERVAL_SECONDS)
+  - closed: everything every WARMER_CLOSED_INTERVAL_SECONDS, cached for that long,
+    since prices do not move
+- Rate: one fetch at a time on the market-data executor, at most
+  WARMER_MAX_FETCHES_PER_MINUTE, with jittered start times.
+
+Off unless WARMER_ENABLED=1. Only the worker holding the lock file (WARMER_LOCK_PATH)
+warms, whichever cache backend is used, so upstream load does not grow with the
+worker count. With CACHE_BACKEND=sqlite every worker reads what it warmed; with the
+memory backend only the leader's own cache benefits.
+"""
+import os
+import time
+import heapq
+import random
+import asyncio
+import sqlite3
+import threading
+import importlib
+from collections import Counter
+from datetime import date, datetime, time as dtime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from cache_backend import cache
+from executors import MARKET_DATA_EXECUTOR, run_in
+from readiness import MARKET_DATA
+from symbols import KNOWN_SYMBOLS, SYMBOL_ALIASES, normalize_symbol
+from telemetry import count_event
+
+IST = timezone(timedelta(hours=5, minutes=30))
+MARKET_OPEN = dtime(9, 15)
+MARKET_CLOSE = dtime(15, 30)
+
+WARMER_ENABLED = os.getenv("WARMER_ENABLED", "0").lower() in {"1", "true", "yes"}
+WARMER_SYMBOLS = [s.strip().upper() for s in (os.getenv("WARMER_SYMBOLS") or " ".join(SYMBOL_ALIASES)).replace(",", " ").split() if s.strip()]
+# Only these are ever warmed; /chat may resolve anything the user typed.
+WARMABLE_SYMBOLS = KNOWN_SYMBOLS | frozenset(WARMER_SYMBOLS)
+WARMER_TOP_N = int(os.getenv("WARMER_TOP_N", "20"))
+WARMER_PREOPEN_MINUTES = float(os.getenv("WARMER_PREOPEN_MINUTES", "30"))
+WARMER_QUOTE_INTERVAL_SECONDS = float(os.getenv("WARMER_QUOTE_INTERVAL_SECONDS", "50"))
+WARMER_CLOSED_INTERVAL_SECONDS = float(os.getenv("WARMER_CLOSED_INTERVAL_SECONDS", "1800"))
+WARMER_MAX_FETCHES_PER_MINUTE = float(os.getenv("WARMER_MAX_FETCHES_PER_MINUTE", "40"))
+# Each gap between fetches is stretched or shrunk by up to this fraction.
+WARMER_JITTER = float(os.getenv("WARMER_JITTER", "0.2"))
+WARMER_POPULARITY_HALF_LIFE_HOURS = float(os.getenv("WARMER_POPULARITY_HALF_LIFE_HOURS", "72"))
+WARMER_HOLIDAYS = {d.strip() for d in os.getenv("WARMER_HOLIDAYS", "").split(",") if d.strip()}
+WARMER_STATE_PATH = os.getenv("WARMER_STATE_PATH") or os.path.join(os.path.dirname(__file__), "warmer_state.sqlite3")
+WARMER_LOCK_PATH = os.getenv("WARMER_LOCK_PATH") or WARMER_STATE_PATH + ".lock"
+# How often the symbol set and popularity are re-read, and the longest idle sleep.
+_RESYNC_SECONDS = 60.0
+# Open-market refreshes run at this share of the cache TTL, so entries never lapse.
+_REFRESH_SHARE = 0.8
+
+PRE_OPEN = "pre_open"
+OPEN = "open"
+CLOSED = "closed"
+
+
+def is_trading_day(day: date) -> bool:
+    return day.weekday() < 5 and day.isoformat() not in WARMER_HOLIDAYS
+
+
+def market_phase(now: Optional[datetime] = None) -> str:
+    ist = (now or datetime.now(timezone.utc)).astimezone(IST)
+    if not is_trading_day(ist.date()):
+        return CLOSED
+    open_at = datetime.combine(ist.date(), MARKET_OPEN, IST)
+    close_at = datetime.combine(ist.date(), MARKET_CLOSE, IST)
+    if open_at - timedelta(minutes=WARMER_PREOPEN_MINUTES) <= ist < open_at:
+        return PRE_OPEN
+    if open_at <= ist < close_at:
+        return OPEN
+    return CLOSED
+
+
+def seconds_until_open(now: Optional[datetime] = None) -> float:
+    ist = (now or datetime.now(timezone.utc)).astimezone(IST)
+    return max(0.0, (datetime.combine(ist.date(), MARKET_OPEN, IST) - ist).total_seconds())
+
+
+class TickerPopularity:
+    """Decayed request counts per symbol. record() is in-memory; flush() writes them (call off the loop)."""
+
+    def __init__(self, path: str = WARMER_STATE_PATH, half_life_hours: float = WARMER_POPULARITY_HALF_LIFE_HOURS):
+        self.path = path
+        self.half_life = half_life_hours * 3600
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._pending: Counter = Counter()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS popularity (symbol TEXT PRIMARY KEY, score REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _decay(self, score: float, since: float, now: float) -> float:
+        return score * 0.5 ** (max(0.0, now - since) / self.half_life)
+
+    def record(self, symbol: Optional[str]) -> None:
+        if symbol:
+            with self._lock:
+                self._pending[symbol.upper()] += 1
+
+    def flush(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+        if not pending:
+            return
+        now = time.time()
+        conn = self._connection()
+        # IMMEDIATE: read-modify-write of the same rows from several workers.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for symbol, count in pending.items():
+                row = conn.execute("SELECT score, updated_at FROM popularity WHERE symbol = ?", (symbol,)).fetchone()
+                score = (self._decay(row[0], row[1], now) if row else 0.0) + count
+                conn.execute("INSERT OR REPLACE INTO popularity VALUES (?, ?, ?)", (symbol, score, now))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def top(self, n: Optional[int] = None) -> List[Tuple[str, float]]:
+        now = time.time()
+        rows = self._connection().execute("SELECT symbol, score, updated_at FROM popularity").fetchall()
+        scored = [(symbol, self._decay(score, updated, now)) for symbol, score, updated in rows]
+        return sorted(scored, key=lambda s: s[1], reverse=True)[:n]
+
+
+def _tools() -> Any:
+    # tools.py is already loaded with the graph; imported here so the warmer does not force it at startup.
+    return importlib.import_module("tools")
+
+
+class WarmJob:
+    """How one kind of data is fetched and how long it stays cached."""
+
+    def __init__(self, kind: str, fetch: Callable[[str, float], Any], ttl: Callable[[], float]):
+        self.kind = kind
+        # fetch(symbol, ttl): fetches upstream and replaces the cache entry.
+        self.fetch = fetch
+        self.ttl = ttl
+
+
+def _stock_data() -> Any:
+    return MARKET_DATA.get()
+
+
+def _warm_quote(symbol: str, ttl: float) -> None:
+    # get_stock_data caches a failed fetch only briefly, whatever `ttl` is.
+    if _stock_data().get_stock_data(symbol, refresh=True, ttl=ttl) is None:
+        raise RuntimeError("no data")
+
+
+JOBS = {
+    job.kind: job for job in (
+        WarmJob("quote", _warm_quote, lambda: _stock_data().CACHE_DURATION),
+        WarmJob("history", lambda s, ttl: _stock_data().get_history(s, "3mo", refresh=True, ttl=ttl),
+                lambda: _stock_data().HISTORY_CACHE_SECONDS),
+        WarmJob("news", lambda s, ttl: _tools().fetch_news_from_sources(s, refresh=True, ttl=ttl),
+                lambda: _tools().NEWS_CACHE_SECONDS),
+        WarmJob("calendar", lambda s, ttl: _stock_data().get_calendar(s, refresh=True, ttl=ttl),
+                lambda: _stock_data().CALENDAR_CACHE_SECONDS),
+    )
+}
+
+
+def refresh_interval(kind: str, phase: str) -> float:
+    if phase == OPEN:
+        if kind == "quote":
+            return WARMER_QUOTE_INTERVAL_SECONDS
+        return JOBS[kind].ttl() * _REFRESH_SHARE
+    return max(WARMER_CLOSED_INTERVAL_SECONDS, JOBS[kind].ttl() * _REFRESH_SHARE)
+
+
+def entry_ttl(kind: str, phase: str, interval: float) -> float:
+    """TTL for a warmed entry: its normal TTL while the market is open, otherwise until the next refresh."""
+    normal = JOBS[kind].ttl()
+    if phase == OPEN:
+        return normal
+    ttl = max(normal, interval * 1.25)
+    if phase == PRE_OPEN:
+        # Pre-open fetches have to last into the open, when the open-market cadence takes over.
+        ttl = max(ttl, seconds_until_open() + normal)
+    return ttl
+
+
+def _fetch(kind: str, symbol: str, phase: str) -> Tuple[float, bool]:
+    """Refresh one entry (on the market-data executor); returns the refresh interval and whether it worked."""
+    interval = refresh_interval(kind, phase)
+    try:
+        JOBS[kind].fetch(symbol, entry_ttl(kind, phase, interval))
+        return interval, True
+    except Exception as e:
+        print(f"[WARMER] {kind} for {symbol} failed: {e}")
+        return interval, False
+
+
+class MarketWarmer:
+    def __init__(self, popularity: Optional[TickerPopularity] = None):
+        self.popularity = popularity or TickerPopularity()
+        self._task: Optional[asyncio.Task] = None
+        self._lock_file = None
+        self.leader = False
+        self.phase: Optional[str] = None
+        self.symbols: List[str] = []
+        # (due, seq, kind, symbol) heap and the set it holds.
+        self._queue: List[Tuple[float, int, str, str]] = []
+        self._scheduled: Dict[Tuple[str, str], float] = {}
+        self._seq = 0
+        self._last_fetch = 0.0
+        self.fetches = 0
+        self.failures = 0
+
+    def record(self, symbol: Optional[str]) -> None:
+        """Count a request for `symbol` (cheap; called from /chat on the event loop)."""
+        symbol = normalize_symbol(symbol)
+        if WARMER_ENABLED and symbol in WARMABLE_SYMBOLS:
+            self.popularity.record(symbol)
+
+    async def start(self) -> None:
+        if not WARMER_ENABLED or self._task is not None:
+            return
+        self.leader = self._acquire_leader_lock()
+        self._task = asyncio.create_task(self._run())
+        print(f"[WARMER] Started ({'warming' if self.leader else 'recording popularity only'}, {cache.name} cache)")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        try:
+            await run_in(MARKET_DATA_EXECUTOR, self.popularity.flush)
+        except Exception as e:
+            print(f"[WARMER] Popularity flush failed: {e}")
+
+    def _acquire_leader_lock(self) -> bool:
+        """One warmer per host: whoever holds the lock file for its lifetime."""
+        try:
+            import fcntl
+        except ImportError:
+            return True  # no flock (Windows): every worker warms
+        handle = open(WARMER_LOCK_PATH, "a")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        self._lock_file = handle
+        return True
+
+    # --- scheduling ---
+
+    def _select_symbols(self) -> List[str]:
+        # Filtered again here: the state file may hold symbols recorded before the check existed.
+        ranked = [symbol for symbol, _ in self.popularity.top() if symbol in WARMABLE_SYMBOLS][:WARMER_TOP_N]
+        for symbol in WARMER_SYMBOLS:
+            if len(ranked) >= WARMER_TOP_N:
+                break
+            if symbol not in ranked:
+                ranked.append(symbol)
+        return ranked[:WARMER_TOP_N]
+
+    def _push(self, kind: str, symbol: str, due: float) -> None:
+        self._seq += 1
+        self._scheduled[(kind, symbol)] = due
+        heapq.heappush(self._queue, (due, self._seq, kind, symbol))
+
+    def _reschedule_all(self, now: float) -> None:
+        """Spread every job over its interval (the pre-open window for pre-open), so refreshes do not bunch up."""
+        self._queue, self._scheduled = [], {}
+        window = WARMER_PREOPEN_MINUTES * 60 * 0.8 if self.phase == PRE_OPEN else None
+        for symbol in self.symbols:
+            for kind in JOBS:
+                spread = window or refresh_interval(kind, self.phase)
+                self._push(kind, symbol, now + random.uniform(0, spread))
+
+    def _sync(self, now: float) -> None:
+        phase = market_phase()
+        symbols = self._select_symbols()
+        if phase != self.phase:
+            print(f"[WARMER] Market phase {self.phase or '-'} -> {phase}; warming {len(symbols)} symbols")
+            self.phase, self.symbols = phase, symbols
+            self._reschedule_all(now)
+            return
+        added = [s for s in symbols if s not in self.symbols]
+        self.symbols = symbols
+        for symbol in added:
+            for kind in JOBS:
+                self._push(kind, symbol, now + random.uniform(0, refresh_interval(kind, phase)))
+
+    def _next_gap(self) -> float:
+        gap = 60.0 / WARMER_MAX_FETCHES_PER_MINUTE if WARMER_MAX_FETCHES_PER_MINUTE > 0 else 0.0
+        return gap * random.uniform(1 - WARMER_JITTER, 1 + WARMER_JITTER)
+
+    async def _run(self) -> None:
+        next_sync = 0.0
+        while True:
+            try:
+                now = time.time()
+                if now >= next_sync:
+                    await run_in(MARKET_DATA_EXECUTOR, self.popularity.flush)
+                    if not self.leader and self._acquire_leader_lock():
+                        # The previous leader exited and released the lock.
+                        self.leader = True
+                        print("[WARMER] Took over warming")
+                    if self.leader:
+                        await run_in(MARKET_DATA_EXECUTOR, self._sync, now)
+                    next_sync = now + _RESYNC_SECONDS
+                if not self.leader or not self._queue:
+                    await asyncio.sleep(max(0.0, next_sync - time.time()))
+                    continue
+                due, _, kind, symbol = self._queue[0]
+                start_at = max(due, self._last_fetch + self._next_gap())
+                wait = start_at - time.time()
+                if wait > 0:
+                    await asyncio.sleep(min(wait, max(0.0, next_sync - time.time())))
+                    continue
+                heapq.heappop(self._queue)
+                if self._scheduled.get((kind, symbol)) != due or symbol not in self.symbols:
+                    continue  # superseded by a reschedule, or no longer popular
+                await self._warm(kind, symbol)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[WARMER] Loop error: {e}")
+                await asyncio.sleep(_RESYNC_SECONDS)
+
+    async def _warm(self, kind: str, symbol: str) -> None:
+        phase = self.phase
+        self._last_fetch = time.time()
+        interval, ok = await run_in(MARKET_DATA_EXECUTOR, _fetch, kind, symbol, phase)
+        if ok:
+            self.fetches += 1
+        else:
+            self.failures += 1
+        count_event("warmer_fetch", kind=kind, result="ok" if ok else "error")
+        # Pre-open jobs run once; the open-market cadence takes over at 09:15.
+        if phase != PRE_OPEN:
+            self._push(kind, symbol, self._last_fetch + interval)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "leader": int(self.leader),
+            "symbols": len(self.symbols),
+            "queued": len(self._queue),
+            "fetches": self.fetches,
+            "failures": self.failures,
+            "phase": {p: int(p == self.phase) for p in (PRE_OPEN, OPEN, CLOSED)},
+        }
+
+
+market_warmer = MarketWarmer()
@@ -8,7 +8,12 @@ const AI_AGENT_URL = process.env.AI_AGENT_URL || "http://localhost:8001";
 // GET /api/sessions
 router.get("/", async (req, res) => {
   try {
-    const response = await axios.get(`${AI_AGENT_URL}/sessions`);
+    const { limit, cursor } = req.query;
+    const response = await axios.get(`${AI_AGENT_URL}/sessions`, {
+      params: { limit, cursor },
+    });
+    const nextCursor = response.headers["x-next-cursor"];
+    if (nextCursor) res.setHeader("X-Next-Cursor", nextCursor);
     res.json(response.data);
   } catch (error) {
     console.error("Error fetching sessions:", error.message);
@@ -39,4 +44,19 @@ router.get("/:id", async (req, res) => {
   }
 });
 
+// GET /api/sessions/:id/messages
+router.get("/:id/messages", async (req, res) => {
+  try {
+    const { id } = req.params;
+    const { before, limit } = req.query;
+    const response = await axios.get(`${AI_AGENT_URL}/sessions/${id}/messages`, {
+      params: { before, limit },
+    });
+    res.json(response.data);
+  } catch (error) {
+    console.error(`Error fetching messages for session ${req.params.id}:`, error.message);
+    res.status(500).json({ error: "Failed to fetch session messages" });
+  }
+});
+
 export default router;
@@ -1,7 +1,7 @@
 import { useState, useRef, useEffect } from 'react'
 import { useDispatch, useSelector } from 'react-redux'
 import { Send, Paperclip, Mic, ChevronDown, TrendingUp, Building2 } from 'lucide-react'
-import { sendMessage } from '../../store/slices/chatSlice'
+import { sendMessage, ensureSession } from '../../store/slices/chatSlice'
 import { selectStock } from '../../store/slices/stockSlice'
 import StockSelectorDropdown from '../StockSelector/StockSelectorDropdown'
 
@@ -29,7 +29,13 @@ function ChatInput({ disabled }) {
 
     setIsUploading(true)
     try {
-      await import('../../services/api').then(m => m.chatAPI.uploadDocument(file))
+      // A new chat has no session until its first message; create it now so the
+      // document is scoped to this chat rather than shared.
+      const sessionId = await dispatch(ensureSession()).unwrap()
+      await import('../../services/api').then(m => m.chatAPI.uploadDocument(file, null, {
+        sessionId,
+        ticker: selectedStock?.symbol,
+      }))
       setInput(prev => prev + ` [Attached: ${file.name}] Analyze this document.`)
     } catch (err) {
       console.error(err)
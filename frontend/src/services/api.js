@@ -4,9 +4,12 @@ const API_BASE_URL = "/api";
 
 // API service for chat
 export const chatAPI = {
-  uploadDocument: async (file) => {
+  uploadDocument: async (file, onProgress, { sessionId, ticker } = {}) => {
     const formData = new FormData();
     formData.append("file", file);
+    // Scope the document to the chat session (searched only from that session).
+    if (sessionId) formData.append("session_id", sessionId);
+    if (ticker) formData.append("ticker", ticker);
 
     // Direct call to Agent URL (8001) for File Upload (bypassing Node gateway for simplicity as Node just proxies)
     // Or we can add a route in Node. Let's assume Node gateway is set or we hit Agent directly.
@@ -21,7 +24,25 @@ export const chatAPI = {
       method: "POST",
       body: formData,
     });
-    return response.json();
+    const job = await response.json();
+    if (!response.ok) {
+      throw new Error(job.detail || "Upload failed");
+    }
+
+    // Ingestion runs as a background job on the agent; poll until it finishes.
+    while (true) {
+      await new Promise((resolve) => setTimeout(resolve, 1000));
+      const statusResponse = await fetch(`http://localhost:8001/upload_doc/${job.job_id}`);
+      const status = await statusResponse.json();
+      if (!statusResponse.ok) {
+        throw new Error(status.detail || "Upload failed");
+      }
+      if (onProgress) onProgress(status);
+      if (status.status === "succeeded") return status;
+      if (status.status === "failed" || status.status === "cancelled") {
+        throw new Error(status.error || `Upload ${status.status}`);
+      }
+    }
   },
 
   getSessions: async () => {
@@ -76,18 +97,24 @@ export const chatAPI = {
             if (data === "[DONE]") {
               break;
             }
+            let parsed;
             try {
-              const parsed = JSON.parse(data);
-              if (parsed.content) {
-                fullContent += parsed.content;
-                onChunk(parsed.content);
-              }
+              parsed = JSON.parse(data);
             } catch (e) {
               // Not JSON, might be plain text chunk
               if (data.trim()) {
                 fullContent += data;
                 onChunk(data);
               }
+              continue;
+            }
+            if (parsed.error) {
+              // e.g. the agent shedding load when it is saturated
+              throw new Error(parsed.error);
+            }
+            if (parsed.content) {
+              fullContent += parsed.content;
+              onChunk(parsed.content);
             }
           }
         }
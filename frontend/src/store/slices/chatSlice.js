@@ -75,6 +75,21 @@ export const selectSession = createAsyncThunk(
   }
 );
 
+// Creates the session a new chat will use, if there is none yet. Uploads need it
+// before the first message, so the document stays private to this chat.
+export const ensureSession = createAsyncThunk(
+  "chat/ensureSession",
+  async (_, { dispatch, getState }) => {
+    let sessionId = getState().chat.currentSessionId;
+    if (!sessionId) {
+      const newSession = await chatAPI.createSession();
+      sessionId = newSession.id || newSession._id;
+      dispatch(chatSlice.actions.setCurrentSessionId(sessionId));
+    }
+    return sessionId;
+  }
+);
+
 export const sendMessage = createAsyncThunk(
   "chat/sendMessage",
   async ({ message, stockSymbol, mode, profile }, { dispatch, getState, rejectWithValue }) => {
@@ -85,9 +100,7 @@ export const sendMessage = createAsyncThunk(
     // AUTO-CREATE SESSION IF NONE EXISTS
     if (!sessionId) {
       try {
-        const newSession = await chatAPI.createSession();
-        sessionId = newSession.id || newSession._id;
-        dispatch(chatSlice.actions.setCurrentSessionId(sessionId));
+        sessionId = await dispatch(ensureSession()).unwrap();
       } catch (e) {
         console.error("Failed to create session:", e);
       }